@@ -1,165 +1,239 @@
-from flask import Flask, render_template, request
-import pprint
-from clinical_reasoning.clinical_reasoning import run_clinical_reasoning
-
-app = Flask(__name__)
+from flask import Blueprint, Flask, Response, jsonify, render_template, request, stream_with_context
+import json
+import logging
+import os
+import random
+import time
+from clinical_reasoning.clinical_reasoning import LLM_FALLBACK_EXPLANATION
+from clinical_reasoning.explanation_jobs import get_explanation_jobs
+from clinical_reasoning.lab_history import attach_trends
+from clinical_reasoning.metrics import REQUESTS, STAGE_SECONDS, render as render_metrics, timed
+from clinical_reasoning.patient_record import PatientRecord
+from clinical_reasoning.service import assess, assess_deferred, assess_many
+from clinical_reasoning.warmup import WARMUP_ENABLED, preload, readiness, start_warm_up
+
+bp = Blueprint("cds", __name__)
+
+logging.basicConfig(level=os.environ.get("CDS_LOG_LEVEL", "WARNING"))
+logger = logging.getLogger("cds")
+
+# Fraction of requests whose full patient data/result is logged at DEBUG
+LOG_SAMPLE_RATE = float(os.environ.get("CDS_LOG_SAMPLE_RATE", 0.01))
+
+# Largest patient list accepted by /api/assess/batch
+MAX_API_BATCH = 500
+
+# Longest an explanation stream is held open (seconds)
+EXPLANATION_STREAM_TIMEOUT = 120
 
 # -----------------------------
-# Helper functions (SAFE parsing)
+# Helper functions
 # -----------------------------
 
-def get_int(value):
-    try:
-        return int(value)
-    except (TypeError, ValueError):
-        return None
-
-def get_float(value):
-    try:
-        return float(value)
-    except (TypeError, ValueError):
-        return None
-
-def get_bool(value):
-    return value == "on"
-
-def calculate_bmi(weight, height_cm):
-    if not weight or not height_cm:
-        return None
-    height_m = height_cm / 100
-    return round(weight / (height_m ** 2), 1)
-
+def log_sampled(label, payload):
+    # Patient dumps are expensive and sensitive: DEBUG only, and sampled
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_SAMPLE_RATE:
+        logger.debug("%s: %s", label, json.dumps(payload, default=str))
 
 
 # -----------------------------
 # Main Route
 # -----------------------------
 
-@app.route("/", methods=["GET", "POST"])
+@bp.route("/", methods=["GET", "POST"])
 def clinical_workspace():
 
     assessment_result = None  # <-- THIS is what UI will read
 
     if request.method == "POST":
+        parse_start = time.perf_counter()
 
         # =========================
-        # Patient Context
+        # Patient record
         # =========================
-        patient_context = {
-            "patient_id": request.form.get("patient_id"),
-            "age": get_int(request.form.get("age")),
-            "sex": request.form.get("sex"),
-            "visit_date": request.form.get("visit_date")
-        }
-
+        # Typed fields parsed once; BMI and sex-based filtering are derived
+        record = PatientRecord.parse(request.form)
 
-        age = patient_context["age"]
-        sex = patient_context["sex"]
+        # =========================
+        # Longitudinal trends
+        # =========================
+        # Stores this visit and adds trends from the patient's earlier visits
+        record = attach_trends(record)
 
+        STAGE_SECONDS.observe(time.perf_counter() - parse_start, stage="parse_request")
+        log_sampled("structured patient data", record.as_dict())
 
         # =========================
-        # Vital Signs
+        # Clinical Reasoning Engine
         # =========================
-        vitals = {
-            "blood_pressure": {
-                "systolic": get_int(request.form.get("bp_systolic")),
-                "diastolic": get_int(request.form.get("bp_diastolic"))
-            },
-            "heart_rate": get_int(request.form.get("heart_rate")),
-            "weight": get_float(request.form.get("weight")),
-            "height": get_float(request.form.get("height"))
-                }
-        # -----------------------------
-        # Backend-authoritative BMI
-        # -----------------------------
-        bmi = calculate_bmi(
-            vitals["weight"],
-            vitals["height"]
+        # Rules + evidence now; the LLM explanation streams in afterwards
+        assessment_result = assess_deferred(record)
+
+        log_sampled("clinical assessment result", assessment_result)
+
+    # =========================
+    # Render UI
+    # =========================
+    with timed("render_template"):
+        return render_template(
+            "workspace.html",
+            assessment=assessment_result
         )
 
-        vitals["bmi"] = bmi
 
+# -----------------------------
+# JSON API (EHR integration)
+# -----------------------------
 
-        # =========================
-        # Laboratory Values
-        # =========================
-        labs = {
-            "fbs": get_float(request.form.get("fbs")),
-            "hba1c": get_float(request.form.get("hba1c")),
-            "tsh": get_float(request.form.get("tsh")),
-            "ft4": get_float(request.form.get("ft4"))
-        }
+def patient_record_from_json(payload):
+    """
+    Accept either the nested patient_data structure or a flat record
+    using the workspace form field names. Values that do not parse are
+    rejected (ValueError).
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("patient record must be a JSON object")
 
-        # =========================
-        # Symptoms & History
-        # =========================
-        symptoms = {
-            "fatigue": get_bool(request.form.get("fatigue")),
-            "weight_gain": get_bool(request.form.get("weight_gain")),
-            "menstrual_irregularity": get_bool(request.form.get("menstrual_irregularity")),
-            "hirsutism": get_bool(request.form.get("hirsutism")),
-            "acne_severity": request.form.get("acne_severity"),
-            "family_history_diabetes": get_bool(request.form.get("family_history_diabetes"))
-        }
+    if any(key in payload for key in ("labs", "vitals", "symptoms", "demographics", "trends")):
+        return PatientRecord.from_patient_data(payload, strict=True)
 
-        # =========================
-        # Sex-based clinical filtering
-        # =========================
-        if sex != "female":
-            symptoms["menstrual_irregularity"] = False
-            symptoms["hirsutism"] = False
+    return PatientRecord.parse(payload, strict=True)
 
-        # =========================
-        # PCOS eligibility (clinical rule)
-        # =========================
-        pcos_eligible = (
-            sex == "female" and
-            patient_context["age"] is not None and
-            patient_context["age"] >= 12
-        )
 
-        # =========================
-        # Final Clinical Data Object
-        # =========================
-        patient_data = {
-    "demographics": {
-        "age": age,
-        "sex": sex
-    },
-    "vitals": vitals,
-    "labs": labs,
-    "symptoms": symptoms
-}
+@bp.route("/api/assess", methods=["POST"])
+def api_assess():
+    try:
+        with timed("parse_request"):
+            record = patient_record_from_json(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # =========================
-        # DEBUG OUTPUT (optional)
-        # =========================
-        print("\n====== STRUCTURED PATIENT DATA ======")
-        pprint.pprint(patient_data)
-        print("====================================\n")
+    # Records carrying a patient_id (and visit_date) go into the lab history
+    record = attach_trends(record)
 
-        # =========================
-        # Clinical Reasoning Engine
-        # =========================
-        assessment_result = run_clinical_reasoning(patient_data)
+    # ?explanation=deferred returns immediately with an explanation_job id
+    if request.args.get("explanation") == "deferred":
+        return jsonify(assess_deferred(record))
 
-        print("\n--- SUPPORTING EVIDENCE PREVIEW ---")
-        print(assessment_result.get("supporting_evidence", "")[:300])
-        print("----------------------------------\n")
+    return jsonify(assess(record))
 
 
-        print("\n====== CLINICAL ASSESSMENT RESULT ======")
-        pprint.pprint(assessment_result)
-        print("=======================================\n")
+@bp.route("/api/assess/batch", methods=["POST"])
+def api_assess_batch():
+    payload = request.get_json(silent=True) or {}
+    patients = payload.get("patients") if isinstance(payload, dict) else None
 
-    # =========================
-    # Render UI
-    # =========================
-    return render_template(
-        "workspace.html",
-        assessment=assessment_result
+    if not isinstance(patients, list):
+        return jsonify({"error": "expected {\"patients\": [...]}"}), 400
+
+    if len(patients) > MAX_API_BATCH:
+        return jsonify({"error": f"at most {MAX_API_BATCH} patients per request"}), 413
+
+    try:
+        with timed("parse_request"):
+            records = [patient_record_from_json(p) for p in patients]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"results": assess_many(records)})
+
+
+@bp.route("/api/explanations/<job_id>", methods=["GET"])
+def api_explanation(job_id):
+    job = get_explanation_jobs().lookup(job_id, LLM_FALLBACK_EXPLANATION)
+    if job is None:
+        return jsonify({"error": "unknown explanation job"}), 404
+
+    return jsonify({"job_id": job_id, "status": job.status, "text": job.text})
+
+
+@bp.route("/api/explanations/<job_id>/stream", methods=["GET"])
+def api_explanation_stream(job_id):
+    job = get_explanation_jobs().lookup(job_id, LLM_FALLBACK_EXPLANATION)
+    if job is None:
+        return jsonify({"error": "unknown explanation job"}), 404
+
+    def sse():
+        for event, text in job.events(timeout=EXPLANATION_STREAM_TIMEOUT):
+            yield f"event: {event}\ndata: {json.dumps({'text': text})}\n\n"
+
+    return Response(
+        stream_with_context(sse()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
+# -----------------------------
+# Metrics
+# -----------------------------
+
+@bp.after_app_request
+def count_request(response):
+    # Label by view name, without the "cds." blueprint prefix
+    endpoint = (request.endpoint or "unknown").rsplit(".", 1)[-1]
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+
+@bp.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+# -----------------------------
+# Health
+# -----------------------------
+
+@bp.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+@bp.route("/readyz", methods=["GET"])
+def readyz():
+    state = readiness()
+    return jsonify(state), 200 if state["ready"] else 503
+
+
+# -----------------------------
+# App factory
+# -----------------------------
+
+def create_app(preload_assets=False, warm_up=WARMUP_ENABLED):
+    """
+    Build the Flask app.
+
+    preload_assets loads the fork-safe assets (rule set, evidence table,
+    memory-mapped indexes, templates) in this process; under a pre-fork
+    server it runs in the master so workers share them copy-on-write.
+    warm_up starts the background warm-up; pre-fork servers start it in
+    each worker after the fork instead (see gunicorn.conf.py).
+    """
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+
+    if preload_assets:
+        preload()
+        app.jinja_env.get_template("workspace.html")
+
+    # Rules, evidence table, vector store and models load in the background;
+    # /readyz reports when the worker is warm
+    if warm_up:
+        start_warm_up()
+
+    return app
+
+
+def __getattr__(name):
+    # `app:app` (flask run, single-process servers) builds the app on first access
+    global app
+
+    if name == "app":
+        app = create_app()
+        return app
+    raise AttributeError(name)
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    create_app().run(host="0.0.0.0", port=5000)
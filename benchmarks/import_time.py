@@ -0,0 +1,66 @@
+# import_time.py
+#
+# Import-time profile of the web app (python -X importtime), to keep worker
+# start-up fast:
+#
+#   python -m benchmarks.import_time                  # top modules by cumulative time
+#   python -m benchmarks.import_time --budget-ms 800  # exit 1 if slower
+#
+# Runs in a fresh interpreter with CDS_WARMUP=0 so only the import itself
+# is measured, not the background warm-up.
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_imports(module="app"):
+    """
+    Return (total_us, [(cumulative_us, self_us, name)]) for importing
+    `module` in a fresh interpreter.
+    """
+    env = dict(os.environ, CDS_WARMUP="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+
+    # Top-level imports are the unindented names
+    total = sum(cumulative for cumulative, _, name in rows if not name.startswith("  "))
+    return total, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time profile of the app")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="exit non-zero if the import takes longer")
+    args = parser.parse_args(argv)
+
+    total, rows = profile_imports(args.module)
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    print(f"\nimport {args.module}: {total / 1000:.1f} ms")
+
+    if args.budget_ms is not None and total / 1000 > args.budget_ms:
+        print(f"Over budget ({args.budget_ms:.0f} ms)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
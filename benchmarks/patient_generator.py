@@ -0,0 +1,197 @@
+# patient_generator.py
+#
+# Seeded generator of patient_data dicts in the shape app.py builds, mixing
+# scenarios so that every branch of rules.py (and the critical override and
+# insufficient-data paths) is exercised.
+
+import random
+
+
+# scenario -> relative weight
+SCENARIOS = {
+    "thyroid_overt": 10,
+    "thyroid_subclinical": 10,
+    "thyroid_normal": 6,
+    "thyroid_discordant": 4,
+    "diabetes": 10,
+    "prediabetes": 10,
+    "normoglycemic": 6,
+    "pcos_two_criteria": 6,
+    "pcos_one_criterion": 6,
+    "adrenal_low": 4,
+    "adrenal_high": 4,
+    "adrenal_normal": 3,
+    "metabolic": 6,
+    "multi_domain": 8,
+    "critical": 3,
+    "empty": 4,
+}
+
+
+def _blank(rng):
+    age = rng.randint(12, 85)
+    sex = rng.choice(["female", "male"])
+    weight = round(rng.uniform(45, 130), 1)
+    height = round(rng.uniform(145, 195), 1)
+
+    return {
+        "demographics": {"age": age, "sex": sex},
+        "vitals": {
+            "blood_pressure": {
+                "systolic": rng.randint(100, 150),
+                "diastolic": rng.randint(60, 95),
+            },
+            "heart_rate": rng.randint(55, 100),
+            "weight": weight,
+            "height": height,
+            "bmi": round(weight / ((height / 100) ** 2), 1),
+        },
+        "labs": {"fbs": None, "hba1c": None, "tsh": None, "ft4": None},
+        "symptoms": {
+            "fatigue": False,
+            "weight_gain": False,
+            "menstrual_irregularity": False,
+            "hirsutism": False,
+            "acne_severity": None,
+            "family_history_diabetes": rng.random() < 0.3,
+        },
+    }
+
+
+def _thyroid(rng, p, kind):
+    labs, symptoms = p["labs"], p["symptoms"]
+    if kind == "overt":
+        labs["tsh"] = round(rng.choice([rng.uniform(5, 20), rng.uniform(0.01, 0.35)]), 2)
+        labs["ft4"] = round(rng.choice([rng.uniform(0.3, 0.75), rng.uniform(1.9, 4)]), 2)
+        symptoms["fatigue"] = True
+        symptoms["weight_gain"] = rng.random() < 0.5
+    elif kind == "subclinical":
+        labs["tsh"] = round(rng.uniform(4.6, 10), 2)
+        labs["ft4"] = round(rng.uniform(0.8, 1.8), 2)
+        symptoms["fatigue"] = rng.random() < 0.7
+    elif kind == "normal":
+        labs["tsh"] = round(rng.uniform(0.4, 4.5), 2)
+        labs["ft4"] = round(rng.uniform(0.8, 1.8), 2)
+        symptoms["weight_gain"] = rng.random() < 0.5
+    else:  # discordant
+        labs["tsh"] = round(rng.uniform(0.4, 4.5), 2)
+        labs["ft4"] = round(rng.uniform(1.9, 3.5), 2)
+
+
+def _glycemia(rng, p, kind):
+    labs = p["labs"]
+    if kind == "diabetes":
+        labs["fbs"] = rng.choice([None, rng.randint(126, 280), rng.randint(100, 125)])
+        labs["hba1c"] = round(rng.uniform(6.5, 11), 1)
+    elif kind == "prediabetes":
+        labs["fbs"] = rng.choice([None, rng.randint(100, 125)])
+        labs["hba1c"] = round(rng.uniform(5.7, 6.4), 1) if labs["fbs"] is None or rng.random() < 0.5 else None
+    else:
+        labs["fbs"] = rng.randint(70, 99)
+        labs["hba1c"] = rng.choice([None, round(rng.uniform(4.5, 5.6), 1)])
+
+
+def _pcos(rng, p, criteria):
+    p["demographics"]["sex"] = "female"
+    p["demographics"]["age"] = rng.randint(14, 45)
+    symptoms = p["symptoms"]
+    if criteria == 2:
+        symptoms["menstrual_irregularity"] = True
+        symptoms["hirsutism"] = True
+    else:
+        key = rng.choice(["menstrual_irregularity", "hirsutism"])
+        symptoms[key] = True
+
+
+def _adrenal(rng, p, kind):
+    if kind == "low":
+        p["labs"]["Cortisol_AM"] = round(rng.uniform(0.5, 4.9), 1)
+    elif kind == "high":
+        p["labs"]["Cortisol_AM"] = round(rng.uniform(20.5, 40), 1)
+    else:
+        p["labs"]["Cortisol_AM"] = round(rng.uniform(5, 20), 1)
+
+
+def _metabolic(rng, p):
+    p["vitals"]["Waist_Circumference"] = rng.randint(80, 120)
+    p["vitals"]["BP_Systolic"] = rng.randint(115, 160)
+    p["labs"]["Triglycerides"] = rng.randint(90, 300)
+    p["labs"]["HDL"] = rng.randint(25, 65)
+
+
+def generate_patient(rng, scenario):
+    p = _blank(rng)
+
+    if scenario.startswith("thyroid_"):
+        _thyroid(rng, p, scenario.split("_", 1)[1])
+    elif scenario in ("diabetes", "prediabetes", "normoglycemic"):
+        _glycemia(rng, p, scenario)
+    elif scenario == "pcos_two_criteria":
+        _pcos(rng, p, 2)
+    elif scenario == "pcos_one_criterion":
+        _pcos(rng, p, 1)
+    elif scenario.startswith("adrenal_"):
+        _adrenal(rng, p, scenario.split("_", 1)[1])
+    elif scenario == "metabolic":
+        _metabolic(rng, p)
+        _glycemia(rng, p, rng.choice(["prediabetes", "normoglycemic"]))
+    elif scenario == "multi_domain":
+        _thyroid(rng, p, rng.choice(["overt", "subclinical"]))
+        _glycemia(rng, p, rng.choice(["diabetes", "prediabetes"]))
+        if p["demographics"]["sex"] == "female":
+            _pcos(rng, p, rng.choice([1, 2]))
+    elif scenario == "critical":
+        if rng.random() < 0.5:
+            p["labs"]["fbs"] = rng.randint(300, 600)
+        else:
+            # Flat bp_* keys take precedence over the nested blood_pressure
+            p["vitals"]["bp_systolic"] = rng.randint(180, 230)
+            p["vitals"]["bp_diastolic"] = rng.randint(100, 140)
+    elif scenario == "empty":
+        p["vitals"] = {}
+        p["symptoms"] = {}
+
+    return p
+
+
+def generate_patients(n, seed=0, scenarios=None):
+    """
+    Return n patient_data dicts; identical for the same seed.
+    """
+    rng = random.Random(seed)
+    scenarios = scenarios or SCENARIOS
+    names = list(scenarios)
+    weights = [scenarios[name] for name in names]
+
+    return [generate_patient(rng, rng.choices(names, weights)[0]) for _ in range(n)]
+
+
+def rule_outcomes(patients):
+    """
+    Set of (rule, condition) outcomes reached by the patients, plus the
+    top-level paths of run_clinical_reasoning; used to check coverage.
+    """
+    from clinical_reasoning.clinical_reasoning import critical_override, has_minimum_clinical_data
+    from clinical_reasoning.rules import (
+        adrenal_logic, diabetes_logic, metabolic_syndrome_logic, pcos_logic, thyroid_logic,
+    )
+
+    seen = set()
+    for p in patients:
+        labs, symptoms = p.get("labs", {}), p.get("symptoms", {})
+        results = {
+            "thyroid": thyroid_logic(labs, symptoms),
+            "diabetes": diabetes_logic(labs),
+            "pcos": pcos_logic(labs, symptoms, p.get("demographics", {})),
+            "adrenal": adrenal_logic(labs),
+            "metabolic_syndrome": metabolic_syndrome_logic(p.get("vitals", {}), labs),
+        }
+        for rule, result in results.items():
+            seen.add((rule, result["condition"] if result else None))
+
+        if critical_override(p):
+            seen.add(("path", "critical_override"))
+        if not has_minimum_clinical_data(p):
+            seen.add(("path", "insufficient_data"))
+
+    return seen
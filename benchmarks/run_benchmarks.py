@@ -0,0 +1,335 @@
+# run_benchmarks.py
+#
+# Reproducible micro/macro benchmarks for the reasoning and ingestion paths.
+#
+#   python -m benchmarks.run_benchmarks                      # print results
+#   python -m benchmarks.run_benchmarks --write-baseline     # save baseline
+#   python -m benchmarks.run_benchmarks --compare            # fail on regressions
+#
+# Retrieval and the LLM are stubbed for the end-to-end benchmark so it
+# measures our own code; the embedding and vector-query benchmarks run
+# only when their dependencies (and a built vector store) are available.
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from benchmarks.patient_generator import generate_patients
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+TOLERANCE = 0.25     # allowed slowdown vs. baseline before flagging
+
+
+class Skip(Exception):
+    pass
+
+
+def measure(fn, ops, repeat):
+    """
+    Call fn() `repeat` times; each call performs `ops` operations.
+    Returns per-operation timing statistics in microseconds.
+    """
+    fn()  # warm-up
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) / ops * 1e6)
+
+    samples.sort()
+
+    def pct(q):
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    mean = statistics.fmean(samples)
+    return {
+        "ops_per_call": ops,
+        "repeat": repeat,
+        "mean_us": mean,
+        "p50_us": pct(0.50),
+        "p95_us": pct(0.95),
+        "p99_us": pct(0.99),
+        "ops_per_sec": 1e6 / mean if mean else None,
+    }
+
+
+# -----------------------------
+# Benchmarks
+# -----------------------------
+
+def bench_rules_scalar(patients, repeat):
+    # Legacy rules.py functions, kept as the reference for rules_compiled
+    from clinical_reasoning.rules import (
+        adrenal_logic, diabetes_logic, metabolic_syndrome_logic, pcos_logic, thyroid_logic,
+    )
+
+    def run():
+        for p in patients:
+            labs, symptoms = p.get("labs", {}), p.get("symptoms", {})
+            thyroid_logic(labs, symptoms)
+            diabetes_logic(labs)
+            pcos_logic(labs, symptoms, p.get("demographics", {}))
+            adrenal_logic(labs)
+            metabolic_syndrome_logic(p.get("vitals", {}), labs)
+
+    return measure(run, len(patients), repeat)
+
+
+def bench_rules_compiled(patients, repeat):
+    # The request path: the compiled rule set over parsed records
+    # (untimed, like the scalar benchmark)
+    from clinical_reasoning.patient_record import as_record
+    from clinical_reasoning.rule_engine import get_rule_engine
+
+    ruleset = get_rule_engine().ruleset
+    records = [as_record(p) for p in patients]
+
+    def run():
+        for record in records:
+            ruleset.evaluate(record, timed=False)
+
+    return measure(run, len(records), repeat)
+
+
+def bench_rules_batch(patients, repeat):
+    try:
+        from clinical_reasoning.rules_batch import columns_from_patients, evaluate_batch
+    except ImportError as e:
+        raise Skip(str(e))
+
+    columns = columns_from_patients(patients)
+    return measure(lambda: evaluate_batch(columns), len(patients), repeat)
+
+
+def bench_reasoning_end_to_end(patients, repeat):
+    import clinical_reasoning.clinical_reasoning as cr
+    from clinical_reasoning.explanation_cache import ExplanationCache
+    from clinical_reasoning.llm_layer import LLMBackend
+
+    class EchoBackend(LLMBackend):
+        model = "benchmark-stub"
+
+        def stream(self, prompt):
+            yield "Findings may be consistent with a possible pattern."
+
+    guideline = ["Guideline paragraph used for the benchmark.\n\nSecond paragraph."]
+
+    original_retrieve, original_llm = cr.retrieve_guidelines, cr.llm_explanation
+    backend = EchoBackend()
+    cache = ExplanationCache(max_entries=0)   # always miss: measure the call path
+
+    cr.retrieve_guidelines = lambda query, domain, n_results=3: guideline
+    cr.llm_explanation = lambda findings, guideline_context: original_llm(
+        findings, guideline_context, backend=backend, cache=cache
+    )
+    try:
+        return measure(
+            lambda: [cr.run_clinical_reasoning(p) for p in patients],
+            len(patients), repeat
+        )
+    finally:
+        cr.retrieve_guidelines, cr.llm_explanation = original_retrieve, original_llm
+
+
+def _synthetic_guideline_text(n_paragraphs, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    vocab = (
+        "thyroid stimulating hormone free thyroxine glucose fasting plasma hba1c "
+        "diagnosis screening recommended patients adults evidence level cortisol "
+        "adrenal insufficiency ovarian syndrome criteria clinical assessment"
+    ).split()
+
+    out = io.StringIO()
+    for _ in range(n_paragraphs):
+        for _ in range(rng.randint(3, 8)):
+            words = [rng.choice(vocab) for _ in range(rng.randint(8, 30))]
+            out.write(" ".join(words).capitalize() + ". ")
+        out.write("\n\n")
+    return out.getvalue()
+
+
+def bench_chunking(repeat):
+    from chunk_text import iter_chunks
+
+    text = _synthetic_guideline_text(2000)
+    words = len(text.split())
+
+    def run():
+        for _ in iter_chunks(io.StringIO(text)):
+            pass
+
+    stats = measure(run, words, repeat)
+    stats["unit"] = "word"
+    return stats
+
+
+def bench_embedding(repeat, batch_size=64):
+    try:
+        from embed_chunks import load_model
+        model = load_model()
+    except Exception as e:
+        raise Skip(f"embedding model unavailable: {e}")
+
+    text = _synthetic_guideline_text(200)
+    chunks = [c for c in text.split("\n\n") if c.strip()][:batch_size]
+
+    stats = measure(
+        lambda: model.encode(chunks, batch_size=batch_size, normalize_embeddings=True),
+        len(chunks), repeat
+    )
+    stats["unit"] = "chunk"
+    return stats
+
+
+def bench_vector_query(repeat):
+    from clinical_reasoning.retrieval import create_retriever
+
+    retriever = create_retriever()
+    if not retriever.retrieve("thyroid", "thyroid"):
+        raise Skip("vector store unavailable or empty")
+
+    queries = [
+        ("Likely thyroid dysfunction", "thyroid"),
+        ("Prediabetes pattern", "diabetes"),
+        ("Possible Polycystic Ovary Syndrome (PCOS)", "pcos"),
+        ("Possible adrenal insufficiency pattern", "adrenal"),
+    ]
+    return measure(
+        lambda: [retriever.retrieve(q, d) for q, d in queries],
+        len(queries), repeat
+    )
+
+
+def bench_app_import(repeat):
+    from benchmarks.import_time import profile_imports
+
+    samples = sorted(profile_imports("app")[0] for _ in range(repeat))
+    mean = statistics.fmean(samples)
+    return {
+        "ops_per_call": 1,
+        "repeat": repeat,
+        "mean_us": mean,
+        "p50_us": samples[len(samples) // 2],
+        "p95_us": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "p99_us": samples[-1],
+        "ops_per_sec": 1e6 / mean if mean else None,
+    }
+
+
+# -----------------------------
+# Runner
+# -----------------------------
+
+def run_all(n_patients, seed, repeat, only=None):
+    patients = generate_patients(n_patients, seed=seed)
+
+    benchmarks = {
+        "rules_scalar": lambda: bench_rules_scalar(patients, repeat),
+        "rules_compiled": lambda: bench_rules_compiled(patients, repeat),
+        "rules_batch": lambda: bench_rules_batch(patients, repeat),
+        "reasoning_end_to_end": lambda: bench_reasoning_end_to_end(patients, repeat),
+        "chunking": lambda: bench_chunking(max(3, repeat // 5)),
+        "embedding_batch": lambda: bench_embedding(max(3, repeat // 5)),
+        "vector_query": lambda: bench_vector_query(repeat),
+        "app_import": lambda: bench_app_import(max(3, repeat // 5)),
+    }
+
+    results = {}
+    for name, fn in benchmarks.items():
+        if only and name not in only:
+            continue
+        try:
+            results[name] = fn()
+        except Skip as e:
+            results[name] = {"skipped": str(e)}
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "patients": n_patients,
+            "seed": seed,
+            "repeat": repeat,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance=TOLERANCE):
+    """
+    Return [(name, baseline_us, current_us)] for benchmarks slower than
+    baseline by more than `tolerance`.
+    """
+    regressions = []
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "mean_us" not in base or "mean_us" not in stats:
+            continue
+        if stats["mean_us"] > base["mean_us"] * (1 + tolerance):
+            regressions.append((name, base["mean_us"], stats["mean_us"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clinical reasoning benchmarks")
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", nargs="*", help="run only these benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--write-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true",
+                        help="exit non-zero if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("-o", "--output", help="also write results JSON here")
+    args = parser.parse_args(argv)
+
+    report = run_all(args.patients, args.seed, args.repeat, args.only)
+
+    for name, stats in report["results"].items():
+        if "skipped" in stats:
+            print(f"{name:<24} skipped ({stats['skipped']})")
+        else:
+            print(
+                f"{name:<24} mean {stats['mean_us']:>10.2f} us  "
+                f"p95 {stats['p95_us']:>10.2f} us  {stats['ops_per_sec']:>12.0f} ops/s"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.write_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}")
+            return 2
+
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+        regressions = compare(report, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.2f} us → {after:.2f} us")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
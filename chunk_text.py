@@ -1,6 +1,8 @@
 import os
+import re
 import json
-import uuid
+import hashlib
+import argparse
 
 INPUT_ROOT = "extracted_text"
 OUTPUT_ROOT = "chunks"
@@ -8,7 +10,18 @@ OUTPUT_ROOT = "chunks"
 CHUNK_SIZE = 400      # words
 CHUNK_OVERLAP = 80    # words
 
-os.makedirs(OUTPUT_ROOT, exist_ok=True)
+# all-MiniLM-L6-v2 truncates input at 256 word pieces
+TOKEN_CHUNK_SIZE = 256
+TOKEN_CHUNK_OVERLAP = 48
+
+# Break at a paragraph boundary once a chunk is at least this full
+PARAGRAPH_FILL = 0.75
+
+# Text without sentence punctuation is cut into pseudo-sentences of this many words
+MAX_SENTENCE_WORDS = 200
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+
 
 def chunk_text(text, chunk_size=400, overlap=80):
     words = text.split()
@@ -28,42 +41,217 @@ def chunk_text(text, chunk_size=400, overlap=80):
 
     return chunks
 
-for root, dirs, files in os.walk(INPUT_ROOT):
-    for file in files:
-        if file.endswith(".txt"):
-            input_path = os.path.join(root, file)
 
-            # domain = folder name (diabetes, thyroid, etc.)
-            domain = os.path.basename(root)
+# -----------------------------
+# Streaming chunker
+# -----------------------------
+
+def word_count(text):
+    return len(text.split())
+
+
+def load_token_counter(model_name="all-MiniLM-L6-v2"):
+    """
+    Length function counting the embedding model's own word pieces.
+    """
+    from transformers import AutoTokenizer
+
+    if "/" not in model_name:
+        model_name = f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def token_count(text):
+        return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    return token_count
+
+
+def iter_sentences(lines):
+    """
+    Yield (sentence, starts_paragraph) from an iterable of text lines,
+    holding at most one partial sentence in memory.
+    """
+    pending = ""
+    new_paragraph = True
+
+    for line in lines:
+        line = line.strip()
+
+        if not line:
+            if pending:
+                yield pending, new_paragraph
+                pending = ""
+            new_paragraph = True
+            continue
+
+        pending = f"{pending} {line}" if pending else line
+        parts = SENTENCE_END.split(pending)
+        pending = parts.pop()
+
+        for sentence in parts:
+            yield sentence, new_paragraph
+            new_paragraph = False
+
+        words = pending.split()
+        while len(words) > MAX_SENTENCE_WORDS:
+            yield " ".join(words[:MAX_SENTENCE_WORDS]), new_paragraph
+            new_paragraph = False
+            words = words[MAX_SENTENCE_WORDS:]
+            pending = " ".join(words)
+
+    if pending:
+        yield pending, new_paragraph
+
+
+def iter_chunks(lines, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, length=word_count):
+    """
+    Yield chunks of at most `chunk_size` units (as measured by `length`),
+    built from whole sentences and preferring paragraph breaks. Trailing
+    sentences worth up to `overlap` units are repeated in the next chunk.
+    A sentence larger than a chunk is fed in word by word, so it is cut at
+    word boundaries and its pieces overlap like any other chunks.
+    """
+    window = []     # [(sentence, size)]
+    size = 0
+    fresh = 0       # sentences added since the last emitted chunk
+
+    for sentence, new_paragraph in iter_sentences(lines):
+        n = length(sentence)
+        pieces = [(w, length(w)) for w in sentence.split()] if n > chunk_size else [(sentence, n)]
+
+        for piece, n in pieces:
+            full = size + n > chunk_size
+            at_break = new_paragraph and size >= chunk_size * PARAGRAPH_FILL
+
+            if fresh and (full or at_break):
+                yield " ".join(s for s, _ in window)
+
+                keep, kept = [], 0
+                for s, k in reversed(window):
+                    if kept + k > overlap:
+                        break
+                    keep.append((s, k))
+                    kept += k
+                window, size, fresh = keep[::-1], kept, 0
+
+            # Overlap must never push the next chunk over the limit
+            while window and size + n > chunk_size:
+                size -= window.pop(0)[1]
+
+            window.append((piece, n))
+            size += n
+            fresh += 1
+            new_paragraph = False
+
+    if fresh:
+        yield " ".join(s for s, _ in window)
+
+
+def make_chunk_id(domain, source_file, chunk_index, text):
+    """
+    Deterministic id: the same chunk of the same file always hashes the
+    same, so re-running the pipeline upserts instead of duplicating.
+    """
+    h = hashlib.sha256()
+    for part in (domain, source_file, str(chunk_index), text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def chunk_output_path(input_path, domain, output_root=OUTPUT_ROOT):
+    file = os.path.basename(input_path)
+    output_file = file.replace(".txt", "_chunks.jsonl")
+    return os.path.join(output_root, domain, output_file)
+
+
+def iter_chunk_file(path):
+    """
+    Read chunk records back from a JSON Lines (or legacy JSON array) file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            yield from json.load(f)
+            return
+
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunk_file(input_path, domain, output_path, chunk_size=CHUNK_SIZE,
+               overlap=CHUNK_OVERLAP, length=word_count):
+    """
+    Stream one extracted text file into a JSON Lines chunk file. Returns
+    the chunk ids written (empty for files without text, which produce no
+    output file).
+    """
+    file = os.path.basename(input_path)
+    chunk_ids = []
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+
+    with open(input_path, "r", encoding="utf-8") as src, \
+            open(tmp_path, "w", encoding="utf-8") as out:
+        for idx, chunk in enumerate(iter_chunks(src, chunk_size, overlap, length)):
+            record = {
+                "chunk_id": make_chunk_id(domain, file, idx, chunk),
+                "domain": domain,
+                "source_file": file,
+                "chunk_index": idx,
+                "text": chunk
+            }
+            out.write(json.dumps(record, ensure_ascii=False))
+            out.write("\n")
+            chunk_ids.append(record["chunk_id"])
+
+    if not chunk_ids:
+        os.remove(tmp_path)
+        return []
+
+    os.replace(tmp_path, output_path)
+    return chunk_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk extracted guideline text")
+    parser.add_argument("--input-root", default=INPUT_ROOT)
+    parser.add_argument("--output-root", default=OUTPUT_ROOT)
+    parser.add_argument("--unit", choices=["words", "tokens"], default="words",
+                        help="measure chunk size in words or embedding-model tokens")
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--overlap", type=int)
+    args = parser.parse_args()
 
-            output_folder = os.path.join(OUTPUT_ROOT, domain)
-            os.makedirs(output_folder, exist_ok=True)
+    if args.unit == "tokens":
+        length = load_token_counter()
+        chunk_size = args.chunk_size or TOKEN_CHUNK_SIZE
+        overlap = args.overlap if args.overlap is not None else TOKEN_CHUNK_OVERLAP
+    else:
+        length = word_count
+        chunk_size = args.chunk_size or CHUNK_SIZE
+        overlap = args.overlap if args.overlap is not None else CHUNK_OVERLAP
 
-            with open(input_path, "r", encoding="utf-8") as f:
-                text = f.read()
+    os.makedirs(args.output_root, exist_ok=True)
 
-            if len(text.strip()) == 0:
-                print(f"⚠️ Empty file skipped: {input_path}")
-                continue
+    for root, dirs, files in os.walk(args.input_root):
+        for file in files:
+            if file.endswith(".txt"):
+                input_path = os.path.join(root, file)
 
-            chunks = chunk_text(text)
+                # domain = folder name (diabetes, thyroid, etc.)
+                domain = os.path.basename(root)
 
-            chunk_records = []
+                output_path = chunk_output_path(input_path, domain, args.output_root)
 
-            for idx, chunk in enumerate(chunks):
-                record = {
-                    "chunk_id": str(uuid.uuid4()),
-                    "domain": domain,
-                    "source_file": file,
-                    "chunk_index": idx,
-                    "text": chunk
-                }
-                chunk_records.append(record)
+                chunk_ids = chunk_file(input_path, domain, output_path, chunk_size, overlap, length)
+                if not chunk_ids:
+                    print(f"⚠️ Empty file skipped: {input_path}")
+                    continue
 
-            output_file = file.replace(".txt", "_chunks.json")
-            output_path = os.path.join(output_folder, output_file)
+                print(f"✅ Chunked: {input_path} → {output_path} ({len(chunk_ids)} chunks)")
 
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(chunk_records, f, indent=2)
 
-            print(f"✅ Chunked: {input_path} → {output_path}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# assessment_cache.py
+#
+# Memoized whole assessments. Resubmitting the same patient gives the same
+# result, so a complete (non-degraded) assessment is kept under a hash of
+# the canonical patient record together with the versions it was computed
+# from:
+#
+#   rules      RuleSet.version of the active rule file
+#   evidence   evidence table version
+#   index      on-disk stamp of the retrieval store
+#   model      LLM model name and system prompt version
+#
+# Versions are re-read at most every `check_interval` seconds; when any
+# of them changes the whole cache is dropped. A hit skips rules, retrieval
+# and the LLM.
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from clinical_reasoning.patient_record import PatientRecord
+
+
+def _canonical(value):
+    # Missing and None read the same to the rules; everything else
+    # (types, string case, list order) can change the result and is kept
+    if isinstance(value, PatientRecord):
+        # Who and when do not change the result; the trends do
+        values = value.as_dict()
+        values.pop("patient_id", None)
+        values.pop("visit_date", None)
+        return _canonical(values)
+    if isinstance(value, dict):
+        return {
+            str(key): _canonical(item)
+            for key, item in value.items()
+            if item is not None
+        }
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def canonical_patient_data(patient_data):
+    return json.dumps(
+        _canonical(patient_data), sort_keys=True, separators=(",", ":"), default=str
+    )
+
+
+def current_versions():
+    from clinical_reasoning.evidence_table import get_evidence_table
+    from clinical_reasoning.llm_layer import SYSTEM_PROMPT_VERSION, get_backend
+    from clinical_reasoning.retrieval import index_version
+    from clinical_reasoning.rule_engine import get_rule_engine
+
+    return {
+        "rules": get_rule_engine().ruleset.version,
+        "evidence": get_evidence_table().version,
+        "index": index_version(),
+        "model": [getattr(get_backend(), "model", None), SYSTEM_PROMPT_VERSION],
+    }
+
+
+class AssessmentCache:
+    """
+    LRU of finished assessments with TTL. Values are deep-copied on the way
+    in and out so callers may modify what they get.
+    """
+
+    def __init__(self, max_entries=4096, ttl=3600.0, check_interval=5.0,
+                 versions=current_versions):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._read_versions = versions
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = None
+        self._version_key = ""
+        self._last_check = 0.0
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    # -----------------------------
+    # Versions
+    # -----------------------------
+    def _check_versions(self):
+        now = time.monotonic()
+        if self._versions is not None and now - self._last_check < self.check_interval:
+            return self._version_key
+
+        versions = self._read_versions()
+        with self._lock:
+            self._last_check = now
+            if versions != self._versions:
+                if self._versions is not None:
+                    self._entries.clear()
+                    self._stats["invalidations"] += 1
+                self._versions = versions
+                self._version_key = json.dumps(versions, sort_keys=True, default=str)
+            return self._version_key
+
+    def invalidate(self):
+        """
+        Drop every entry and re-read the versions on the next lookup.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._versions = None
+            self._stats["invalidations"] += 1
+
+    # -----------------------------
+    # Entries
+    # -----------------------------
+    def key(self, patient_data):
+        h = hashlib.sha256()
+        h.update(self._check_versions().encode("utf-8"))
+        h.update(b"\0")
+        h.update(canonical_patient_data(patient_data).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, created = entry
+                if self.ttl is None or now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(result)
+
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key, result):
+        result = copy.deepcopy(result)
+
+        with self._lock:
+            self._entries[key] = (result, time.time())
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_assessment_cache():
+    """
+    Process-wide cache, configured from the environment:
+    ASSESSMENT_CACHE_SIZE (0 disables it) and ASSESSMENT_CACHE_TTL.
+    """
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AssessmentCache(
+                    max_entries=int(os.environ.get("ASSESSMENT_CACHE_SIZE", 4096)),
+                    ttl=float(os.environ.get("ASSESSMENT_CACHE_TTL", 3600)),
+                )
+
+    return _cache
+
+
+def set_assessment_cache(cache):
+    global _cache
+
+    with _cache_lock:
+        _cache = cache
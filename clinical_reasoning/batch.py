@@ -0,0 +1,214 @@
+# batch.py
+#
+# Batch re-screening over files of patient records.
+#
+#   python -m clinical_reasoning.batch patients.jsonl -o results.jsonl --workers 8
+#
+# Rules run for every record; guideline retrieval runs once per unique
+# (domain, condition) and the LLM once per unique (findings, excerpt) within
+# the run. Results are written as JSON Lines in input order, one block at a
+# time, so memory stays bounded on very large inputs.
+
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clinical_reasoning.clinical_reasoning import (
+    complete_assessment,
+    evaluate_rules,
+    fetch_guideline_excerpt,
+    generate_explanation,
+)
+from clinical_reasoning.patient_record import PatientRecord
+
+
+BLOCK_SIZE = 1000
+WORKERS = 4
+
+
+# -----------------------------
+# Input parsing
+# -----------------------------
+
+class InvalidRecord:
+    """
+    Stands in for a record that could not be parsed; the batch reports
+    `error` for it and carries on.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _parse_row(row):
+    if not isinstance(row, dict):
+        raise ValueError(f"expected a JSON object, got {type(row).__name__}")
+    if any(key in row for key in ("labs", "vitals", "symptoms", "demographics")):
+        return PatientRecord.from_patient_data(row)
+    return PatientRecord.parse(row)
+
+
+def read_records(path):
+    """
+    Yield (record_id, PatientRecord) from a .jsonl or .csv file.
+
+    JSONL lines may be nested patient_data dicts (with "labs", "vitals", ...)
+    or flat form-style records. A "patient_id" field is used as record id,
+    otherwise the 1-based line number. A line that cannot be parsed yields
+    an InvalidRecord instead, so one bad line does not end the run.
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for n, row in enumerate(csv.DictReader(f), start=1):
+                try:
+                    record = PatientRecord.parse(row)
+                except ValueError as e:
+                    yield row.get("patient_id") or n, InvalidRecord(f"{type(e).__name__}: {e}")
+                    continue
+                yield record.patient_id or n, record
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            row = None
+            try:
+                row = json.loads(line)
+                record = _parse_row(row)
+            except ValueError as e:
+                record_id = row.get("patient_id") if isinstance(row, dict) else None
+                yield record_id or n, InvalidRecord(f"{type(e).__name__}: {e}")
+                continue
+            yield record.patient_id or n, record
+
+
+# -----------------------------
+# Batch engine
+# -----------------------------
+
+class BatchRunner:
+    """
+    Runs rules per record and shares retrieval/LLM work across records.
+    """
+
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self._excerpts = {}        # (domain, condition) -> excerpt
+        self._explanations = {}    # (findings, excerpt) -> text
+        self.stats = {
+            "records": 0,
+            "retrievals": 0,
+            "llm_calls": 0,
+            "errors": 0,
+        }
+
+    def _resolve(self, executor, fn, keys, store, counter):
+        missing = [key for key in dict.fromkeys(keys) if key not in store]
+        for key, value in zip(missing, executor.map(fn, missing)):
+            store[key] = value
+        self.stats[counter] += len(missing)
+
+    def _excerpt(self, key):
+        return fetch_guideline_excerpt(*key)
+
+    def _explanation(self, key):
+        findings, excerpt = key
+        return generate_explanation({"findings": list(findings)}, excerpt)
+
+    def run_block(self, executor, block):
+        evaluated = []
+        for record_id, patient_data in block:
+            if isinstance(patient_data, InvalidRecord):
+                self.stats["errors"] += 1
+                evaluated.append((record_id, {"error": patient_data.error}, None))
+                continue
+            try:
+                assessment, pending = evaluate_rules(patient_data)
+            except Exception as e:
+                self.stats["errors"] += 1
+                assessment, pending = {"error": f"{type(e).__name__}: {e}"}, None
+            evaluated.append((record_id, assessment, pending))
+
+        pendings = [p for _, _, p in evaluated if p is not None]
+
+        self._resolve(
+            executor, self._excerpt,
+            [(p["domain"], p["condition"]) for p in pendings],
+            self._excerpts, "retrievals"
+        )
+        self._resolve(
+            executor, self._explanation,
+            [
+                (tuple(p["findings"]), self._excerpts[(p["domain"], p["condition"])])
+                for p in pendings if p["needs_llm"]
+            ],
+            self._explanations, "llm_calls"
+        )
+
+        for record_id, assessment, pending in evaluated:
+            self.stats["records"] += 1
+            if pending is not None:
+                excerpt = self._excerpts[(pending["domain"], pending["condition"])]
+                explanation = None
+                if pending["needs_llm"]:
+                    explanation = self._explanations[(tuple(pending["findings"]), excerpt)]
+                assessment = complete_assessment(assessment, excerpt, explanation)
+            yield record_id, assessment
+
+    def run(self, records, block_size=BLOCK_SIZE):
+        """
+        Yield (record_id, assessment) for every record, in input order.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            block = []
+            for record in records:
+                block.append(record)
+                if len(block) >= block_size:
+                    yield from self.run_block(executor, block)
+                    block = []
+            if block:
+                yield from self.run_block(executor, block)
+
+
+def run_batch(records, workers=WORKERS, block_size=BLOCK_SIZE):
+    return BatchRunner(workers=workers).run(records, block_size=block_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch clinical assessment over JSONL/CSV patient records")
+    parser.add_argument("input", help="patient records (.jsonl or .csv)")
+    parser.add_argument("-o", "--output", help="JSONL output (default: stdout)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="concurrent retrieval/LLM calls")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE,
+                        help="records evaluated per block")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    runner = BatchRunner(workers=args.workers)
+    start = time.perf_counter()
+
+    try:
+        for record_id, assessment in runner.run(read_records(args.input), args.block_size):
+            out.write(json.dumps({"patient_id": record_id, "assessment": assessment}, ensure_ascii=False))
+            out.write("\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    stats = runner.stats
+    print(
+        f"✅ {stats['records']} records in {elapsed:.1f}s "
+        f"({stats['retrievals']} retrievals, {stats['llm_calls']} LLM calls, "
+        f"{stats['errors']} errors)",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
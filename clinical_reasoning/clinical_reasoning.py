@@ -1,30 +1,18 @@
-from typing import override
-from clinical_reasoning.rules import (
-    thyroid_logic,
-    diabetes_logic,
-    pcos_logic,
-    adrenal_logic,
-    # metabolic_syndrome_logic
-)
+from clinical_reasoning.rule_engine import get_rule_engine
 from clinical_reasoning.retrieval import retrieve_guidelines
+from clinical_reasoning.evidence_table import excerpt_from, get_evidence_table
 from clinical_reasoning.llm_layer import llm_explanation
+from clinical_reasoning.metrics import EVIDENCE_LOOKUPS, FALLBACKS, timed
+from clinical_reasoning.patient_record import as_record
 
 
-def has_minimum_clinical_data(patient_data):
-    labs = patient_data.get("labs", {})
-    vitals = patient_data.get("vitals", {})
-    symptoms = patient_data.get("symptoms", {})
-
-    # Check if at least one meaningful value exists
-    has_labs = any(value is not None for value in labs.values())
-    has_vitals = any(
-        isinstance(v, dict) and any(val is not None for val in v.values())
-        or v is not None
-        for v in vitals.values()
-    )
-    has_symptoms = any(symptoms.values())
+# Domains whose explanation is written by rules, not the LLM
+RULE_BASED_EXPLANATIONS = ("diabetes",)
 
-    return has_labs or has_vitals or has_symptoms
+
+def has_minimum_clinical_data(patient_data):
+    # At least one lab, vital sign or symptom
+    return as_record(patient_data).has_clinical_data()
 
 
 def generate_diabetes_reasoning(labs, condition, risk, confidence):
@@ -67,18 +55,17 @@ def generate_diabetes_reasoning(labs, condition, risk, confidence):
 
 # ✅ CHANGE 1 — CLEANED (dead code removed, logic unchanged)
 def critical_override(patient_data):
-    labs = patient_data.get("labs", {})
-    vitals = patient_data.get("vitals", {})
+    record = as_record(patient_data)
 
     alerts = []
 
-    if labs.get("fbs") is not None and labs["fbs"] >= 300:
+    if record.fbs is not None and record.fbs >= 300:
         alerts.append("Severe hyperglycemia detected (FBS ≥ 300 mg/dL)")
 
-    if vitals.get("bp_systolic") is not None and vitals["bp_systolic"] >= 180:
+    if record.bp_systolic is not None and record.bp_systolic >= 180:
         alerts.append("Hypertensive crisis (SBP ≥ 180 mmHg)")
 
-    if vitals.get("bp_diastolic") is not None and vitals["bp_diastolic"] >= 120:
+    if record.bp_diastolic is not None and record.bp_diastolic >= 120:
         alerts.append("Hypertensive crisis (DBP ≥ 120 mmHg)")
 
     if alerts:
@@ -105,15 +92,28 @@ def normalize_risk(risk):
     return risk
 
 
-def run_clinical_reasoning(patient_data):
+def evaluate_rules(patient_data):
+    """
+    Deterministic phase of the assessment (no retrieval, no LLM).
+
+    Returns (assessment, pending). When pending is None the assessment is
+    final. Otherwise pending describes the evidence lookup and explanation
+    still needed for the primary condition; see complete_assessment().
+    patient_data is a PatientRecord (a patient_data dict is parsed once).
+    """
+    record = as_record(patient_data)
 
     # 🔴 STEP 1: SAFETY FIRST
-    override = critical_override(patient_data)
+    with timed("critical_override"):
+        override = critical_override(record)
     if override:
-        return override
+        return override, None
 
     # ✅ CHANGE 2 — DATA SUFFICIENCY CHECK (CRITICAL FIX)
-    if not has_minimum_clinical_data(patient_data):
+    with timed("data_sufficiency"):
+        sufficient = has_minimum_clinical_data(record)
+
+    if not sufficient:
         return {
             "primary": {
                 "condition": "Insufficient clinical data",
@@ -131,49 +131,26 @@ def run_clinical_reasoning(patient_data):
                 "This system provides clinical decision support and does not replace "
                 "professional medical judgment."
             )
-        }
+        }, None
 
-    labs = patient_data.get("labs", {})
-    vitals = patient_data.get("vitals", {})
-    symptoms = patient_data.get("symptoms", {})
-    demographics = patient_data.get("demographics", {})
+    ruleset = get_rule_engine().ruleset
 
     assessments = []
     borderline_findings = []
 
     # =========================
-    # PCOS – PRIORITY CHECK
-    # =========================
-    pcos_result = pcos_logic(labs, symptoms, demographics)
-    if pcos_result:
-        assessments.append(("pcos", pcos_result))
-
-    # =========================
-    # Thyroid
-    # =========================
-    thyroid_result = thyroid_logic(labs, symptoms)
-    if thyroid_result:
-        assessments.append(("thyroid", thyroid_result))
-        if thyroid_result["risk_level"] == "Moderate":
-            borderline_findings.extend(thyroid_result["clinical_findings"])
-
-    # =========================
-    # Diabetes
+    # Screening rules (rules.json; PCOS first)
     # =========================
-    diabetes_result = diabetes_logic(labs)
+    with timed("rules"):
+        matches = ruleset.evaluate(record)
 
-    # ✅ CHANGE 3 — ignore NORMAL diabetes results
-    if diabetes_result and diabetes_result["risk_level"] != "Low":
-        assessments.append(("diabetes", diabetes_result))
-        if diabetes_result["risk_level"] == "Moderate":
-            borderline_findings.extend(diabetes_result["clinical_findings"])
-
-    # =========================
-    # Adrenal
-    # =========================
-    adrenal_result = adrenal_logic(labs)
-    if adrenal_result:
-        assessments.append(("adrenal", adrenal_result))
+    for rule, result in matches:
+        # e.g. a normal glycemic status is not reported as an assessment
+        if not rule.reported(result):
+            continue
+        assessments.append((rule.domain, result))
+        if rule.borderline_risk and result["risk_level"] == rule.borderline_risk:
+            borderline_findings.extend(result["clinical_findings"])
 
     # =========================
     # No dominant disorder
@@ -199,58 +176,44 @@ def run_clinical_reasoning(patient_data):
             },
             "secondary": [],
             "disclaimer": "This system provides clinical decision support and does not replace professional medical judgment."
-        }
+        }, None
 
     # =========================
     # Sort by severity
     # =========================
-    RISK_PRIORITY = {
-        "High": 3,
-        "Moderate": 2,
-        "Low": 1
-    }
+    risk_priority = ruleset.risk_priority
 
     assessments.sort(
-        key=lambda x: RISK_PRIORITY.get(x[1].get("risk_level", "Low"), 0),
+        key=lambda x: risk_priority.get(x[1].get("risk_level", "Low"), 0),
         reverse=True
     )
 
     primary_domain, primary = assessments[0]
     secondary = assessments[1:]
 
-    # =========================
-    # Guideline retrieval (PRIMARY ONLY)
-    # =========================
-    guidelines = retrieve_guidelines(
-        query=primary.get("condition", ""),
-        domain=primary_domain
-    )
-    guideline_excerpt = guidelines[0].strip().split("\n\n")[0][:800] if guidelines else ""
-
     # =========================
     # Clinical Reasoning
     # =========================
     findings = primary.get("clinical_findings", [])
     confidence = primary.get("confidence", "Medium")
 
-    if primary_domain == "diabetes":
+    # Diabetes reasoning is rule-based; everything else goes to the LLM
+    if primary_domain in RULE_BASED_EXPLANATIONS:
         explanation = generate_diabetes_reasoning(
-            labs=labs,
+            labs={"fbs": record.fbs, "hba1c": record.hba1c},
             condition=primary.get("condition"),
             risk=primary.get("risk_level"),
             confidence=confidence
         )
     else:
-        try:
-            explanation = llm_explanation(
-                findings=findings,
-                guideline_context=guideline_excerpt
-            )
-        except Exception:
-            explanation = (
-                "Clinical findings suggest a possible endocrine pattern. "
-                "Further clinical correlation is advised."
-            )
+        explanation = None
+
+    pending = {
+        "domain": primary_domain,
+        "condition": primary.get("condition", ""),
+        "findings": findings,
+        "needs_llm": explanation is None,
+    }
 
     # =========================
     # Final Output
@@ -262,7 +225,7 @@ def run_clinical_reasoning(patient_data):
             "confidence": primary.get("confidence", "Medium"),
             "clinical_findings": primary.get("clinical_findings", []),
             "clinical_reasoning": explanation,
-            "supporting_evidence": guideline_excerpt,
+            "supporting_evidence": "",
             "evidence_domain": primary_domain,
         },
         "borderline_findings": list(set(borderline_findings)),
@@ -275,4 +238,66 @@ def run_clinical_reasoning(patient_data):
             for _, sec in secondary
         ],
         "disclaimer": "This system provides clinical decision support and does not replace professional medical judgment."
-    }
+    }, pending
+
+
+LLM_FALLBACK_EXPLANATION = (
+    "Clinical findings suggest a possible endocrine pattern. "
+    "Further clinical correlation is advised."
+)
+
+
+def fetch_guideline_excerpt(domain, condition):
+    # Known conditions were looked up when the index was built
+    excerpt = get_evidence_table().get(domain, condition)
+    if excerpt is not None:
+        EVIDENCE_LOOKUPS.inc(source="table")
+        return excerpt
+
+    # Guideline retrieval (PRIMARY ONLY)
+    EVIDENCE_LOOKUPS.inc(source="live")
+    with timed("retrieve_guidelines"):
+        guidelines = retrieve_guidelines(
+            query=condition,
+            domain=domain
+        )
+    return excerpt_from(guidelines)
+
+
+def generate_explanation(pending, guideline_excerpt):
+    try:
+        with timed("llm_explanation"):
+            return llm_explanation(
+                findings=pending["findings"],
+                guideline_context=guideline_excerpt
+            )
+    except Exception:
+        FALLBACKS.inc(stage="llm", reason="error")
+        return LLM_FALLBACK_EXPLANATION
+
+
+def complete_assessment(assessment, guideline_excerpt, explanation=None):
+    """
+    Fill the evidence and (for LLM domains) the explanation into an
+    assessment returned by evaluate_rules(). Returns a new dict.
+    """
+    primary = dict(assessment["primary"])
+    primary["supporting_evidence"] = guideline_excerpt
+    if explanation is not None:
+        primary["clinical_reasoning"] = explanation
+
+    return dict(assessment, primary=primary)
+
+
+def run_clinical_reasoning(patient_data):
+    assessment, pending = evaluate_rules(patient_data)
+    if pending is None:
+        return assessment
+
+    guideline_excerpt = fetch_guideline_excerpt(pending["domain"], pending["condition"])
+
+    explanation = None
+    if pending["needs_llm"]:
+        explanation = generate_explanation(pending, guideline_excerpt)
+
+    return complete_assessment(assessment, guideline_excerpt, explanation)
@@ -0,0 +1,332 @@
+# corpus_snapshot.py
+#
+# The whole guideline corpus as one read-only, memory-mapped file, shared
+# by every worker process through the page cache.
+#
+# Layout (all sections 64-byte aligned):
+#
+#   magic      b"CDSSNAP1"
+#   header     uint64 length + JSON: model, dim, count, domain row ranges,
+#              string tables and the offset/dtype/shape of each section
+#   vectors    float32 (count, dim), unit length, rows grouped by domain
+#   text_offsets  int64 (count + 1) byte offsets into text
+#   text       packed UTF-8 chunk texts
+#   domain     uint16 index into header["domains"]
+#   source     uint32 index into header["sources"]
+#   chunk_index   uint32
+#   chunk_id   S32 content-hash ids (see chunk_text.make_chunk_id)
+#
+# Because rows are grouped by domain, a domain query is one matrix-vector
+# product over a contiguous slice.
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "corpus.snapshot")
+
+MAGIC = b"CDSSNAP1"
+FORMAT_VERSION = 1
+ALIGN = 64
+
+
+def _pad_to(f, offset):
+    f.write(b"\0" * (offset - f.tell()))
+
+
+def write_snapshot(records, embeddings, path=SNAPSHOT_PATH, model_name=None):
+    """
+    Write chunk records and their unit-length embeddings (row i belongs to
+    records[i]) as a snapshot, replacing `path` atomically.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(records) != len(embeddings):
+        raise ValueError("records and embeddings differ in length")
+
+    # Group rows by domain (stable, so chunk order within a source is kept)
+    domains = sorted({r["domain"] for r in records})
+    domain_ids = {d: i for i, d in enumerate(domains)}
+    order = sorted(range(len(records)), key=lambda i: domain_ids[records[i]["domain"]])
+    records = [records[i] for i in order]
+    vectors = np.ascontiguousarray(embeddings[order]) if len(order) else embeddings.reshape(0, 0)
+
+    sources = sorted({r["source_file"] for r in records})
+    source_ids = {s: i for i, s in enumerate(sources)}
+
+    texts = [r["text"].encode("utf-8") for r in records]
+    text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in texts], out=text_offsets[1:])
+
+    domain_col = np.array([domain_ids[r["domain"]] for r in records], dtype=np.uint16)
+    arrays = {
+        "vectors": vectors,
+        "text_offsets": text_offsets,
+        "domain": domain_col,
+        "source": np.array([source_ids[r["source_file"]] for r in records], dtype=np.uint32),
+        "chunk_index": np.array([r["chunk_index"] for r in records], dtype=np.uint32),
+        "chunk_id": np.array([r["chunk_id"] for r in records], dtype="S32"),
+    }
+
+    ranges = {}
+    for i, domain in enumerate(domains):
+        rows = np.flatnonzero(domain_col == i)
+        ranges[domain] = [int(rows[0]), int(rows[-1]) + 1]
+
+    # Section offsets are computed before writing so the header comes first
+    sections = {}
+    position = 0
+    for name, array in arrays.items():
+        position += -position % ALIGN
+        sections[name] = {"offset": position, "dtype": array.dtype.str, "shape": list(array.shape)}
+        position += array.nbytes
+        if name == "text_offsets":
+            position += -position % ALIGN
+            sections["text"] = {"offset": position, "nbytes": int(text_offsets[-1])}
+            position += int(text_offsets[-1])
+
+    header = {
+        "format": FORMAT_VERSION,
+        "model": model_name,
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 and len(vectors) else 0,
+        "count": len(records),
+        "built": time.time(),
+        "domains": domains,
+        "domain_rows": ranges,
+        "sources": sources,
+        "sections": sections,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = len(MAGIC) + 8 + len(header_bytes)
+    data_start += -data_start % ALIGN
+    header["data_start"] = data_start
+    header_bytes = json.dumps(header).encode("utf-8")
+    # data_start itself grew the header; re-pad until it fits
+    while len(MAGIC) + 8 + len(header_bytes) > data_start:
+        data_start += ALIGN
+        header["data_start"] = data_start
+        header_bytes = json.dumps(header).encode("utf-8")
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+
+        for name, array in arrays.items():
+            _pad_to(f, data_start + sections[name]["offset"])
+            f.write(array.tobytes())
+            if name == "text_offsets":
+                _pad_to(f, data_start + sections["text"]["offset"])
+                for text in texts:
+                    f.write(text)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return header
+
+
+class CorpusSnapshot:
+    """
+    Read-only view of a snapshot file. Arrays are zero-copy views into one
+    shared mapping.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path}: empty snapshot file")
+
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: not a corpus snapshot")
+
+        (header_len,) = struct.unpack_from("<Q", self._map, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(self._map[start:start + header_len].decode("utf-8"))
+        if self.header.get("format") != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path}: unsupported snapshot format {self.header.get('format')}")
+
+        base = self.header["data_start"]
+        sections = self.header["sections"]
+        for name, section in sections.items():
+            if name == "text":
+                continue
+            dtype = np.dtype(section["dtype"])
+            count = int(np.prod(section["shape"])) if section["shape"] else 0
+            array = np.frombuffer(self._map, dtype=dtype, count=count, offset=base + section["offset"])
+            setattr(self, name, array.reshape(section["shape"]))
+
+        self._text_base = base + sections["text"]["offset"]
+        self.domains = self.header["domains"]
+        self.sources = self.header["sources"]
+        self.domain_rows = {d: tuple(r) for d, r in self.header["domain_rows"].items()}
+        self.version = f"{self.header['count']}@{self.header['built']:.0f}"
+
+    def __len__(self):
+        return self.header["count"]
+
+    def text(self, i):
+        start = self._text_base + int(self.text_offsets[i])
+        end = self._text_base + int(self.text_offsets[i + 1])
+        return self._map[start:end].decode("utf-8")
+
+    def metadata(self, i):
+        return {
+            "domain": self.domains[self.domain[i]],
+            "source_file": self.sources[self.source[i]],
+            "chunk_index": int(self.chunk_index[i]),
+            "chunk_id": self.chunk_id[i].decode("ascii"),
+        }
+
+    def row_ids(self):
+        """
+        {chunk_id: row}, for reusing vectors across rebuilds.
+        """
+        return {cid.decode("ascii"): i for i, cid in enumerate(self.chunk_id)}
+
+    def search(self, query_vector, domain, k):
+        """
+        [(score, row)] for the best k rows of `domain`, best first.
+        """
+        rows = self.domain_rows.get(domain)
+        if rows is None or k <= 0:
+            return []
+
+        start, end = rows
+        scores = self.vectors[start:end] @ np.asarray(query_vector, dtype=np.float32)
+        k = min(k, end - start)
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), start + int(i)) for i in top]
+
+    def close(self):
+        # Views into the mapping must be gone before it can be closed
+        for name in list(self.header.get("sections", {}) if hasattr(self, "header") else ()):
+            self.__dict__.pop(name, None)
+        try:
+            self._map.close()
+        except (BufferError, AttributeError):
+            # Still referenced by an in-flight search; released with it
+            pass
+        self._file.close()
+
+
+class SnapshotRetriever:
+    """
+    Retrieval backend over a corpus snapshot; same interface as
+    FaissRetriever. A replaced snapshot file is picked up on the next check.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, check_interval=5.0):
+        self.path = os.path.abspath(path)
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stamp = None
+        self._last_check = 0.0
+
+        self._stats = {
+            "opens": 0,
+            "open_errors": 0,
+            "open_seconds_total": 0.0,
+            "last_open_seconds": None,
+            "queries": 0,
+            "query_errors": 0,
+            "query_seconds_total": 0.0,
+            "last_query_seconds": None,
+        }
+
+    def _current_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _get_snapshot(self):
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._last_check < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            if self._last_check and now - self._last_check < self.check_interval:
+                return self._snapshot
+            self._last_check = now
+
+            stamp = self._current_stamp()
+            if stamp == self._stamp:
+                return self._snapshot
+
+            start = time.perf_counter()
+            try:
+                snapshot = CorpusSnapshot(self.path) if stamp else None
+            except (OSError, ValueError):
+                self._stats["open_errors"] += 1
+                snapshot = None
+            finally:
+                elapsed = time.perf_counter() - start
+                self._stats["last_open_seconds"] = elapsed
+                self._stats["open_seconds_total"] += elapsed
+
+            # The old mapping is left to the garbage collector: requests
+            # still holding it finish on the old snapshot
+            self._snapshot = snapshot
+            self._stamp = stamp
+            if snapshot is not None:
+                self._stats["opens"] += 1
+            return snapshot
+
+    def open_all(self):
+        snapshot = self._get_snapshot()
+        return sorted(snapshot.domain_rows) if snapshot is not None else []
+
+    def search(self, query, domain, n_results=3):
+        snapshot = self._get_snapshot()
+        if snapshot is None or domain not in snapshot.domain_rows:
+            return []
+
+        from clinical_reasoning.embedding import encode_queries
+
+        start = time.perf_counter()
+        try:
+            hits = snapshot.search(encode_queries([query])[0], domain, n_results)
+        except Exception:
+            self._stats["query_errors"] += 1
+            return []
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stats["last_query_seconds"] = elapsed
+            self._stats["query_seconds_total"] += elapsed
+
+        self._stats["queries"] += 1
+        return [(score, snapshot.text(i), snapshot.metadata(i)) for score, i in hits]
+
+    def retrieve(self, query, domain, n_results=3):
+        return [text for _, text, _ in self.search(query, domain, n_results)]
+
+    def close(self):
+        with self._lock:
+            self._snapshot = None
+            self._stamp = None
+            self._last_check = 0.0
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        snapshot["store_path"] = self.path
+        snapshot["is_open"] = self._snapshot is not None
+        return snapshot
@@ -0,0 +1,37 @@
+# embedding.py
+#
+# Query-side embedding for the in-process vector backends (FAISS and
+# friends). Uses the same model as embed_chunks.py; loaded once, lazily.
+
+import os
+import threading
+
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    global _model
+
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(EMBEDDING_MODEL)
+
+    return _model
+
+
+def encode_queries(texts):
+    """
+    Unit-length float32 embeddings, shape (len(texts), dim).
+    """
+    return get_embedding_model().encode(
+        list(texts),
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype("float32", copy=False)
@@ -0,0 +1,193 @@
+# evidence_table.py
+#
+# Precomputed guideline evidence for every condition the rules can emit.
+#
+# The primary condition string always comes from the fixed set in rules.json,
+# so the retrieval query and the excerpt slicing are fully determined once
+# the index is built. The ingestion pipeline writes the excerpts to a small
+# JSON table keyed by (domain, condition); the app loads it once and only
+# falls back to live vector search for conditions not in the table.
+#
+#   python -m clinical_reasoning.evidence_table            # build from the live index
+#   python -m clinical_reasoning.evidence_table --show     # print the current table
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+EVIDENCE_TABLE_PATH = os.environ.get("EVIDENCE_TABLE_PATH", "evidence_table.json")
+TABLE_FORMAT = 1
+
+EXCERPT_CHARS = 800
+
+
+def excerpt_from(guidelines):
+    """
+    First paragraph (at most EXCERPT_CHARS) of the best-matching chunk.
+    """
+    return guidelines[0].strip().split("\n\n")[0][:EXCERPT_CHARS] if guidelines else ""
+
+
+def known_conditions(ruleset=None):
+    """
+    [(domain, condition)] for every condition the enabled rules can
+    produce (overrides, outcomes and the otherwise result), in rule-file
+    order. `ruleset` defaults to the rule engine's current one.
+    """
+    if ruleset is None:
+        from clinical_reasoning.rule_engine import get_rule_engine
+        ruleset = get_rule_engine().ruleset
+
+    conditions = []
+    for rule in ruleset.enabled_rules:
+        results = [result for _, result in rule.overrides]
+        results += [result for _, _, result in rule.outcomes]
+        if rule.otherwise is not None:
+            results.append(rule.otherwise)
+        for result in results:
+            if (rule.domain, result["condition"]) not in conditions:
+                conditions.append((rule.domain, result["condition"]))
+    return conditions
+
+
+def _key(domain, condition):
+    return f"{domain}\t{condition}"
+
+
+def build_table(retrieve, conditions=None, source=None):
+    """
+    Run `retrieve(query, domain)` once per known condition and return the
+    table dict. `source` describes the index it was built from.
+    """
+    entries = {}
+    for domain, condition in conditions or known_conditions():
+        entries[_key(domain, condition)] = excerpt_from(retrieve(condition, domain))
+
+    digest = hashlib.sha256(
+        json.dumps(entries, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()[:12]
+
+    return {
+        "format": TABLE_FORMAT,
+        "version": digest,
+        "built": time.time(),
+        "source": source or {},
+        "entries": entries,
+    }
+
+
+def save_table(table, path=EVIDENCE_TABLE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(table, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class EvidenceTable:
+    """
+    Read-only (domain, condition) -> excerpt lookup loaded from disk.
+    Empty excerpts are kept: "the index has nothing for this condition" is
+    also a precomputed answer.
+    """
+
+    def __init__(self, path=EVIDENCE_TABLE_PATH):
+        self.path = path
+        self.version = None
+        self._entries = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+        except (OSError, ValueError):
+            self.version = None
+            self._entries = {}
+            return False
+
+        if table.get("format") != TABLE_FORMAT:
+            self.version = None
+            self._entries = {}
+            return False
+
+        self.version = table.get("version")
+        self._entries = table.get("entries", {})
+        return True
+
+    def get(self, domain, condition):
+        """
+        The precomputed excerpt, or None when the condition is unknown.
+        """
+        return self._entries.get(_key(domain, condition))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_evidence_table():
+    global _table
+
+    if _table is None:
+        with _table_lock:
+            if _table is None:
+                _table = EvidenceTable()
+
+    return _table
+
+
+def reload_evidence_table():
+    table = get_evidence_table()
+    with _table_lock:
+        table.load()
+    return table
+
+
+def rebuild_evidence_table(path=EVIDENCE_TABLE_PATH, backend=None):
+    """
+    Rebuild the table from a retrieval backend (default: the configured
+    one) and save it.
+    """
+    from clinical_reasoning.retrieval import RETRIEVAL_BACKEND, create_retriever
+
+    backend = backend or RETRIEVAL_BACKEND
+    retriever = create_retriever(backend)
+    try:
+        table = build_table(
+            lambda query, domain: retriever.retrieve(query, domain),
+            source={"backend": backend, "store_path": retriever.stats().get("store_path")}
+        )
+    finally:
+        retriever.close()
+
+    save_table(table, path)
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the precomputed evidence table")
+    parser.add_argument("--path", default=EVIDENCE_TABLE_PATH)
+    parser.add_argument("--backend", choices=["snapshot", "chroma", "faiss", "bm25", "hybrid"], default=None)
+    parser.add_argument("--show", action="store_true", help="print the table instead of building it")
+    args = parser.parse_args()
+
+    if args.show:
+        table = EvidenceTable(args.path)
+        print(f"version {table.version}, {len(table)} entries")
+        for key, excerpt in sorted(table._entries.items()):
+            domain, condition = key.split("\t")
+            print(f"  {domain:<10} {condition:<55} {len(excerpt):>4} chars")
+    else:
+        table = rebuild_evidence_table(args.path, args.backend)
+        empty = sum(1 for excerpt in table["entries"].values() if not excerpt)
+        print(
+            f"✅ Evidence table {table['version']}: {len(table['entries'])} conditions "
+            f"({empty} without evidence) → {args.path}"
+        )
@@ -0,0 +1,305 @@
+# explanation_cache.py
+#
+# Content-addressed cache for LLM explanations. Keys are a hash of the full
+# prompt, the model name and the SYSTEM_PROMPT version, so any change to the
+# findings, guideline excerpt, model or prompt template is a different entry.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(prompt, model, prompt_version):
+    h = hashlib.sha256()
+    for part in (prompt_version, model, prompt):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+JOBS_DIR = "jobs"
+
+
+class ExplanationCache:
+    """
+    In-memory LRU with TTL, optionally backed by an on-disk tier.
+
+    Memory entries are evicted least-recently-used once `max_entries` is
+    exceeded. The disk tier stores one small JSON file per key and is
+    trimmed (oldest first) once it holds more than `max_disk_entries`.
+    Explanation job states live apart from it, under jobs/, and expire
+    after `job_ttl` seconds.
+    """
+
+    def __init__(self, max_entries=1024, ttl=86400.0, disk_dir=None,
+                 max_disk_entries=10000, job_ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = os.path.abspath(disk_dir) if disk_dir else None
+        self.max_disk_entries = max_disk_entries
+        self.job_ttl = job_ttl
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_count = None
+        self._jobs_swept = 0.0
+
+        self._stats = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_evictions": 0,
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    # -----------------------------
+    # Memory tier
+    # -----------------------------
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key):
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                text, created = entry
+                if not self._expired(created, now):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return text
+
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+        record = self._disk_get(key, now)
+        if record is not None:
+            with self._lock:
+                self._memory_put(key, record["text"], record["created"])
+                self._stats["disk_hits"] += 1
+            return record["text"]
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def _memory_put(self, key, text, created):
+        self._entries[key] = (text, created)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def put(self, key, text, **tags):
+        if not text:
+            return
+
+        created = time.time()
+        with self._lock:
+            self._memory_put(key, text, created)
+
+        self._disk_put(key, text, created, tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+        lookups = snapshot["hits"] + snapshot["disk_hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = (
+            (snapshot["hits"] + snapshot["disk_hits"]) / lookups if lookups else 0.0
+        )
+        return snapshot
+
+    # -----------------------------
+    # Disk tier
+    # -----------------------------
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self._expired(record.get("created", 0), now):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._lock:
+                self._stats["expirations"] += 1
+            return None
+
+        return record
+
+    def _disk_put(self, key, text, created, tags):
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        is_new = not os.path.exists(path)
+
+        record = dict(tags, key=key, text=text, created=created)
+
+        # Write-then-rename so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+        if is_new:
+            with self._lock:
+                if self._disk_count is None:
+                    self._disk_count = sum(1 for _ in self._disk_files())
+                else:
+                    self._disk_count += 1
+                over = self._disk_count > self.max_disk_entries
+            if over:
+                self._trim_disk()
+
+    # -----------------------------
+    # Job status (disk tier only)
+    # -----------------------------
+    # Kept under jobs/ so they neither count toward max_disk_entries nor
+    # push explanations out when the tier is trimmed.
+
+    def _job_path(self, key):
+        return os.path.join(self.disk_dir, JOBS_DIR, key + ".json")
+
+    def put_job_status(self, key, status, error=None):
+        """
+        Record the state of the explanation job for `key` so other worker
+        processes can tell a running job from a failed or unknown one.
+        """
+        if not self.disk_dir:
+            return
+
+        path = self._job_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        now = time.time()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"status": status, "error": error, "created": now}, f)
+        os.replace(tmp_path, path)
+
+        # A sweep every tenth of the TTL keeps the directory bounded
+        if self.job_ttl is not None and now - self._jobs_swept > self.job_ttl / 10:
+            self._jobs_swept = now
+            self._sweep_jobs(now)
+
+    def job_status(self, key):
+        if not self.disk_dir:
+            return None
+
+        path = self._job_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # e.g. left "running" by a worker that died
+        if self.job_ttl is not None and time.time() - state.get("created", 0) > self.job_ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return state
+
+    def _sweep_jobs(self, now):
+        jobs_dir = os.path.join(self.disk_dir, JOBS_DIR)
+        for name in os.listdir(jobs_dir):
+            path = os.path.join(jobs_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.job_ttl:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def _disk_files(self):
+        for shard in os.listdir(self.disk_dir):
+            shard_path = os.path.join(self.disk_dir, shard)
+            if shard == JOBS_DIR or not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                if name.endswith(".json"):
+                    yield os.path.join(shard_path, name)
+
+    def _trim_disk(self):
+        # Drop the oldest ~10% below the limit so trimming is not per-write
+        files = []
+        for path in self._disk_files():
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        files.sort()
+
+        target = int(self.max_disk_entries * 0.9)
+        removed = 0
+        for _, path in files[:max(len(files) - target, 0)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+
+        with self._lock:
+            self._disk_count = len(files) - removed
+            self._stats["disk_evictions"] += removed
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_explanation_cache():
+    """
+    Process-wide cache, configured from the environment:
+    EXPLANATION_CACHE_SIZE, EXPLANATION_CACHE_TTL, EXPLANATION_CACHE_DIR,
+    EXPLANATION_JOB_TTL.
+    """
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExplanationCache(
+                    max_entries=int(os.environ.get("EXPLANATION_CACHE_SIZE", 1024)),
+                    ttl=float(os.environ.get("EXPLANATION_CACHE_TTL", 86400)),
+                    disk_dir=os.environ.get("EXPLANATION_CACHE_DIR") or None,
+                    job_ttl=float(os.environ.get("EXPLANATION_JOB_TTL", 3600)),
+                )
+
+    return _cache
+
+
+def set_explanation_cache(cache):
+    global _cache
+
+    with _cache_lock:
+        _cache = cache
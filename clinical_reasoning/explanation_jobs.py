@@ -0,0 +1,245 @@
+# explanation_jobs.py
+#
+# Background explanation generation for the two-phase workspace flow: the
+# rule-based assessment is returned immediately with a job id, and the LLM
+# tokens are streamed to the browser as they arrive.
+#
+# The job id is the explanation cache key. Identical requests share one
+# job, and under a multi-worker server a worker that did not start the job
+# can still answer from the shared on-disk explanation cache. The worker
+# running a job records its state (running, done, error) next to the cache
+# entry, so the others stop waiting on a failed job and reject unknown ids.
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clinical_reasoning.explanation_cache import get_explanation_cache
+from clinical_reasoning.llm_layer import (
+    build_prompt, explanation_cache_key, get_backend, llm_explanation_stream,
+)
+from clinical_reasoning.metrics import FALLBACKS, timed
+
+
+JOB_TTL = 600.0        # seconds a finished job stays readable
+MAX_JOBS = 1000
+
+# How often a job started by another worker is looked for in the cache
+CACHE_POLL_INTERVAL = 0.25
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ExplanationJob:
+
+    def __init__(self, job_id, findings, guideline_context, fallback, cache=None):
+        self.job_id = job_id
+        self.cache = cache if cache is not None else get_explanation_cache()
+        self.findings = findings
+        self.guideline_context = guideline_context
+        self.fallback = fallback
+        self.tokens = []
+        self.status = "pending"        # pending | running | done | error
+        self.error = None
+        self.created = time.monotonic()
+        self.finished = None
+        self._cond = threading.Condition()
+
+    @property
+    def text(self):
+        if self.status == "error":
+            return self.fallback
+        return "".join(self.tokens).strip()
+
+    def _append(self, token):
+        with self._cond:
+            self.tokens.append(token)
+            self._cond.notify_all()
+
+    def _finish(self, status, error=None):
+        with self._cond:
+            self.status = status
+            self.error = error
+            self.finished = time.monotonic()
+            self._cond.notify_all()
+
+        try:
+            self.cache.put_job_status(self.job_id, status, error)
+        except OSError:
+            pass
+
+    def run(self):
+        self.status = "running"
+        try:
+            with timed("llm_explanation_stream"):
+                for token in llm_explanation_stream(self.findings, self.guideline_context):
+                    self._append(token)
+        except Exception as e:
+            FALLBACKS.inc(stage="llm", reason="error")
+            self._finish("error", f"{type(e).__name__}: {e}")
+        else:
+            self._finish("done")
+
+    def events(self, timeout=None):
+        """
+        Yield ("token", text) for every token (from the beginning, so late
+        subscribers catch up), then ("done", full_text) or
+        ("error", fallback_text).
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        sent = 0
+
+        while True:
+            with self._cond:
+                while sent == len(self.tokens) and self.status in ("pending", "running"):
+                    remaining = deadline - time.monotonic() if deadline else None
+                    if remaining is not None and remaining <= 0:
+                        yield "error", self.fallback
+                        return
+                    self._cond.wait(remaining)
+
+                new_tokens = self.tokens[sent:]
+                status = self.status
+
+            for token in new_tokens:
+                yield "token", token
+            sent += len(new_tokens)
+
+            if status == "done" and sent == len(self.tokens):
+                yield "done", self.text
+                return
+            if status == "error":
+                yield "error", self.fallback
+                return
+
+
+class CachedJob:
+    """
+    Stand-in for a job running in another worker process: waits for its
+    result to appear in the explanation cache. No tokens are streamed.
+    """
+
+    def __init__(self, job_id, fallback, cache=None):
+        self.job_id = job_id
+        self.fallback = fallback
+        self.cache = cache if cache is not None else get_explanation_cache()
+
+    def _state(self):
+        """
+        ("done", text), ("error", fallback) or ("pending", "").
+        """
+        text = self.cache.get(self.job_id)
+        if text is not None:
+            return "done", text
+
+        # Failed, finished without a cacheable result, or its worker died
+        state = self.cache.job_status(self.job_id)
+        if (state is None or state["status"] != "running"
+                or time.time() - state["created"] > JOB_TTL):
+            return "error", self.fallback
+        return "pending", ""
+
+    @property
+    def status(self):
+        return self._state()[0]
+
+    @property
+    def text(self):
+        return self._state()[1]
+
+    def events(self, timeout=None):
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            status, text = self._state()
+            if status != "pending":
+                yield status, text
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                yield "error", self.fallback
+                return
+            time.sleep(CACHE_POLL_INTERVAL)
+
+
+class ExplanationJobs:
+    """
+    Registry of in-flight and recently finished explanation jobs.
+    """
+
+    def __init__(self, workers=8, ttl=JOB_TTL, max_jobs=MAX_JOBS):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cds-explain")
+
+    def _expire(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.ttl:
+                del self._jobs[job_id]
+
+        # Still full: drop the oldest finished jobs first
+        if len(self._jobs) >= self.max_jobs:
+            finished = sorted(
+                (job for job in self._jobs.values() if job.finished is not None),
+                key=lambda job: job.created
+            )
+            for job in finished[:len(self._jobs) - self.max_jobs + 1]:
+                del self._jobs[job.job_id]
+
+    def submit(self, findings, guideline_context, fallback):
+        job_id = explanation_cache_key(build_prompt(findings, guideline_context), get_backend())
+
+        with self._lock:
+            # Same inputs already in flight (or just finished): share it
+            existing = self._jobs.get(job_id)
+            if existing is not None and existing.status != "error":
+                return job_id
+
+            self._expire()
+            job = ExplanationJob(job_id, list(findings), guideline_context, fallback)
+            self._jobs[job_id] = job
+
+        # Written before the id is handed out, so any worker can look it up
+        try:
+            job.cache.put_job_status(job_id, "running")
+        except OSError:
+            pass
+        self._executor.submit(job.run)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def lookup(self, job_id, fallback):
+        """
+        The local job, or a CachedJob for a job another worker started
+        (only with a shared on-disk cache). None for unknown ids.
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job
+
+        cache = get_explanation_cache()
+        if not cache.disk_dir or not JOB_ID_RE.match(job_id):
+            return None
+        if cache.job_status(job_id) is None and cache.get(job_id) is None:
+            return None
+        return CachedJob(job_id, fallback, cache)
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_explanation_jobs():
+    global _jobs
+
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                _jobs = ExplanationJobs()
+
+    return _jobs
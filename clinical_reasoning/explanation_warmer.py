@@ -0,0 +1,253 @@
+# explanation_warmer.py
+#
+# Pre-generates LLM explanations for the presentations the rules can
+# produce, so the first patient with a common presentation after a deploy
+# does not wait for the LLM.
+#
+# An explanation depends only on the primary rule's findings and the
+# guideline excerpt for its condition. Both are enumerable: every feature a
+# rule reads is set to one representative value per threshold band (plus
+# missing) and the compiled rule is evaluated on each combination, which
+# yields exactly the (condition, findings) pairs evaluate_rules() can
+# produce. Presentations with fewer findings come first, as they are the
+# common ones in screening.
+#
+# Explanations go through the explanation cache with the same key as a
+# live request and are tagged with the model, prompt, rule set and
+# evidence table versions, and persist in the on-disk tier
+# (EXPLANATION_CACHE_DIR) across restarts and workers; one process warms at
+# a time (lock file in the cache directory). Without a disk tier the
+# results would be lost on restart, so warming is skipped.
+#
+#   python -m clinical_reasoning.explanation_warmer --list
+#   python -m clinical_reasoning.explanation_warmer --limit 50
+
+import argparse
+import itertools
+import logging
+import os
+import threading
+import time
+
+from clinical_reasoning.rule_engine import ThresholdTable
+
+try:
+    import fcntl
+except ImportError:    # Windows: no cross-process lock, every process warms
+    fcntl = None
+
+
+WARM_EXPLANATIONS = os.environ.get("CDS_WARM_EXPLANATIONS", "1") != "0"
+WARM_LIMIT = int(os.environ.get("CDS_WARM_EXPLANATIONS_LIMIT", 200))
+
+logger = logging.getLogger("cds.warmup")
+
+
+# -----------------------------
+# Enumeration
+# -----------------------------
+
+def _candidates(rule, feature, kind):
+    """
+    Representative values for one feature: missing, plus one value per
+    threshold piece or guard value the rule tests it against.
+    """
+    if kind == "flag":
+        return [False, True]
+
+    values = {None}
+    for guard in rule.guard_specs:
+        if guard["feature"] == feature:
+            if "eq" in guard:
+                values.add(guard["eq"])
+            else:
+                values.update(ThresholdTable([guard]).probes)
+
+    tables = [table for when, _ in rule.overrides for name, table in when if name == feature]
+    tables += [c.table for c in rule.criteria if c.feature == feature and c.table is not None]
+    for table in tables:
+        values.update(table.probes)
+
+    return sorted(values, key=lambda v: (v is not None, str(type(v)), v if v is not None else 0))
+
+
+def enumerate_presentations(ruleset):
+    """
+    [(domain, condition, findings)] the LLM may be asked to explain,
+    fewest findings first.
+    """
+    from clinical_reasoning.clinical_reasoning import RULE_BASED_EXPLANATIONS
+
+    seen = {}
+    for order, rule in enumerate(ruleset.rules):
+        if not rule.enabled or rule.domain in RULE_BASED_EXPLANATIONS:
+            continue
+
+        features = sorted(rule.features)
+        options = [_candidates(rule, f, ruleset.features[f][2]) for f in features]
+        for combination in itertools.product(*options):
+            result = rule.evaluate(dict(zip(features, combination)))
+            if result is None or not rule.reported(result):
+                continue
+            key = (rule.domain, result["condition"], tuple(result["clinical_findings"]))
+            seen.setdefault(key, order)
+
+    return sorted(seen, key=lambda p: (len(p[2]), seen[p], p[1], p[2]))
+
+
+# -----------------------------
+# Warming
+# -----------------------------
+
+class _WarmerLock:
+    """
+    Non-blocking exclusive lock file; acquired is False if another
+    process holds it.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, "warmer.lock") if directory else None
+        self._file = None
+        self.acquired = True
+
+    def __enter__(self):
+        if self.path and fcntl is not None:
+            self._file = open(self.path, "a")
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.acquired = False
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()
+
+
+def warm_explanations(limit=WARM_LIMIT, backend=None, cache=None, stop=None):
+    """
+    Generate and cache explanations for up to `limit` presentations not
+    already cached. Returns a stats dict.
+    """
+    from clinical_reasoning.clinical_reasoning import fetch_guideline_excerpt
+    from clinical_reasoning.evidence_table import get_evidence_table
+    from clinical_reasoning.explanation_cache import get_explanation_cache
+    from clinical_reasoning.llm_layer import (
+        SYSTEM_PROMPT_VERSION, build_prompt, explanation_cache_key, get_backend,
+    )
+    from clinical_reasoning.rule_engine import get_rule_engine
+
+    backend = backend or get_backend()
+    if cache is None:
+        cache = get_explanation_cache()
+    ruleset = get_rule_engine().ruleset
+
+    presentations = enumerate_presentations(ruleset)
+    if limit is not None:
+        presentations = presentations[:limit]
+
+    stats = {"presentations": len(presentations), "cached": 0, "generated": 0,
+             "errors": 0, "seconds": 0.0, "skipped": None}
+    start = time.perf_counter()
+
+    if not cache.disk_dir:
+        stats["skipped"] = "no on-disk explanation cache (set EXPLANATION_CACHE_DIR)"
+        logger.info("Explanation warm-up skipped: %s", stats["skipped"])
+        return stats
+
+    with _WarmerLock(cache.disk_dir) as lock:
+        if not lock.acquired:
+            stats["skipped"] = "another process is warming"
+            return stats
+
+        tags = {
+            "model": backend.model,
+            "prompt_version": SYSTEM_PROMPT_VERSION,
+            "rules_version": ruleset.version,
+            "evidence_version": get_evidence_table().version,
+            "source": "warmer",
+        }
+
+        for domain, condition, findings in presentations:
+            if stop is not None and stop.is_set():
+                stats["skipped"] = "stopped"
+                break
+
+            # Same prompt, hence same cache key, as a live request
+            prompt = build_prompt(list(findings), fetch_guideline_excerpt(domain, condition))
+            key = explanation_cache_key(prompt, backend)
+            if cache.get(key) is not None:
+                stats["cached"] += 1
+                continue
+
+            try:
+                text = backend.generate(prompt)
+            except Exception as e:
+                stats["errors"] += 1
+                logger.warning("Explanation warm-up for %r failed: %s", condition, e)
+                continue
+
+            cache.put(key, text, **tags)
+            stats["generated"] += 1
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+_state = {"status": "idle"}
+_thread = None
+_thread_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def _run(limit):
+    _state.update(status="running", started=time.time())
+    try:
+        stats = warm_explanations(limit=limit, stop=_stop)
+    except Exception as e:
+        _state.update(status="error", detail=f"{type(e).__name__}: {e}")
+        logger.warning("Explanation warm-up failed: %s", e)
+        return
+    _state.update(status="done", **stats)
+    logger.info("Explanation warm-up: %s", stats)
+
+
+def start_explanation_warmer(limit=WARM_LIMIT):
+    """
+    Warm explanations once, on a low-priority background thread.
+    """
+    global _thread
+
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(
+                target=_run, args=(limit,), name="cds-explanation-warmer", daemon=True
+            )
+            _thread.start()
+    return _thread
+
+
+def stop_explanation_warmer():
+    """
+    Ask the warmer to stop after the presentation in progress.
+    """
+    _stop.set()
+
+
+def warmer_status():
+    return dict(_state)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate LLM explanations for common presentations")
+    parser.add_argument("--limit", type=int, default=None, help="at most this many presentations")
+    parser.add_argument("--list", action="store_true", help="print the presentations and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        from clinical_reasoning.rule_engine import get_rule_engine
+
+        for domain, condition, findings in enumerate_presentations(get_rule_engine().ruleset):
+            print(f"{domain:10} {condition}: {'; '.join(findings) or '(no findings)'}")
+    else:
+        print(warm_explanations(limit=args.limit))
@@ -0,0 +1,398 @@
+# faiss_index.py
+#
+# FAISS alternative to the Chroma store: one index per domain plus a compact
+# sidecar holding chunk text and metadata.
+#
+#   faiss_index/
+#     manifest.json             model, dim, index type, per-domain counts
+#     <domain>.index            FAISS index (inner product on unit vectors)
+#     <domain>.text.bin         chunk texts, UTF-8, concatenated
+#     <domain>.offsets.npy      int64 byte offsets into text.bin (n + 1)
+#     <domain>.meta.json        columnar metadata (chunk_id, source_file, chunk_index)
+#
+# The "float16" and "int8" index types replace <domain>.index with the
+# quantized matrices described in vector_quant.py.
+#
+# faiss_index is a symlink to a versioned directory (faiss_index.v<n>). A
+# rebuild writes a new version and swaps the link with os.replace, so a
+# reader resolves either the old or the new set, never a missing one.
+#
+# Indexes are opened with IO_FLAG_MMAP_IFC, which maps the stored vectors,
+# codes and inverted lists of flat, HNSW and IVF indexes alike (plain
+# IO_FLAG_MMAP only maps IVF lists), and the sidecars are memory-mapped, so
+# worker processes on one host share the same page-cache pages.
+
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from clinical_reasoning.vector_quant import QUANTIZATIONS, QuantizedMatrix, write_quantized
+
+_faiss = None
+
+
+def _import_faiss():
+    # Imported on first build/load so BM25-only and Chroma deployments
+    # never pay for it
+    global _faiss
+
+    if _faiss is None:
+        try:
+            import faiss
+        except Exception:
+            faiss = False
+        _faiss = faiss
+
+    return _faiss or None
+
+
+INDEX_DIR = "faiss_index"
+INDEX_TYPES = ("flat", "ivf", "hnsw") + QUANTIZATIONS
+MANIFEST_VERSION = 1
+
+
+# -----------------------------
+# Build
+# -----------------------------
+
+def _make_index(index_type, dim, n, nlist=None, hnsw_m=32):
+    faiss = _import_faiss()
+    if index_type == "ivf":
+        # ~39 training points per centroid is FAISS's minimum recommendation
+        nlist = min(nlist or int(4 * np.sqrt(n)), max(1, n // 39))
+        if nlist > 1:
+            quantizer = faiss.IndexFlatIP(dim)
+            return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        # Too few vectors to cluster; exact search is cheaper anyway
+        return faiss.IndexFlatIP(dim)
+
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+
+    return faiss.IndexFlatIP(dim)
+
+
+def write_sidecar(prefix, records):
+    """
+    Write texts as one UTF-8 blob plus an offset table, and metadata as
+    columns.
+    """
+    offsets = [0]
+    with open(prefix + ".text.bin", "wb") as f:
+        for record in records:
+            data = record["text"].encode("utf-8")
+            f.write(data)
+            offsets.append(offsets[-1] + len(data))
+
+    np.save(prefix + ".offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+    with open(prefix + ".meta.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "chunk_id": [r["chunk_id"] for r in records],
+            "source_file": [r["source_file"] for r in records],
+            "chunk_index": [r["chunk_index"] for r in records],
+        }, f)
+
+
+def publish_index_dir(build_dir, index_dir, keep=2):
+    """
+    Make `build_dir` the live `index_dir` in one atomic step and remove
+    all but the newest `keep` versions (readers may still be loading
+    domains from the previous one).
+    """
+    index_dir = os.path.abspath(index_dir)
+    version_dir = f"{index_dir}.v{time.time_ns()}"
+    os.rename(build_dir, version_dir)
+
+    if os.path.isdir(index_dir) and not os.path.islink(index_dir):
+        # A plain directory from before versioning; moved aside once
+        os.rename(index_dir, f"{index_dir}.v0")
+
+    link = f"{index_dir}.link-{os.getpid()}"
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, index_dir)
+
+    prefix = os.path.basename(index_dir) + ".v"
+    parent = os.path.dirname(index_dir)
+    versions = sorted(
+        (int(name[len(prefix):]), name) for name in os.listdir(parent)
+        if name.startswith(prefix) and name[len(prefix):].isdigit()
+    )
+    for _, name in versions[:-keep]:
+        shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+def build_indexes(records, embeddings, index_dir=INDEX_DIR, index_type="flat",
+                  model_name=None, nlist=None, hnsw_m=32, rescore=False):
+    """
+    Build per-domain indexes from chunk records and their unit-length
+    embeddings (row i belongs to records[i]). The new set is written to a
+    temporary directory and published with publish_index_dir().
+
+    For quantized index types, `rescore` also stores the float32 vectors
+    so the top candidates can be re-scored exactly; off by default, as it
+    costs more disk than the quantized vectors save.
+    """
+    quantized = index_type in QUANTIZATIONS
+    faiss = None if quantized else _import_faiss()
+    if faiss is None and not quantized:
+        raise RuntimeError("faiss is not installed")
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"index_type must be one of {INDEX_TYPES}")
+
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    dim = embeddings.shape[1]
+
+    by_domain = {}
+    for i, record in enumerate(records):
+        by_domain.setdefault(record["domain"], []).append(i)
+
+    tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    domains = {}
+    for domain, rows in sorted(by_domain.items()):
+        vectors = embeddings[rows]
+        prefix = os.path.join(tmp_dir, domain)
+
+        if quantized:
+            write_quantized(prefix, vectors, index_type, rescore=rescore)
+            domains[domain] = {"count": len(rows), "index_class": f"Quantized[{index_type}]",
+                               "rescore": rescore}
+        else:
+            index = _make_index(index_type, dim, len(rows), nlist, hnsw_m)
+            if not index.is_trained:
+                index.train(vectors)
+            index.add(vectors)
+            faiss.write_index(index, prefix + ".index")
+            domains[domain] = {"count": len(rows), "index_class": type(index).__name__}
+
+        write_sidecar(prefix, [records[i] for i in rows])
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": MANIFEST_VERSION,
+            "model": model_name,
+            "dim": dim,
+            "index_type": index_type,
+            "domains": domains,
+            "built": time.time(),
+        }, f, indent=2)
+
+    publish_index_dir(tmp_dir, index_dir)
+    return domains
+
+
+# -----------------------------
+# Search
+# -----------------------------
+
+class ChunkSidecar:
+    """
+    Read-only, memory-mapped view of a domain's chunk texts and metadata.
+    """
+
+    def __init__(self, prefix):
+        self.offsets = np.load(prefix + ".offsets.npy", mmap_mode="r")
+        with open(prefix + ".meta.json", "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self._file = open(prefix + ".text.bin", "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def text(self, i):
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self._blob[start:end].decode("utf-8")
+
+    def metadata(self, i):
+        return {key: values[i] for key, values in self.meta.items()}
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+
+class DomainIndex:
+
+    def __init__(self, index_dir, domain, nprobe=8, ef_search=64, index_type="flat",
+                 rescore=True):
+        prefix = os.path.join(index_dir, domain)
+        if index_type in QUANTIZATIONS:
+            self.index = QuantizedMatrix.load(prefix, rescore=rescore)
+        else:
+            faiss = _import_faiss()
+            # IO_FLAG_MMAP_IFC is missing from older faiss builds
+            mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+            self.index = faiss.read_index(prefix + ".index", mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        self.sidecar = ChunkSidecar(prefix)
+
+        if hasattr(self.index, "nprobe"):
+            self.index.nprobe = nprobe
+        if hasattr(self.index, "hnsw"):
+            self.index.hnsw.efSearch = ef_search
+
+    def search(self, query_vectors, k):
+        scores, ids = self.index.search(query_vectors, k)
+        return scores, ids
+
+
+class FaissRetriever:
+    """
+    Retrieval backend over the per-domain FAISS indexes. Domains are loaded
+    on first use; a rebuilt index directory (new manifest) is picked up on
+    the next check.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, check_interval=5.0, nprobe=8, ef_search=64,
+                 rescore=True):
+        self.index_dir = os.path.abspath(index_dir)
+        self.check_interval = check_interval
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.rescore = rescore
+
+        self._lock = threading.Lock()
+        self._domains = {}
+        self._manifest = None
+        self._live_dir = None
+        self._stamp = None
+        self._last_check = 0.0
+
+        self._stats = {
+            "opens": 0,
+            "open_errors": 0,
+            "open_seconds_total": 0.0,
+            "last_open_seconds": None,
+            "queries": 0,
+            "query_errors": 0,
+            "query_seconds_total": 0.0,
+            "last_query_seconds": None,
+        }
+
+    def _manifest_stamp(self, live_dir):
+        try:
+            st = os.stat(os.path.join(live_dir, "manifest.json"))
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval and self._manifest is not None:
+            return
+
+        with self._lock:
+            self._last_check = now
+            # Resolved once, so the manifest and the domains loaded later
+            # come from the same version even if the link is swapped
+            live_dir = os.path.realpath(self.index_dir)
+            stamp = self._manifest_stamp(live_dir)
+            if stamp == self._stamp and self._manifest is not None:
+                return
+
+            # Old sidecar mappings are left to the garbage collector:
+            # requests still reading them finish on the old index
+            self._domains = {}
+            self._stamp = stamp
+            self._manifest = None
+
+            if stamp is None:
+                return
+
+            with open(os.path.join(live_dir, "manifest.json"), "r", encoding="utf-8") as f:
+                self._manifest = json.load(f)
+            self._live_dir = live_dir
+
+    def _domain(self, domain):
+        loaded = self._domains.get(domain)
+        if loaded is not None:
+            return loaded
+
+        with self._lock:
+            loaded = self._domains.get(domain)
+            if loaded is not None:
+                return loaded
+            if not self._manifest or domain not in self._manifest["domains"]:
+                return None
+
+            start = time.perf_counter()
+            try:
+                loaded = DomainIndex(
+                    self._live_dir, domain, self.nprobe, self.ef_search,
+                    index_type=self._manifest.get("index_type", "flat"), rescore=self.rescore
+                )
+            except Exception:
+                self._stats["open_errors"] += 1
+                return None
+            finally:
+                elapsed = time.perf_counter() - start
+                self._stats["last_open_seconds"] = elapsed
+                self._stats["open_seconds_total"] += elapsed
+
+            self._stats["opens"] += 1
+            self._domains[domain] = loaded
+            return loaded
+
+    def open_all(self):
+        """
+        Load every domain now (e.g. in a pre-fork master) instead of on
+        first query. Returns the loaded domain names.
+        """
+        self._refresh()
+        for domain in (self._manifest or {}).get("domains", {}):
+            self._domain(domain)
+        return sorted(self._domains)
+
+    def search(self, query, domain, n_results=3):
+        """
+        Return [(score, text, metadata)] for the best matches.
+        """
+        self._refresh()
+        index = self._domain(domain)
+        if index is None:
+            return []
+
+        from clinical_reasoning.embedding import encode_queries
+
+        start = time.perf_counter()
+        try:
+            scores, ids = index.search(encode_queries([query]), n_results)
+        except Exception:
+            self._stats["query_errors"] += 1
+            return []
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stats["last_query_seconds"] = elapsed
+            self._stats["query_seconds_total"] += elapsed
+
+        self._stats["queries"] += 1
+        return [
+            (float(score), index.sidecar.text(i), index.sidecar.metadata(i))
+            for score, i in zip(scores[0], ids[0]) if i >= 0
+        ]
+
+    def retrieve(self, query, domain, n_results=3):
+        return [text for _, text, _ in self.search(query, domain, n_results)]
+
+    def close(self):
+        with self._lock:
+            self._domains = {}
+            self._manifest = None
+            self._stamp = None
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        snapshot["store_path"] = self.index_dir
+        snapshot["is_open"] = bool(self._domains)
+        snapshot["domains_loaded"] = sorted(self._domains)
+        return snapshot
@@ -0,0 +1,375 @@
+# lab_history.py
+#
+# Longitudinal per-patient store of lab values and vitals (SQLite).
+#
+#   visits   (patient_id, visit_date) primary key, one row per visit with
+#            the visit's numeric measures as JSON; a patient's history is
+#            one range read on the key
+#   trends   (patient_id, measure) primary key, running least-squares sums
+#            plus the last two values, updated in O(1) when a visit is
+#            appended
+#
+# A resubmitted form with unchanged values writes nothing. A changed
+# resubmission of the latest visit swaps that visit's values in the running
+# sums; an earlier date (back-filled results) replaces that visit and the
+# patient's trends are recomputed from the history.
+#
+# attach_trends() records the current visit and sets the record's trends
+# to flat features for the rule file:
+#
+#   <measure>_per_year   least-squares slope, once the visits span
+#                        MIN_TREND_DAYS
+#   <measure>_change     change since the previous visit
+#   <measure>_visits     number of visits with the measure
+
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from clinical_reasoning.metrics import timed
+
+
+LAB_HISTORY_PATH = os.environ.get("LAB_HISTORY_PATH", "lab_history.sqlite3")   # "" disables
+
+# Slopes over shorter spans are mostly measurement noise
+MIN_TREND_DAYS = int(os.environ.get("LAB_HISTORY_MIN_TREND_DAYS", 90))
+
+logger = logging.getLogger("cds.history")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS visits (
+    patient_id TEXT NOT NULL,
+    visit_date TEXT NOT NULL,
+    measures   TEXT NOT NULL,
+    recorded   REAL NOT NULL,
+    PRIMARY KEY (patient_id, visit_date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS trends (
+    patient_id TEXT NOT NULL,
+    measure    TEXT NOT NULL,
+    n          INTEGER NOT NULL,
+    first_day  INTEGER NOT NULL,
+    last_day   INTEGER NOT NULL,
+    last_value REAL NOT NULL,
+    prev_day   INTEGER,
+    prev_value REAL,
+    sum_t      REAL NOT NULL,
+    sum_v      REAL NOT NULL,
+    sum_tt     REAL NOT NULL,
+    sum_tv     REAL NOT NULL,
+    PRIMARY KEY (patient_id, measure)
+) WITHOUT ROWID;
+"""
+
+
+def _day(visit_date):
+    return datetime.date.fromisoformat(visit_date).toordinal()
+
+
+class _Trend:
+    """
+    Running aggregates for one (patient, measure). t is days since the
+    first visit, which keeps the sums small.
+    """
+
+    __slots__ = ("n", "first_day", "last_day", "last_value", "prev_day", "prev_value",
+                 "sum_t", "sum_v", "sum_tt", "sum_tv")
+
+    def __init__(self, row=None):
+        if row is None:
+            self.n = 0
+            self.first_day = self.last_day = self.prev_day = None
+            self.last_value = self.prev_value = None
+            self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+        else:
+            (self.n, self.first_day, self.last_day, self.last_value, self.prev_day,
+             self.prev_value, self.sum_t, self.sum_v, self.sum_tt, self.sum_tv) = row
+
+    def add(self, day, value):
+        # Visits arrive in date order
+        if self.n == 0:
+            self.first_day = day
+        else:
+            self.prev_day, self.prev_value = self.last_day, self.last_value
+        self.last_day, self.last_value = day, value
+
+        t = float(day - self.first_day)
+        self.n += 1
+        self.sum_t += t
+        self.sum_v += value
+        self.sum_tt += t * t
+        self.sum_tv += t * value
+
+    def replace_last(self, value):
+        t = float(self.last_day - self.first_day)
+        delta = value - self.last_value
+        self.sum_v += delta
+        self.sum_tv += t * delta
+        self.last_value = value
+
+    def remove_last(self):
+        """
+        Drop the latest value; False when the value before it would be
+        needed (only the last two are kept).
+        """
+        if self.n > 2:
+            return False
+
+        t = float(self.last_day - self.first_day)
+        self.n -= 1
+        self.sum_t -= t
+        self.sum_v -= self.last_value
+        self.sum_tt -= t * t
+        self.sum_tv -= t * self.last_value
+        self.last_day, self.last_value = self.prev_day, self.prev_value
+        self.prev_day = self.prev_value = None
+        if self.n == 0:
+            self.first_day = None
+            self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+        return True
+
+    def row(self):
+        return (self.n, self.first_day, self.last_day, self.last_value, self.prev_day,
+                self.prev_value, self.sum_t, self.sum_v, self.sum_tt, self.sum_tv)
+
+    def slope_per_year(self):
+        if self.n < 2 or self.last_day - self.first_day < MIN_TREND_DAYS:
+            return None
+        denominator = self.n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 0:
+            return None
+        return (self.n * self.sum_tv - self.sum_t * self.sum_v) / denominator * 365.25
+
+
+class LabHistory:
+    """
+    Thread-safe handle on the store; one SQLite connection per thread
+    (and per process, so it is never opened before a fork).
+    """
+
+    def __init__(self, path=LAB_HISTORY_PATH):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        self._stats = {"visits": 0, "unchanged": 0, "appends": 0, "replaces": 0,
+                       "recomputes": 0, "errors": 0}
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def record_visit(self, patient_id, visit_date, measures):
+        """
+        Store one visit and update the patient's trends. Returns the
+        patient's trends ({measure: _Trend}).
+        """
+        try:
+            return self._record_visit(patient_id, visit_date, measures)
+        except (ValueError, sqlite3.Error):
+            self._stats["errors"] += 1
+            raise
+
+    def _record_visit(self, patient_id, visit_date, measures):
+        # Normalized ISO dates sort (and compare) as strings
+        visit_date = datetime.date.fromisoformat(visit_date).isoformat()
+        day = _day(visit_date)
+        encoded = json.dumps(measures, sort_keys=True)
+        conn = self._connection()
+
+        # A resubmitted visit with the same values changes nothing
+        stored = conn.execute(
+            "SELECT measures FROM visits WHERE patient_id = ? AND visit_date = ?",
+            (patient_id, visit_date)
+        ).fetchone()
+        if stored is not None and stored[0] == encoded:
+            self._stats["unchanged"] += 1
+            return self._load_trends(conn, patient_id)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            latest = conn.execute(
+                "SELECT visit_date, measures FROM visits WHERE patient_id = ? "
+                "ORDER BY visit_date DESC LIMIT 1",
+                (patient_id,)
+            ).fetchone()
+
+            conn.execute(
+                "INSERT OR REPLACE INTO visits (patient_id, visit_date, measures, recorded) "
+                "VALUES (?, ?, ?, ?)",
+                (patient_id, visit_date, encoded, time.time())
+            )
+
+            trends = None
+            if latest is None or visit_date > latest[0]:
+                trends = self._load_trends(conn, patient_id)
+                for measure, value in measures.items():
+                    trend = trends.setdefault(measure, _Trend())
+                    trend.add(day, value)
+                self._save_trends(conn, patient_id, {m: trends[m] for m in measures})
+                self._stats["appends"] += 1
+            elif visit_date == latest[0]:
+                trends = self._replace_latest(conn, patient_id, day, json.loads(latest[1]), measures)
+                if trends is not None:
+                    self._stats["replaces"] += 1
+
+            if trends is None:
+                trends = self._recompute(conn, patient_id)
+                self._stats["recomputes"] += 1
+
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._stats["visits"] += 1
+        return trends
+
+    def _load_trends(self, conn, patient_id):
+        rows = conn.execute(
+            "SELECT measure, n, first_day, last_day, last_value, prev_day, prev_value, "
+            "sum_t, sum_v, sum_tt, sum_tv FROM trends WHERE patient_id = ?",
+            (patient_id,)
+        )
+        return {row[0]: _Trend(row[1:]) for row in rows}
+
+    def _save_trends(self, conn, patient_id, trends):
+        conn.executemany(
+            "INSERT OR REPLACE INTO trends VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(patient_id, measure) + trend.row() for measure, trend in trends.items()]
+        )
+
+    def _replace_latest(self, conn, patient_id, day, old, new):
+        """
+        Swap the latest visit's values in the running sums. None when a
+        removed value needs older history (the caller recomputes).
+        """
+        trends = self._load_trends(conn, patient_id)
+        changed = {}
+        for measure in set(old) | set(new):
+            trend = trends.get(measure)
+            if measure in old:
+                if trend is None or trend.last_day != day:
+                    return None
+                if measure in new:
+                    trend.replace_last(new[measure])
+                elif not trend.remove_last():
+                    return None
+            else:
+                trend = trends.setdefault(measure, _Trend())
+                trend.add(day, new[measure])
+            changed[measure] = trend
+
+        removed = [m for m, trend in changed.items() if trend.n == 0]
+        conn.executemany(
+            "DELETE FROM trends WHERE patient_id = ? AND measure = ?",
+            [(patient_id, m) for m in removed]
+        )
+        self._save_trends(conn, patient_id, {
+            m: trend for m, trend in changed.items() if trend.n
+        })
+        return {m: trend for m, trend in trends.items() if trend.n}
+
+    def _recompute(self, conn, patient_id):
+        trends = {}
+        for visit_date, measures in self._history(conn, patient_id):
+            day = _day(visit_date)
+            for measure, value in measures.items():
+                trends.setdefault(measure, _Trend()).add(day, value)
+
+        conn.execute("DELETE FROM trends WHERE patient_id = ?", (patient_id,))
+        self._save_trends(conn, patient_id, trends)
+        return trends
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def _history(self, conn, patient_id):
+        rows = conn.execute(
+            "SELECT visit_date, measures FROM visits WHERE patient_id = ? ORDER BY visit_date",
+            (patient_id,)
+        )
+        return [(visit_date, json.loads(measures)) for visit_date, measures in rows]
+
+    def history(self, patient_id):
+        """
+        [(visit_date, {measure: value})] in date order.
+        """
+        return self._history(self._connection(), patient_id)
+
+    def trends(self, patient_id):
+        return self._load_trends(self._connection(), patient_id)
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        snapshot["path"] = self.path
+        return snapshot
+
+
+def trend_features(trends):
+    """
+    Flat rule features for measures seen at two or more visits.
+    """
+    features = {}
+    for measure, trend in trends.items():
+        if trend.n < 2:
+            continue
+        features[f"{measure}_visits"] = trend.n
+        features[f"{measure}_change"] = round(trend.last_value - trend.prev_value, 4)
+        slope = trend.slope_per_year()
+        if slope is not None:
+            features[f"{measure}_per_year"] = round(slope, 4)
+    return features
+
+
+def attach_trends(record):
+    """
+    Record this visit of a PatientRecord and return the record with its
+    trends set. Without a patient id (or with the store disabled) the
+    record is returned unchanged; a missing visit date means today.
+    """
+    history = get_lab_history()
+    if history is None or not record.patient_id:
+        return record
+
+    visit_date = record.visit_date or datetime.date.today().isoformat()
+    try:
+        with timed("lab_history"):
+            trends = history.record_visit(record.patient_id, visit_date, record.measures())
+    except (ValueError, sqlite3.Error) as e:
+        logger.warning("Visit not recorded in lab history: %s", e)
+        return record
+
+    features = trend_features(trends)
+    return record.replace(trends=features) if features else record
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_lab_history():
+    """
+    Process-wide store at LAB_HISTORY_PATH, or None when disabled.
+    """
+    global _history
+
+    if _history is None and LAB_HISTORY_PATH:
+        with _history_lock:
+            if _history is None:
+                _history = LabHistory(LAB_HISTORY_PATH)
+
+    return _history
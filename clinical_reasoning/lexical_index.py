@@ -0,0 +1,431 @@
+# lexical_index.py
+#
+# BM25 over the guideline chunks, and hybrid lexical + dense retrieval.
+#
+# Condition names and the threshold-laden findings ("HbA1c ≥ 6.5%",
+# "TSH > 4.5") often match guideline text on exact terms better than on
+# embeddings, and the lexical path needs no model inference. Results of
+# both paths are merged with reciprocal rank fusion; the dense search only
+# contributes if it answers within the latency budget.
+#
+#   python -m clinical_reasoning.lexical_index                 # build from chunks/
+#
+# Per domain, next to the chunk sidecar from faiss_index.py:
+#   <domain>.vocab.json       sorted term list (position = term id)
+#   <domain>.postings.npz     CSR postings: term_offsets (int64), doc_ids
+#                             (uint32), tfs (uint16), doc_lengths (uint32)
+#
+# Rebuilds are published like the FAISS indexes: a versioned directory
+# behind a symlink that is swapped atomically.
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from clinical_reasoning.faiss_index import ChunkSidecar, publish_index_dir, write_sidecar
+
+
+LEXICAL_INDEX_DIR = "lexical_index"
+MANIFEST_VERSION = 1
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+RRF_K = 60
+
+# Keeps decimals together so "6.5" and "4.5" are single terms
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the "
+    "this to was were with".split()
+)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+# -----------------------------
+# Build
+# -----------------------------
+
+def build_postings(texts):
+    """
+    CSR postings for one domain. Returns (terms, arrays).
+    """
+    doc_terms = []
+    vocab = {}
+    for text in texts:
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        doc_terms.append(counts)
+        for token in counts:
+            vocab.setdefault(token, None)
+
+    terms = sorted(vocab)
+    term_ids = {term: i for i, term in enumerate(terms)}
+
+    # Count, then fill: postings for term t live in [offsets[t], offsets[t+1])
+    df = np.zeros(len(terms) + 1, dtype=np.int64)
+    for counts in doc_terms:
+        for token in counts:
+            df[term_ids[token] + 1] += 1
+    offsets = np.cumsum(df)
+
+    doc_ids = np.empty(offsets[-1], dtype=np.uint32)
+    tfs = np.empty(offsets[-1], dtype=np.uint16)
+    fill = offsets[:-1].copy()
+    doc_lengths = np.empty(len(doc_terms), dtype=np.uint32)
+
+    for doc, counts in enumerate(doc_terms):
+        doc_lengths[doc] = sum(counts.values())
+        for token, tf in counts.items():
+            t = term_ids[token]
+            doc_ids[fill[t]] = doc
+            tfs[fill[t]] = min(tf, 65535)
+            fill[t] += 1
+
+    return terms, {
+        "term_offsets": offsets,
+        "doc_ids": doc_ids,
+        "tfs": tfs,
+        "doc_lengths": doc_lengths,
+    }
+
+
+def build_lexical_index(records, index_dir=LEXICAL_INDEX_DIR):
+    """
+    Build per-domain BM25 indexes from chunk records and publish them
+    (see faiss_index.publish_index_dir).
+    """
+    by_domain = {}
+    for record in records:
+        by_domain.setdefault(record["domain"], []).append(record)
+
+    tmp_dir = f"{index_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    domains = {}
+    for domain, domain_records in sorted(by_domain.items()):
+        prefix = os.path.join(tmp_dir, domain)
+        terms, arrays = build_postings(r["text"] for r in domain_records)
+
+        with open(prefix + ".vocab.json", "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+        np.savez(prefix + ".postings.npz", **arrays)
+        write_sidecar(prefix, domain_records)
+
+        domains[domain] = {
+            "count": len(domain_records),
+            "terms": len(terms),
+            "postings": int(arrays["term_offsets"][-1]),
+        }
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": MANIFEST_VERSION,
+            "k1": BM25_K1,
+            "b": BM25_B,
+            "domains": domains,
+            "built": time.time(),
+        }, f, indent=2)
+
+    publish_index_dir(tmp_dir, index_dir)
+    return domains
+
+
+# -----------------------------
+# Search
+# -----------------------------
+
+class BM25Index:
+
+    def __init__(self, prefix, k1=BM25_K1, b=BM25_B):
+        with open(prefix + ".vocab.json", "r", encoding="utf-8") as f:
+            self.term_ids = {term: i for i, term in enumerate(json.load(f))}
+
+        with np.load(prefix + ".postings.npz") as data:
+            self.term_offsets = data["term_offsets"]
+            self.doc_ids = data["doc_ids"]
+            self.tfs = data["tfs"]
+            doc_lengths = data["doc_lengths"].astype(np.float32)
+
+        self.n_docs = len(doc_lengths)
+        avg_length = float(doc_lengths.mean()) if self.n_docs else 0.0
+        # Document-length part of the BM25 denominator, precomputed once
+        self.norm = k1 * (1 - b + b * doc_lengths / (avg_length or 1.0))
+        self.k1 = k1
+        self.sidecar = ChunkSidecar(prefix)
+
+    def search(self, query, k):
+        """
+        [(score, doc)] for the top k documents, best first.
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        matched = False
+
+        for term in set(tokenize(query)):
+            t = self.term_ids.get(term)
+            if t is None:
+                continue
+            start, end = self.term_offsets[t], self.term_offsets[t + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+
+            df = end - start
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self.norm[docs])
+            matched = True
+
+        if not matched:
+            return []
+
+        k = min(k, self.n_docs)
+        top = np.argpartition(-scores, k - 1)[:k] if k < self.n_docs else np.arange(self.n_docs)
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(i)) for i in top if scores[i] > 0]
+
+
+class LexicalRetriever:
+    """
+    Retrieval backend over the per-domain BM25 indexes; same interface as
+    FaissRetriever.
+    """
+
+    def __init__(self, index_dir=LEXICAL_INDEX_DIR, check_interval=5.0):
+        self.index_dir = os.path.abspath(index_dir)
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._domains = {}
+        self._manifest = None
+        self._live_dir = None
+        self._stamp = None
+        self._last_check = 0.0
+
+        self._stats = {
+            "opens": 0,
+            "open_errors": 0,
+            "queries": 0,
+            "query_errors": 0,
+            "query_seconds_total": 0.0,
+            "last_query_seconds": None,
+        }
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval and self._manifest is not None:
+            return
+
+        with self._lock:
+            self._last_check = now
+            # One resolved version for the manifest and its domains
+            live_dir = os.path.realpath(self.index_dir)
+            try:
+                st = os.stat(os.path.join(live_dir, "manifest.json"))
+                stamp = (st.st_ino, st.st_mtime_ns)
+            except OSError:
+                stamp = None
+            if stamp == self._stamp and self._manifest is not None:
+                return
+
+            self._drop_domains()
+            self._stamp = stamp
+            self._manifest = None
+            if stamp is not None:
+                with open(os.path.join(live_dir, "manifest.json"), "r", encoding="utf-8") as f:
+                    self._manifest = json.load(f)
+                self._live_dir = live_dir
+
+    def _drop_domains(self):
+        # Mappings are left to the garbage collector: requests still
+        # reading them finish on the old index
+        self._domains = {}
+
+    def _domain(self, domain):
+        index = self._domains.get(domain)
+        if index is not None:
+            return index
+
+        with self._lock:
+            index = self._domains.get(domain)
+            if index is not None:
+                return index
+            if not self._manifest or domain not in self._manifest["domains"]:
+                return None
+            try:
+                index = BM25Index(
+                    os.path.join(self._live_dir, domain),
+                    k1=self._manifest.get("k1", BM25_K1), b=self._manifest.get("b", BM25_B)
+                )
+            except Exception:
+                self._stats["open_errors"] += 1
+                return None
+            self._stats["opens"] += 1
+            self._domains[domain] = index
+            return index
+
+    def open_all(self):
+        self._refresh()
+        for domain in (self._manifest or {}).get("domains", {}):
+            self._domain(domain)
+        return sorted(self._domains)
+
+    def search(self, query, domain, n_results=3):
+        self._refresh()
+        index = self._domain(domain)
+        if index is None:
+            return []
+
+        start = time.perf_counter()
+        try:
+            hits = index.search(query, n_results)
+        except Exception:
+            self._stats["query_errors"] += 1
+            return []
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stats["last_query_seconds"] = elapsed
+            self._stats["query_seconds_total"] += elapsed
+
+        self._stats["queries"] += 1
+        return [
+            (score, index.sidecar.text(doc), index.sidecar.metadata(doc))
+            for score, doc in hits
+        ]
+
+    def retrieve(self, query, domain, n_results=3):
+        return [text for _, text, _ in self.search(query, domain, n_results)]
+
+    def close(self):
+        with self._lock:
+            self._drop_domains()
+            self._manifest = None
+            self._stamp = None
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        snapshot["store_path"] = self.index_dir
+        snapshot["is_open"] = bool(self._domains)
+        return snapshot
+
+
+# -----------------------------
+# Hybrid
+# -----------------------------
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merge ranked lists of documents (hashable) into one list, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda doc: -scores[doc])
+
+
+class HybridRetriever:
+    """
+    BM25 and dense retrieval fused with RRF. The dense query runs on a
+    worker thread; if it misses the latency budget, the lexical ranking is
+    returned alone. At most `dense_workers` dense queries are in flight:
+    while they are all busy (a slow dense backend), queries skip the dense
+    side instead of queueing behind them.
+    """
+
+    def __init__(self, dense, lexical, budget=0.15, candidates=10, rrf_k=RRF_K,
+                 dense_workers=4):
+        self.dense = dense
+        self.lexical = lexical
+        self.budget = budget
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self._executor = ThreadPoolExecutor(max_workers=dense_workers, thread_name_prefix="cds-dense")
+        self._dense_slots = threading.BoundedSemaphore(dense_workers)
+        self._stats = {"dense_timeouts": 0, "dense_errors": 0, "dense_skipped": 0,
+                       "lexical_only": 0}
+
+    def _submit_dense(self, query, domain, n):
+        if not self._dense_slots.acquire(blocking=False):
+            self._stats["dense_skipped"] += 1
+            return None
+        try:
+            future = self._executor.submit(self.dense.retrieve, query, domain, n)
+        except BaseException:
+            self._dense_slots.release()
+            raise
+        # Runs on completion and on cancellation
+        future.add_done_callback(lambda _: self._dense_slots.release())
+        return future
+
+    def retrieve(self, query, domain, n_results=3):
+        deadline = time.monotonic() + self.budget
+        n = max(n_results, self.candidates)
+
+        dense_future = self._submit_dense(query, domain, n)
+        lexical = self.lexical.retrieve(query, domain, n)
+
+        try:
+            if dense_future is None:
+                dense = []
+            else:
+                dense = dense_future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            # Drops it if still queued; a running query keeps its slot
+            dense_future.cancel()
+            self._stats["dense_timeouts"] += 1
+            dense = []
+        except Exception:
+            self._stats["dense_errors"] += 1
+            dense = []
+
+        if not dense:
+            self._stats["lexical_only"] += 1
+            return lexical[:n_results]
+
+        # Chunks are identified by text so both backends' results line up
+        return reciprocal_rank_fusion([dense, lexical], self.rrf_k)[:n_results]
+
+    def open_all(self):
+        opened = self.lexical.open_all()
+        if hasattr(self.dense, "open_all"):
+            self.dense.open_all()
+        return opened
+
+    def close(self):
+        self.dense.close()
+        self.lexical.close()
+
+    def stats(self):
+        dense, lexical = self.dense.stats(), self.lexical.stats()
+        snapshot = dict(self._stats)
+        for key in ("opens", "open_errors", "queries", "query_errors"):
+            snapshot[key] = dense.get(key, 0) + lexical.get(key, 0)
+        snapshot["store_path"] = dense.get("store_path")
+        snapshot["lexical_path"] = lexical.get("store_path")
+        snapshot["is_open"] = dense.get("is_open", False) or lexical.get("is_open", False)
+        return snapshot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the BM25 index from chunk files")
+    parser.add_argument("--chunks-root", default="chunks")
+    parser.add_argument("--index-dir", default=LEXICAL_INDEX_DIR)
+    args = parser.parse_args()
+
+    from embed_chunks import iter_chunk_records
+
+    start = time.perf_counter()
+    domains = build_lexical_index(iter_chunk_records(args.chunks_root), args.index_dir)
+    for domain, info in domains.items():
+        print(f"  {domain:<12} {info['count']:>6} chunks  {info['terms']:>7} terms  {info['postings']:>8} postings")
+    print(f"✅ Lexical index built in {time.perf_counter() - start:.1f}s → {args.index_dir}")
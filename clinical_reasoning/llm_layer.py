@@ -1,6 +1,14 @@
 # llm_layer.py
 
+import hashlib
+import http.client
+import json
+import os
 import subprocess
+import threading
+import time
+
+from clinical_reasoning.explanation_cache import get_explanation_cache, make_key
 
 
 SYSTEM_PROMPT = """
@@ -23,6 +31,247 @@ STYLE:
 - State that final decisions rest with the clinician
 """
 
+# Changes whenever the prompt template changes; part of every cache key
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+DEFAULT_MODEL = os.environ.get("LLM_MODEL", "llama3:8b")
+
+# "http" keeps a warm model behind the Ollama server; "subprocess" shells out
+# to `ollama run` for every call (legacy behaviour).
+DEFAULT_BACKEND = os.environ.get("LLM_BACKEND", "http")
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "127.0.0.1:11434")
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+
+class LLMBackend:
+    """
+    Minimal interface every explanation backend implements.
+    """
+
+    model = DEFAULT_MODEL
+
+    def stream(self, prompt):
+        """
+        Yield response text fragments as they are produced.
+        """
+        raise NotImplementedError
+
+    def generate(self, prompt):
+        return "".join(self.stream(prompt)).strip()
+
+    def warm(self):
+        """
+        Load the model ahead of the first request (no-op by default).
+        """
+        return None
+
+
+class SubprocessBackend(LLMBackend):
+    """
+    Runs `ollama run <model>` once per call.
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, timeout=120.0):
+        self.model = model
+        self.timeout = timeout
+
+    def generate(self, prompt):
+        try:
+            result = subprocess.run(
+                ["ollama", "run", self.model],
+                input=prompt,
+                text=True,
+                capture_output=True,
+                timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired as e:
+            raise LLMError(f"ollama run timed out after {self.timeout}s") from e
+
+        return result.stdout.strip()
+
+    def stream(self, prompt):
+        proc = subprocess.Popen(
+            ["ollama", "run", self.model],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+        try:
+            proc.stdin.write(prompt)
+            proc.stdin.close()
+            for line in proc.stdout:
+                yield line
+            proc.wait(timeout=self.timeout)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+
+
+class OllamaHTTPBackend(LLMBackend):
+    """
+    Talks to a running Ollama server over HTTP/1.1.
+
+    One keep-alive connection is held per thread, the model is kept loaded
+    via `keep_alive`, and responses are streamed as NDJSON.
+    """
+
+    def __init__(self, host=OLLAMA_HOST, model=DEFAULT_MODEL,
+                 keep_alive="30m", connect_timeout=3.0, read_timeout=60.0,
+                 total_timeout=120.0, options=None):
+        if "://" in host:
+            host = host.split("://", 1)[1]
+        self.host, _, port = host.partition(":")
+        self.port = int(port) if port else 11434
+        self.model = model
+        self.keep_alive = keep_alive
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.options = options or {}
+        self._local = threading.local()
+
+    def _connection(self, fresh=False):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and not fresh:
+            return conn
+
+        if conn is not None:
+            conn.close()
+
+        conn = http.client.HTTPConnection(
+            self.host, self.port, timeout=self.connect_timeout
+        )
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        self._local.conn = conn
+        return conn
+
+    def _post(self, path, payload):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+        }
+
+        # Retry once on a fresh connection if the kept-alive one went stale
+        for attempt in range(2):
+            try:
+                conn = self._connection(fresh=attempt > 0)
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (ConnectionError, http.client.HTTPException, OSError) as e:
+                self._local.conn = None
+                if attempt:
+                    raise LLMError(f"LLM backend unreachable: {e}") from e
+                continue
+
+            if response.status != 200:
+                detail = response.read().decode("utf-8", "replace")
+                raise LLMError(f"LLM backend returned {response.status}: {detail}")
+
+            return response
+
+    def stream(self, prompt):
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive,
+        }
+        if self.options:
+            payload["options"] = self.options
+
+        deadline = time.monotonic() + self.total_timeout
+        response = self._post("/api/generate", payload)
+
+        try:
+            while True:
+                if time.monotonic() > deadline:
+                    raise LLMError(f"LLM generation exceeded {self.total_timeout}s")
+
+                line = response.readline()
+                if not line:
+                    break
+
+                line = line.strip()
+                if not line:
+                    continue
+
+                message = json.loads(line)
+                if message.get("error"):
+                    raise LLMError(message["error"])
+
+                token = message.get("response")
+                if token:
+                    yield token
+
+                if message.get("done"):
+                    break
+        except Exception:
+            # A half-read response poisons the connection; drop it
+            conn = getattr(self._local, "conn", None)
+            if conn is not None:
+                conn.close()
+            self._local.conn = None
+            raise
+
+        # Drain anything left so the connection can be reused
+        response.read()
+
+    def warm(self):
+        # An empty prompt makes Ollama load the model and return immediately
+        response = self._post("/api/generate", {
+            "model": self.model,
+            "keep_alive": self.keep_alive,
+        })
+        response.read()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name=DEFAULT_BACKEND, **kwargs):
+    if name == "http":
+        return OllamaHTTPBackend(**kwargs)
+    if name == "subprocess":
+        return SubprocessBackend(**kwargs)
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+def get_backend():
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Swap the process-wide backend (e.g. to point tests at the stub server).
+    """
+    global _backend
+
+    with _backend_lock:
+        _backend = backend
+
+
+# -----------------------------
+# Prompt + explanation
+# -----------------------------
 
 def format_findings(findings):
     """
@@ -34,20 +283,20 @@ def format_findings(findings):
     return "\n".join(f"- {item}" for item in findings)
 
 
-def llm_explanation(findings, guideline_text):
+def build_prompt(findings, guideline_context):
     formatted_findings = format_findings(findings)
 
-    if not guideline_text:
-        guideline_text = "No guideline evidence was available."
+    if not guideline_context:
+        guideline_context = "No guideline evidence was available."
 
-    prompt = f"""
+    return f"""
 {SYSTEM_PROMPT}
 
 CLINICAL FINDINGS (ONLY THESE ARE AVAILABLE):
 {formatted_findings}
 
 GUIDELINE CONTEXT (REFERENCE ONLY):
-{guideline_text}
+{guideline_context}
 
 TASK:
 Provide a cautious clinical interpretation of the findings.
@@ -59,11 +308,67 @@ OUTPUT:
 A short explanation suitable for a physician.
 """
 
-    result = subprocess.run(
-        ["ollama", "run", "llama3:8b"],
-        input=prompt,
-        text=True,
-        capture_output=True
-    )
 
-    return result.stdout.strip()
+def explanation_cache_key(prompt, backend):
+    return make_key(prompt, backend.model, SYSTEM_PROMPT_VERSION)
+
+
+def cached_explanation(findings, guideline_context, backend=None, cache=None):
+    """
+    Return the cached explanation for these inputs, or None.
+    """
+    backend = backend or get_backend()
+    if cache is None:
+        cache = get_explanation_cache()
+
+    return cache.get(explanation_cache_key(build_prompt(findings, guideline_context), backend))
+
+
+def llm_explanation(findings, guideline_context, backend=None, cache=None,
+                    use_cache=True):
+    backend = backend or get_backend()
+    prompt = build_prompt(findings, guideline_context)
+
+    if not use_cache:
+        return backend.generate(prompt)
+
+    if cache is None:
+        cache = get_explanation_cache()
+    key = explanation_cache_key(prompt, backend)
+
+    text = cache.get(key)
+    if text is not None:
+        return text
+
+    text = backend.generate(prompt)
+    cache.put(key, text, model=backend.model, prompt_version=SYSTEM_PROMPT_VERSION)
+    return text
+
+
+def llm_explanation_stream(findings, guideline_context, backend=None, cache=None,
+                           use_cache=True):
+    backend = backend or get_backend()
+    prompt = build_prompt(findings, guideline_context)
+
+    if not use_cache:
+        yield from backend.stream(prompt)
+        return
+
+    if cache is None:
+        cache = get_explanation_cache()
+    key = explanation_cache_key(prompt, backend)
+
+    text = cache.get(key)
+    if text is not None:
+        yield text
+        return
+
+    parts = []
+    for token in backend.stream(prompt):
+        parts.append(token)
+        yield token
+
+    cache.put(
+        key, "".join(parts).strip(),
+        model=backend.model, prompt_version=SYSTEM_PROMPT_VERSION
+    )
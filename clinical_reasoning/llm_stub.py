@@ -0,0 +1,109 @@
+# llm_stub.py
+#
+# Tiny local stand-in for the Ollama HTTP API, used by tests and for running
+# the app without a model. Only /api/generate is implemented; responses are
+# streamed as chunked NDJSON exactly like the real server.
+#
+#   python -m clinical_reasoning.llm_stub --port 11435
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_REPLY = (
+    "The reported findings may be consistent with a possible endocrine "
+    "pattern. Data not available for additional parameters. Clinical "
+    "correlation is advised and final decisions rest with the clinician."
+)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        server = self.server
+        server.requests.append(payload)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        prompt = payload.get("prompt")
+        reply = server.reply(prompt) if callable(server.reply) else server.reply
+        words = reply.split(" ") if prompt else []
+
+        for i, word in enumerate(words):
+            if server.token_delay:
+                time.sleep(server.token_delay)
+            token = word if i == 0 else " " + word
+            message = {"model": payload.get("model"), "response": token, "done": False}
+            self._write_chunk(json.dumps(message).encode("utf-8") + b"\n")
+
+        done = {"model": payload.get("model"), "response": "", "done": True}
+        self._write_chunk(json.dumps(done).encode("utf-8") + b"\n")
+        self._write_chunk(b"")
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """
+    In-process stub server. `reply` may be a string or a callable(prompt).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, reply=DEFAULT_REPLY, token_delay=0.0):
+        super().__init__((host, port), _StubHandler)
+        self.reply = reply
+        self.token_delay = token_delay
+        self.requests = []
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama /api/generate server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, token_delay=args.token_delay)
+    print(f"Stub LLM server listening on {server.address}")
+    server.serve_forever()
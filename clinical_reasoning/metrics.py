@@ -0,0 +1,508 @@
+# metrics.py
+#
+# Small in-process metrics registry rendered in the Prometheus text format
+# (served by app.py at /metrics). Stage latencies go into one histogram
+# labelled by stage; counters track cache hits, fallbacks and errors.
+#
+# Each process has its own registry. Under a pre-forking server a scrape
+# reaches one worker only, so with CDS_METRICS_DIR set every worker also
+# writes a snapshot of its registry to <dir>/<pid>.json, and /metrics
+# merges the snapshots (see "Multi-process aggregation" below).
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Seconds; covers sub-millisecond rules up to multi-second LLM calls
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        with self._lock:
+            series = [[list(key), value] for key, value in self._values.items()]
+        return {"name": self.name, "type": "counter", "help": self.help,
+                "labelnames": list(self.labelnames), "series": series}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}      # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def observer(self, **labels):
+        """
+        observe() bound to one label set, for hot loops that should not
+        rebuild the series key on every call.
+        """
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        buckets = self.buckets
+        n = len(buckets)
+        all_series = self._series
+        lock = self._lock
+
+        def observe(value):
+            i = bisect.bisect_left(buckets, value)
+            with lock:
+                series = all_series.get(key)
+                if series is None:
+                    series = all_series[key] = [0] * (n + 2)
+                if i < n:
+                    series[i] += 1
+                series[-2] += value
+                series[-1] += 1
+
+        return observe
+
+    def count(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        series = self._series.get(key)
+        return series[-1] if series else 0
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self):
+        with self._lock:
+            series = [[list(key), list(values)] for key, values in self._series.items()]
+        return {"name": self.name, "type": "histogram", "help": self.help,
+                "labelnames": list(self.labelnames), "buckets": list(self.buckets),
+                "series": series}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """
+        `collect()` returns (name, type, help, [(labels_dict, value), ...])
+        tuples read at scrape time, e.g. from a cache's own stats().
+        """
+        self._collectors.append(collect)
+
+    def clear(self):
+        for metric in self._metrics:
+            metric.clear()
+
+    def collect(self):
+        families = []
+        for collect in self._collectors:
+            try:
+                families.extend(collect())
+            except Exception:
+                continue
+        return families
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for family in self.collect():
+            lines.extend(_render_family(*family))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {
+            "metrics": [metric.snapshot() for metric in self._metrics],
+            "families": self.collect(),
+        }
+
+
+def _render_family(name, kind, help, samples):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        names = tuple(labels)
+        lines.append(
+            f"{name}{_format_labels(names, tuple(labels[n] for n in names))} "
+            f"{_format_value(value)}"
+        )
+    return lines
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "cds_stage_seconds",
+    "Latency of each assessment stage in seconds.",
+    labelnames=("stage",)
+))
+
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "cds_stage_errors_total",
+    "Exceptions raised inside an assessment stage.",
+    labelnames=("stage",)
+))
+
+FALLBACKS = REGISTRY.register(Counter(
+    "cds_fallbacks_total",
+    "Assessments that used a fallback instead of a stage result.",
+    labelnames=("stage", "reason")
+))
+
+EVIDENCE_LOOKUPS = REGISTRY.register(Counter(
+    "cds_evidence_lookups_total",
+    "Guideline excerpts served from the precomputed table or live search.",
+    labelnames=("source",)
+))
+
+REQUESTS = REGISTRY.register(Counter(
+    "cds_requests_total",
+    "HTTP requests handled, by endpoint and status.",
+    labelnames=("endpoint", "status")
+))
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block into cds_stage_seconds{stage=...}; exceptions are counted
+    in cds_stage_errors_total and re-raised.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def render():
+    if METRICS_DIR:
+        return render_multiprocess(METRICS_DIR)
+    return REGISTRY.render()
+
+
+# -----------------------------
+# Multi-process aggregation
+# -----------------------------
+# Snapshots of exited workers are kept, so summed counters never go back
+# when a worker is replaced; they only stop contributing gauges. The
+# directory should be emptied when the server starts (clear_metrics_dir).
+
+METRICS_DIR = os.environ.get("CDS_METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get("CDS_METRICS_FLUSH_INTERVAL", "5"))
+
+_flusher = None
+_flusher_stop = threading.Event()
+
+
+def write_snapshot(directory, live=True, registry=REGISTRY):
+    """
+    Write this process's registry to <directory>/<pid>.json.
+    """
+    snapshot = registry.snapshot()
+    snapshot["pid"] = os.getpid()
+    snapshot["live"] = live
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def _read_snapshots(directory):
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def merge_snapshots(snapshots):
+    """
+    Prometheus text for a set of worker snapshots: counters and histograms
+    are summed per label set; collector gauges of live workers are kept
+    apart with a pid label, collector counters are summed.
+    """
+    merged = {}
+    for snapshot in snapshots:
+        for spec in snapshot["metrics"]:
+            metric = merged.get(spec["name"])
+            if metric is None:
+                if spec["type"] == "counter":
+                    metric = Counter(spec["name"], spec["help"], spec["labelnames"])
+                else:
+                    metric = Histogram(spec["name"], spec["help"], spec["labelnames"], spec["buckets"])
+                merged[spec["name"]] = metric
+
+            for key, value in spec["series"]:
+                key = tuple(key)
+                if spec["type"] == "counter":
+                    metric._values[key] = metric._values.get(key, 0) + value
+                    continue
+                series = metric._series.get(key)
+                if series is None:
+                    metric._series[key] = list(value)
+                else:
+                    metric._series[key] = [a + b for a, b in zip(series, value)]
+
+    families = {}
+    for snapshot in snapshots:
+        for name, kind, help, samples in snapshot["families"]:
+            family = families.setdefault(name, (kind, help, {}))
+            for labels, value in samples:
+                if kind == "gauge":
+                    if not snapshot["live"]:
+                        continue
+                    labels = dict(labels, pid=snapshot["pid"])
+                key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+                family[2][key] = family[2].get(key, 0) + value
+
+    lines = []
+    for metric in merged.values():
+        lines.extend(metric.render())
+    for name, (kind, help, samples) in families.items():
+        lines.extend(_render_family(name, kind, help, [(dict(key), value) for key, value in samples.items()]))
+    return "\n".join(lines) + "\n"
+
+
+def render_multiprocess(directory):
+    # This worker's own numbers are always current; the others' are at
+    # most METRICS_FLUSH_INTERVAL old
+    write_snapshot(directory)
+    return merge_snapshots(_read_snapshots(directory))
+
+
+def clear_metrics_dir(directory=None):
+    """
+    Remove the snapshots of a previous server run.
+    """
+    directory = directory or METRICS_DIR
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(".json") or name.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def _flush_loop(directory, interval):
+    while not _flusher_stop.wait(interval):
+        try:
+            write_snapshot(directory)
+        except OSError:
+            pass
+
+
+def start_metrics_flusher(directory=None, interval=METRICS_FLUSH_INTERVAL):
+    """
+    Write this worker's snapshot every `interval` seconds (call after the
+    fork). Returns the thread, or None without CDS_METRICS_DIR.
+    """
+    global _flusher
+
+    directory = directory or METRICS_DIR
+    if not directory:
+        return None
+
+    # Counts recorded in the master before the fork belong to no worker
+    REGISTRY.clear()
+
+    _flusher_stop.clear()
+    _flusher = threading.Thread(
+        target=_flush_loop, args=(directory, interval), name="cds-metrics-flusher", daemon=True
+    )
+    _flusher.start()
+    return _flusher
+
+
+def stop_metrics_flusher(directory=None):
+    """
+    Stop flushing and write a final snapshot marked as exited.
+    """
+    directory = directory or METRICS_DIR
+    _flusher_stop.set()
+    if directory:
+        try:
+            write_snapshot(directory, live=False)
+        except OSError:
+            pass
+
+
+# -----------------------------
+# Collectors for components that keep their own stats
+# -----------------------------
+
+def _explanation_cache_collector():
+    from clinical_reasoning.explanation_cache import get_explanation_cache
+
+    stats = get_explanation_cache().stats()
+    return [
+        ("cds_explanation_cache_lookups_total", "counter",
+         "Explanation cache lookups by result.",
+         [({"result": "hit"}, stats["hits"]),
+          ({"result": "disk_hit"}, stats["disk_hits"]),
+          ({"result": "miss"}, stats["misses"])]),
+        ("cds_explanation_cache_evictions_total", "counter",
+         "Explanation cache entries evicted or expired.",
+         [({"reason": "lru"}, stats["evictions"]),
+          ({"reason": "ttl"}, stats["expirations"]),
+          ({"reason": "disk"}, stats["disk_evictions"])]),
+        ("cds_explanation_cache_entries", "gauge",
+         "Explanations held in memory.",
+         [({}, stats["entries"])]),
+    ]
+
+
+def _assessment_cache_collector():
+    from clinical_reasoning.assessment_cache import get_assessment_cache
+
+    stats = get_assessment_cache().stats()
+    return [
+        ("cds_assessment_cache_lookups_total", "counter",
+         "Whole-assessment cache lookups by result.",
+         [({"result": "hit"}, stats["hits"]),
+          ({"result": "miss"}, stats["misses"])]),
+        ("cds_assessment_cache_evictions_total", "counter",
+         "Assessment cache entries evicted, expired or invalidated wholesale.",
+         [({"reason": "lru"}, stats["evictions"]),
+          ({"reason": "ttl"}, stats["expirations"]),
+          ({"reason": "version"}, stats["invalidations"])]),
+        ("cds_assessment_cache_entries", "gauge",
+         "Assessments held in memory.",
+         [({}, stats["entries"])]),
+    ]
+
+
+def _retriever_collector():
+    from clinical_reasoning.retrieval import get_retriever
+
+    stats = get_retriever().stats()
+    return [
+        ("cds_vector_store_opens_total", "counter",
+         "Times the guideline vector store was (re)opened.",
+         [({}, stats["opens"])]),
+        ("cds_vector_store_errors_total", "counter",
+         "Vector store open and query failures.",
+         [({"op": "open"}, stats["open_errors"]),
+          ({"op": "query"}, stats["query_errors"])]),
+    ]
+
+
+def _rules_collector():
+    from clinical_reasoning.rule_engine import get_rule_engine
+
+    stats = get_rule_engine().stats()
+    return [
+        ("cds_rule_set_info", "gauge",
+         "Active rule set (version label).",
+         [({"version": stats["version"]}, 1)]),
+        ("cds_rule_set_loads_total", "counter",
+         "Rule file compilations, by outcome.",
+         [({"result": "ok"}, stats["loads"]),
+          ({"result": "error"}, stats["load_errors"])]),
+    ]
+
+
+REGISTRY.register_collector(_explanation_cache_collector)
+REGISTRY.register_collector(_assessment_cache_collector)
+REGISTRY.register_collector(_retriever_collector)
+REGISTRY.register_collector(_rules_collector)
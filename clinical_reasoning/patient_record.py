@@ -0,0 +1,249 @@
+# patient_record.py
+#
+# One patient visit as a flat, slot-based record, parsed once per request.
+#
+# PatientRecord.parse() takes any flat mapping (the workspace form, a CSV
+# row, a flat JSON record); PatientRecord.from_patient_data() takes the
+# nested patient_data structure. Field names are matched case-insensitively,
+# so the spellings that drifted between callers (HbA1c/hba1c, FBS/fbs,
+# BP_Systolic/bp_systolic, Cortisol_AM) all land in the same field, and the
+# nested vitals.blood_pressure.systolic/diastolic become bp_systolic and
+# bp_diastolic. Rules, critical checks and the lab history read the fields
+# directly instead of walking dicts.
+
+import datetime
+import math
+
+
+SEXES = ("female", "male", "other")
+
+TRUE_VALUES = {"1", "true", "yes", "y", "on"}
+FALSE_VALUES = {"", "0", "false", "no", "n", "off"}
+
+# (field, section, kind); section is the patient_data section it belongs to
+FIELDS = (
+    ("patient_id", "context", "text"),
+    ("visit_date", "context", "date"),
+
+    ("age", "demographics", "int"),
+    ("sex", "demographics", "sex"),
+
+    ("bp_systolic", "vitals", "int"),
+    ("bp_diastolic", "vitals", "int"),
+    ("heart_rate", "vitals", "int"),
+    ("weight", "vitals", "float"),
+    ("height", "vitals", "float"),
+    ("bmi", "vitals", "float"),
+    ("waist_circumference", "vitals", "float"),
+
+    ("fbs", "labs", "float"),
+    ("hba1c", "labs", "float"),
+    ("tsh", "labs", "float"),
+    ("ft4", "labs", "float"),
+    ("cortisol_am", "labs", "float"),
+    ("triglycerides", "labs", "float"),
+    ("hdl", "labs", "float"),
+
+    ("fatigue", "symptoms", "flag"),
+    ("weight_gain", "symptoms", "flag"),
+    ("menstrual_irregularity", "symptoms", "flag"),
+    ("hirsutism", "symptoms", "flag"),
+    ("acne_severity", "symptoms", "text"),
+    ("family_history_diabetes", "symptoms", "flag"),
+)
+
+FIELD_KINDS = {name: kind for name, _, kind in FIELDS}
+SECTION_FIELDS = {}
+for _name, _section, _kind in FIELDS:
+    SECTION_FIELDS.setdefault(_section, []).append(_name)
+
+# Symptoms that only apply to female patients
+FEMALE_ONLY = ("menstrual_irregularity", "hirsutism")
+
+
+def _parse(kind, value):
+    """
+    Parse one raw value; None for empty input. Raises ValueError.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "" and kind != "flag":
+            return None
+    if value is None:
+        return False if kind == "flag" else None
+
+    if kind in ("int", "float"):
+        if isinstance(value, bool):
+            raise ValueError("expected a number")
+        try:
+            number = float(value)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("expected a number")
+        if not math.isfinite(number):
+            raise ValueError("expected a finite number")
+        return int(number) if kind == "int" else number
+    if kind == "flag":
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in TRUE_VALUES:
+            return True
+        if text in FALSE_VALUES:
+            return False
+        raise ValueError("expected a yes/no value")
+    if kind == "date":
+        try:
+            return datetime.date.fromisoformat(str(value)).isoformat()
+        except ValueError:
+            raise ValueError("expected a date (YYYY-MM-DD)")
+    if kind == "sex":
+        text = str(value).lower()
+        if text not in SEXES:
+            raise ValueError(f"expected one of {', '.join(SEXES)}")
+        return text
+    return str(value)
+
+
+def _mapping(value, name):
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError(f"invalid patient record: {name}: expected an object")
+    return value
+
+
+class PatientRecord:
+
+    __slots__ = tuple(name for name, _, _ in FIELDS) + ("trends",)
+
+    def __init__(self, **values):
+        for name, _, kind in FIELDS:
+            setattr(self, name, values.pop(name, False if kind == "flag" else None))
+        self.trends = values.pop("trends", None)
+        if values:
+            raise TypeError(f"unknown patient fields: {sorted(values)}")
+
+    # -----------------------------
+    # Parsing
+    # -----------------------------
+    @classmethod
+    def parse(cls, fields, strict=False):
+        """
+        Build a record from a flat mapping. Unknown keys are ignored. With
+        strict=True a value that does not parse raises ValueError naming
+        the field; otherwise it is treated as missing.
+        """
+        values = {}
+        errors = []
+        for key, raw in fields.items():
+            name = str(key).lower()
+            kind = FIELD_KINDS.get(name)
+            if kind is None:
+                continue
+            try:
+                values[name] = _parse(kind, raw)
+            except (TypeError, ValueError) as e:
+                if strict:
+                    errors.append(f"{key}: {e}")
+
+        if errors:
+            raise ValueError("invalid patient record: " + "; ".join(errors))
+
+        record = cls(**values)
+        record._derive()
+        return record
+
+    @classmethod
+    def from_patient_data(cls, patient_data, strict=False):
+        """
+        Build a record from the nested patient_data structure. A section,
+        blood_pressure or trends that is not a mapping raises ValueError.
+        """
+        fields = {
+            key: value for key, value in patient_data.items()
+            if not isinstance(value, dict)
+        }
+        for section in ("context", "patient_context", "demographics", "labs", "vitals", "symptoms"):
+            fields.update(_mapping(patient_data.get(section), section))
+
+        # Flat bp_* keys win over the nested form
+        blood_pressure = _mapping(fields.pop("blood_pressure", None), "blood_pressure")
+        for part in ("systolic", "diastolic"):
+            if blood_pressure.get(part) is not None:
+                fields.setdefault(f"bp_{part}", blood_pressure[part])
+
+        trends = _mapping(patient_data.get("trends"), "trends")
+        record = cls.parse(fields, strict=strict)
+        if trends:
+            record.trends = dict(trends)
+        return record
+
+    def _derive(self):
+        # Backend-authoritative BMI
+        if self.bmi is None and self.weight and self.height:
+            self.bmi = round(self.weight / ((self.height / 100) ** 2), 1)
+
+        # Sex-based clinical filtering
+        if self.sex != "female":
+            for name in FEMALE_ONLY:
+                setattr(self, name, False)
+
+    # -----------------------------
+    # Access
+    # -----------------------------
+    def section(self, section):
+        return {name: getattr(self, name) for name in SECTION_FIELDS[section]}
+
+    def measures(self):
+        """
+        {field: value} for the numeric labs and vitals present.
+        """
+        return {
+            name: float(getattr(self, name))
+            for section in ("vitals", "labs")
+            for name in SECTION_FIELDS[section]
+            if getattr(self, name) is not None
+        }
+
+    def has_clinical_data(self):
+        return (
+            any(getattr(self, name) is not None
+                for section in ("vitals", "labs") for name in SECTION_FIELDS[section])
+            or any(getattr(self, name) for name in SECTION_FIELDS["symptoms"])
+        )
+
+    def as_dict(self):
+        """
+        Flat {field: value} without missing values (for hashing and logs).
+        """
+        values = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is not None:
+                values[name] = value
+        return values
+
+    def replace(self, **changes):
+        record = PatientRecord.__new__(PatientRecord)
+        for name in self.__slots__:
+            setattr(record, name, changes.pop(name, getattr(self, name)))
+        if changes:
+            raise TypeError(f"unknown patient fields: {sorted(changes)}")
+        return record
+
+    def __eq__(self, other):
+        if not isinstance(other, PatientRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"PatientRecord({self.as_dict()!r})"
+
+
+def as_record(patient):
+    """
+    The record itself, or a record parsed from a patient_data dict.
+    """
+    if isinstance(patient, PatientRecord):
+        return patient
+    return PatientRecord.from_patient_data(patient)
@@ -1,29 +1,293 @@
 # retrieval.py
 
 import os
+import threading
+import time
 
-# chromadb is an optional runtime dependency; if unavailable, provide a safe
-# fallback so the reasoning layer can still be executed for testing/local runs.
-try:
-    import chromadb
+# chromadb is an optional runtime dependency and slow to import, so it is
+# loaded on first use (or by warmup.py); if unavailable, retrieval returns
+# no guidelines so the reasoning layer can still run for testing/local runs.
+_chromadb = None
+_chromadb_lock = threading.Lock()
 
-    def retrieve_guidelines(query, domain, n_results=3):
-        client = chromadb.PersistentClient(
-            path=os.path.abspath("vector_db")
-        )
 
-        collection = client.get_collection("medical_guidelines")
+def _import_chromadb():
+    global _chromadb
 
-        results = collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            where={"domain": domain}
-        )
+    if _chromadb is None:
+        with _chromadb_lock:
+            if _chromadb is None:
+                try:
+                    import chromadb
+                except Exception:
+                    chromadb = False
+                _chromadb = chromadb
+
+    return _chromadb or None
+
+
+DB_DIR = "vector_db"
+COLLECTION_NAME = "medical_guidelines"
+
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "corpus.snapshot")
+
+# snapshot, chroma, faiss, bm25, or hybrid (bm25 + a dense backend fused
+# with RRF); see corpus_snapshot.py, faiss_index.py and lexical_index.py for
+# the on-disk layouts. Defaults to the shared corpus snapshot when one has
+# been built, else Chroma.
+RETRIEVAL_BACKEND = os.environ.get(
+    "RETRIEVAL_BACKEND", "snapshot" if os.path.exists(SNAPSHOT_PATH) else "chroma"
+).lower()
+FAISS_INDEX_DIR = os.environ.get("FAISS_INDEX_DIR", "faiss_index")
+LEXICAL_INDEX_DIR = os.environ.get("LEXICAL_INDEX_DIR", "lexical_index")
+
+# Dense half of the hybrid backend, and how long (ms) it may take
+HYBRID_DENSE_BACKEND = os.environ.get("HYBRID_DENSE_BACKEND", "chroma").lower()
+HYBRID_BUDGET_MS = float(os.environ.get("HYBRID_BUDGET_MS", "150"))
+
+# How often (seconds) the on-disk store is checked for a rebuild
+STORE_CHECK_INTERVAL = 5.0
+
+
+class GuidelineRetriever:
+    """
+    Process-wide handle on the guideline vector store.
+
+    The Chroma client and collection are opened once and shared by every
+    worker thread. The store file is re-checked every few seconds and the
+    handle is reopened when the store has been rebuilt on disk.
+    """
+
+    def __init__(self, path=DB_DIR, collection_name=COLLECTION_NAME,
+                 check_interval=STORE_CHECK_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.collection_name = collection_name
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._collection = None
+        self._store_stamp = None
+        self._last_check = 0.0
+
+        self._stats = {
+            "opens": 0,
+            "open_errors": 0,
+            "open_seconds_total": 0.0,
+            "last_open_seconds": None,
+            "queries": 0,
+            "query_errors": 0,
+            "query_seconds_total": 0.0,
+            "last_query_seconds": None,
+        }
+
+    # -----------------------------
+    # Store lifecycle
+    # -----------------------------
+    def _current_stamp(self):
+        # A rebuilt store gets a new sqlite file (new inode) or a new mtime
+        try:
+            st = os.stat(os.path.join(self.path, "chroma.sqlite3"))
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _open(self):
+        chromadb = _import_chromadb()
+        start = time.perf_counter()
+        try:
+            # Chroma caches one system per path; drop it so a rebuilt store
+            # is actually re-read from disk.
+            if self._client is not None:
+                try:
+                    chromadb.api.client.SharedSystemClient.clear_system_cache()
+                except Exception:
+                    pass
+
+            client = chromadb.PersistentClient(path=self.path)
+            collection = client.get_collection(self.collection_name)
+        except Exception:
+            self._client = None
+            self._collection = None
+            self._stats["open_errors"] += 1
+            return None
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stats["last_open_seconds"] = elapsed
+            self._stats["open_seconds_total"] += elapsed
+
+        self._client = client
+        self._collection = collection
+        self._store_stamp = self._current_stamp()
+        self._stats["opens"] += 1
+        return collection
+
+    def _get_collection(self, force_reopen=False):
+        now = time.monotonic()
+
+        collection = self._collection
+        if (
+            collection is not None
+            and not force_reopen
+            and now - self._last_check < self.check_interval
+        ):
+            return collection
+
+        with self._lock:
+            if self._collection is None and not force_reopen:
+                # Don't hammer a missing store; retry once per interval
+                if self._last_check and now - self._last_check < self.check_interval:
+                    return None
+
+            if force_reopen or self._collection is None:
+                self._last_check = now
+                return self._open()
+
+            if now - self._last_check >= self.check_interval:
+                self._last_check = now
+                if self._current_stamp() != self._store_stamp:
+                    return self._open()
+
+            return self._collection
 
-        # Return first document or empty string if none
-        return results.get("documents", [[]])[0]
+    def close(self):
+        with self._lock:
+            self._client = None
+            self._collection = None
+            self._store_stamp = None
+
+    # -----------------------------
+    # Query
+    # -----------------------------
+    def retrieve(self, query, domain, n_results=3):
+        if _import_chromadb() is None:
+            return []
+
+        collection = self._get_collection()
+        if collection is None:
+            return []
+
+        for attempt in range(2):
+            start = time.perf_counter()
+            try:
+                results = collection.query(
+                    query_texts=[query],
+                    n_results=n_results,
+                    where={"domain": domain}
+                )
+            except Exception:
+                self._stats["query_errors"] += 1
+                if attempt:
+                    return []
+                # Collection may have been dropped by a rebuild; reopen once
+                collection = self._get_collection(force_reopen=True)
+                if collection is None:
+                    return []
+                continue
+            finally:
+                elapsed = time.perf_counter() - start
+                self._stats["last_query_seconds"] = elapsed
+                self._stats["query_seconds_total"] += elapsed
+
+            self._stats["queries"] += 1
+            # Return documents for the single query (empty list if none)
+            return results.get("documents", [[]])[0]
 
-except Exception:
-    # Fallback when chromadb isn't installed or vector DB isn't present.
-    def retrieve_guidelines(query, domain, n_results=3):
         return []
+
+    def stats(self):
+        """
+        Snapshot of open/query counts and timings (seconds).
+        """
+        snapshot = dict(self._stats)
+        snapshot["store_path"] = self.path
+        snapshot["is_open"] = self._collection is not None
+        return snapshot
+
+
+# -----------------------------
+# Process-wide retriever
+# -----------------------------
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def create_retriever(backend=None):
+    """
+    Build the retriever for `backend` (default: RETRIEVAL_BACKEND). Every
+    backend exposes retrieve(query, domain, n_results), stats() and close().
+    """
+    backend = (backend or RETRIEVAL_BACKEND).lower()
+
+    if backend == "snapshot":
+        from clinical_reasoning.corpus_snapshot import SnapshotRetriever
+        return SnapshotRetriever(SNAPSHOT_PATH)
+    if backend == "faiss":
+        from clinical_reasoning.faiss_index import FaissRetriever
+        return FaissRetriever(
+            FAISS_INDEX_DIR,
+            nprobe=int(os.environ.get("FAISS_NPROBE", "8")),
+            ef_search=int(os.environ.get("FAISS_EF_SEARCH", "64")),
+            rescore=os.environ.get("FAISS_RESCORE", "1") != "0"
+        )
+    if backend == "chroma":
+        return GuidelineRetriever()
+    if backend == "bm25":
+        from clinical_reasoning.lexical_index import LexicalRetriever
+        return LexicalRetriever(LEXICAL_INDEX_DIR)
+    if backend == "hybrid":
+        from clinical_reasoning.lexical_index import HybridRetriever, LexicalRetriever
+        return HybridRetriever(
+            create_retriever(HYBRID_DENSE_BACKEND),
+            LexicalRetriever(LEXICAL_INDEX_DIR),
+            budget=HYBRID_BUDGET_MS / 1000.0
+        )
+
+    raise ValueError(f"Unknown retrieval backend: {backend}")
+
+
+def get_retriever():
+    global _retriever
+
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = create_retriever()
+
+    return _retriever
+
+
+def store_markers(backend=None):
+    """
+    Files whose (inode, mtime) change whenever `backend`'s store is rebuilt.
+    """
+    backend = (backend or RETRIEVAL_BACKEND).lower()
+
+    if backend == "snapshot":
+        return [SNAPSHOT_PATH]
+    if backend == "faiss":
+        return [os.path.join(FAISS_INDEX_DIR, "manifest.json")]
+    if backend == "bm25":
+        return [os.path.join(LEXICAL_INDEX_DIR, "manifest.json")]
+    if backend == "hybrid":
+        return store_markers(HYBRID_DENSE_BACKEND) + store_markers("bm25")
+    return [os.path.join(DB_DIR, "chroma.sqlite3")]
+
+
+def index_version(backend=None):
+    """
+    Cheap on-disk version of the configured store (no store is opened).
+    """
+    stamps = []
+    for path in store_markers(backend):
+        try:
+            st = os.stat(path)
+        except OSError:
+            stamps.append(None)
+            continue
+        stamps.append(f"{st.st_ino}:{st.st_mtime_ns}")
+    return stamps
+
+
+def retrieve_guidelines(query, domain, n_results=3):
+    return get_retriever().retrieve(query, domain, n_results=n_results)
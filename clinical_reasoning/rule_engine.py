@@ -0,0 +1,632 @@
+# rule_engine.py
+#
+# Declarative screening rules (rules.json) compiled into an evaluator.
+#
+# The rule file lists the features read from patient_data and, per domain,
+# guards, required features, override patterns, scored criteria and ordered
+# outcomes. At load time:
+#
+#   - every feature is extracted once per patient and shared by all rules;
+#   - each criterion's threshold bands become a sorted breakpoint table, so
+#     a value is classified with one bisect instead of an if-chain;
+#   - required features and guards are checked first, so a rule whose
+#     inputs are missing costs one dict lookup.
+#
+# CompiledRule.evaluate() interprets those tables and is the reference. The
+# request path runs Python generated from the same rule set instead: one
+# function that reads every feature straight off the PatientRecord into a
+# tuple, and one straight-line function per enabled rule with thresholds
+# inlined as comparisons (see "Code generation" below). Generated code only
+# ever inlines numbers; strings, results and tag sets are passed in as
+# constants, so a rule file cannot inject code.
+#
+# The file is re-checked every few seconds; a changed file is compiled by
+# the first request that notices and swapped in with one assignment, so
+# workers pick up new rule sets without a restart. A file that fails to
+# compile leaves the previous rule set in place.
+#
+# rules.py keeps the original hand-written functions as the reference the
+# compiled rules are tested against.
+
+import bisect
+import hashlib
+import json
+import logging
+import operator
+import os
+import threading
+import time
+
+from clinical_reasoning.metrics import STAGE_ERRORS, STAGE_SECONDS
+from clinical_reasoning.patient_record import FIELD_KINDS, PatientRecord
+
+
+RULES_PATH = os.environ.get(
+    "CDS_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+)
+RULES_CHECK_INTERVAL = 5.0
+
+SOURCES = ("labs", "vitals", "symptoms", "demographics", "trends")
+OPERATORS = ("gt", "gte", "lt", "lte")
+
+logger = logging.getLogger("cds.rules")
+
+
+class RuleSetError(ValueError):
+    pass
+
+
+# -----------------------------
+# Compilation
+# -----------------------------
+
+def _band_matches(band, value):
+    if "gt" in band and not value > band["gt"]:
+        return False
+    if "gte" in band and not value >= band["gte"]:
+        return False
+    if "lt" in band and not value < band["lt"]:
+        return False
+    if "lte" in band and not value <= band["lte"]:
+        return False
+    return True
+
+
+class ThresholdTable:
+    """
+    First-matching-band lookup for numeric bands.
+
+    The band edges split the number line into points and open intervals;
+    which band (if any) matches is precomputed for each piece, so lookup is
+    one bisect.
+    """
+
+    def __init__(self, bands):
+        self.bands = bands
+        self.edges = sorted({band[op] for band in bands for op in OPERATORS if op in band})
+
+        # Pieces: (-inf, e0), [e0], (e0, e1), [e1], ..., (en, inf)
+        probes = []
+        for i, edge in enumerate(self.edges):
+            below = self.edges[i - 1] if i else edge - 1.0
+            probes.append((below + edge) / 2 if i else below)
+            probes.append(edge)
+        probes.append(self.edges[-1] + 1.0 if self.edges else 0.0)
+
+        # One representative value per piece (used to enumerate outcomes)
+        self.probes = probes
+        self.pieces = [self._first_match(probe) for probe in probes]
+
+    def _first_match(self, value):
+        for i, band in enumerate(self.bands):
+            if _band_matches(band, value):
+                return i
+        return None
+
+    def lookup(self, value):
+        i = bisect.bisect_left(self.edges, value)
+        if i < len(self.edges) and self.edges[i] == value:
+            return self.pieces[2 * i + 1]
+        return self.pieces[2 * i]
+
+
+class Criterion:
+
+    def __init__(self, spec):
+        self.feature = spec["feature"]
+        if "bands" in spec:
+            self.bands = [self._effect(band) for band in spec["bands"]]
+            self.table = ThresholdTable(spec["bands"])
+        else:
+            # Flag criterion: counts when the feature is truthy
+            self.bands = [self._effect(spec)]
+            self.table = None
+
+    @staticmethod
+    def _effect(spec):
+        return (spec.get("score", 0), spec.get("finding"), spec.get("tag"))
+
+    def apply(self, value):
+        if value is None:
+            return None
+        if self.table is None:
+            return self.bands[0] if value else None
+        band = self.table.lookup(value)
+        return None if band is None else self.bands[band]
+
+
+class CompiledRule:
+
+    def __init__(self, spec, features):
+        self.domain = spec["domain"]
+        self.stage = f"rule_{self.domain}"
+        self.enabled = spec.get("enabled", True)
+        self.borderline_risk = spec.get("borderline_risk")
+        self.report_unless_risk = tuple(spec.get("report_unless_risk", ()))
+
+        requires = spec.get("requires", {})
+        self.requires_all = tuple(requires.get("all", ()))
+        self.requires_any = tuple(requires.get("any", ()))
+
+        self.guard_specs = list(spec.get("guards", ()))
+        self.guards = [(g["feature"], self._predicate(g)) for g in self.guard_specs]
+        self.override_specs = list(spec.get("overrides", ()))
+        self.overrides = [
+            ([(w["feature"], ThresholdTable([w])) for w in o["when"]], self._result(o, o.get("findings", [])))
+            for o in self.override_specs
+        ]
+        self.criteria = [Criterion(c) for c in spec.get("criteria", ())]
+        self._criteria = [
+            (c.feature, c.table.lookup if c.table is not None else None, c.bands)
+            for c in self.criteria
+        ]
+        self.outcomes = [
+            (o.get("min_score"), frozenset(o.get("tags", ())), self._result(o))
+            for o in spec.get("outcomes", ())
+        ]
+        otherwise = spec.get("otherwise")
+        self.otherwise = self._result(otherwise) if otherwise else None
+
+        used = set(self.requires_all) | set(self.requires_any) | {f for f, _ in self.guards}
+        used |= {f for when, _ in self.overrides for f, _ in when}
+        used |= {c.feature for c in self.criteria}
+        unknown = used - set(features)
+        if unknown:
+            raise RuleSetError(f"rule {self.domain!r} uses unknown features {sorted(unknown)}")
+        self.features = used
+
+    @staticmethod
+    def _predicate(guard):
+        if "eq" in guard:
+            expected = guard["eq"]
+            return lambda value: value == expected
+        table = ThresholdTable([guard])
+        return lambda value: value is not None and table.lookup(value) is not None
+
+    @staticmethod
+    def _result(spec, findings=None):
+        result = {key: spec[key] for key in ("condition", "risk_level", "confidence")}
+        if findings is not None:
+            result["clinical_findings"] = list(findings)
+        return result
+
+    def evaluate(self, values):
+        """
+        Result dict in the shape of the rules.py functions, or None.
+        """
+        for feature in self.requires_all:
+            if values[feature] is None:
+                # Overrides only apply to complete inputs as well
+                return None
+        if self.requires_any and all(values[f] is None for f in self.requires_any):
+            return None
+
+        for feature, predicate in self.guards:
+            if not predicate(values[feature]):
+                return None
+
+        for when, result in self.overrides:
+            if all(values[f] is not None and table.lookup(values[f]) is not None for f, table in when):
+                return dict(result, clinical_findings=list(result["clinical_findings"]))
+
+        # Criterion.apply, inlined: this loop is the per-patient hot path
+        score = 0
+        findings = []
+        tags = set()
+        for feature, lookup, bands in self._criteria:
+            value = values[feature]
+            if value is None:
+                continue
+            if lookup is None:
+                if not value:
+                    continue
+                points, finding, tag = bands[0]
+            else:
+                band = lookup(value)
+                if band is None:
+                    continue
+                points, finding, tag = bands[band]
+            score += points
+            if finding:
+                findings.append(finding)
+            if tag:
+                tags.add(tag)
+
+        for min_score, required_tags, result in self.outcomes:
+            if min_score is not None and score < min_score:
+                continue
+            if not required_tags <= tags:
+                continue
+            return dict(result, clinical_findings=findings)
+
+        if self.otherwise is None:
+            return None
+        return dict(self.otherwise, clinical_findings=findings)
+
+    def reported(self, result):
+        """
+        Whether the result takes part in primary/secondary selection.
+        """
+        return result["risk_level"] not in self.report_unless_risk
+
+
+# -----------------------------
+# Code generation
+# -----------------------------
+
+class _Source:
+    """
+    Generated source plus the constants it refers to as _C[i].
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.constants = []
+
+    def const(self, value):
+        self.constants.append(value)
+        return f"_C[{len(self.constants) - 1}]"
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+
+def _number(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleSetError(f"{where}: threshold {value!r} is not a number")
+    return repr(value)
+
+
+_COMPARISONS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _band_condition(var, band, where):
+    # Same test as _band_matches(), for a value known not to be None
+    parts = [f"{var} {_COMPARISONS[op]} {_number(band[op], where)}" for op in OPERATORS if op in band]
+    return " and ".join(parts) or "True"
+
+
+def _generate_rule(src, name, rule, slots):
+    """
+    Emit `def <name>(f)` equivalent to rule.evaluate() over the feature
+    tuple f (slots: feature -> index).
+    """
+    where = f"rule {rule.domain!r}"
+    var = {feature: f"v{slots[feature]}" for feature in rule.features}
+
+    src.emit(0, f"def {name}(f):")
+    for feature in sorted(rule.features, key=slots.get):
+        src.emit(1, f"{var[feature]} = f[{slots[feature]}]")
+
+    if rule.requires_all:
+        src.emit(1, "if " + " or ".join(f"{var[f]} is None" for f in rule.requires_all) + ":")
+        src.emit(2, "return None")
+    if rule.requires_any:
+        src.emit(1, "if " + " and ".join(f"{var[f]} is None" for f in rule.requires_any) + ":")
+        src.emit(2, "return None")
+
+    for guard in rule.guard_specs:
+        v = var[guard["feature"]]
+        if "eq" in guard:
+            src.emit(1, f"if not ({v} == {src.const(guard['eq'])}):")
+        else:
+            src.emit(1, f"if {v} is None or not ({_band_condition(v, guard, where)}):")
+        src.emit(2, "return None")
+
+    for (when, result), spec in zip(rule.overrides, rule.override_specs):
+        conditions = [
+            f"{var[w['feature']]} is not None and {_band_condition(var[w['feature']], w, where)}"
+            for w in spec["when"]
+        ]
+        src.emit(1, "if " + " and ".join(f"({c})" for c in conditions) + ":")
+        src.emit(2, f"r = {src.const(result)}")
+        src.emit(2, "return dict(r, clinical_findings=list(r['clinical_findings']))")
+
+    has_tags = any(tag for c in rule.criteria for _, _, tag in c.bands)
+    src.emit(1, "score = 0")
+    src.emit(1, "findings = []")
+    if has_tags:
+        src.emit(1, "tags = set()")
+
+    def effect(indent, points, finding, tag):
+        body = []
+        if points:
+            body.append(f"score += {_number(points, where)}")
+        if finding:
+            body.append(f"findings.append({src.const(finding)})")
+        if tag:
+            body.append(f"tags.add({src.const(tag)})")
+        for line in body or ["pass"]:
+            src.emit(indent, line)
+
+    for criterion in rule.criteria:
+        v = var[criterion.feature]
+        if criterion.table is None:
+            src.emit(1, f"if {v}:")
+            effect(2, *criterion.bands[0])
+            continue
+        src.emit(1, f"if {v} is not None:")
+        for i, (band, bound) in enumerate(zip(criterion.table.bands, criterion.bands)):
+            keyword = "if" if i == 0 else "elif"
+            src.emit(2, f"{keyword} {_band_condition(v, band, where)}:")
+            effect(3, *bound)
+
+    for min_score, required_tags, result in rule.outcomes:
+        conditions = []
+        if min_score is not None:
+            conditions.append(f"score >= {_number(min_score, where)}")
+        if required_tags:
+            if not has_tags:
+                continue        # no criterion sets a tag: never matches
+            conditions.append(f"{src.const(required_tags)} <= tags")
+        src.emit(1, f"if {' and '.join(conditions) or 'True'}:")
+        src.emit(2, f"return dict({src.const(result)}, clinical_findings=findings)")
+
+    if rule.otherwise is None:
+        src.emit(1, "return None")
+    else:
+        src.emit(1, f"return dict({src.const(rule.otherwise)}, clinical_findings=findings)")
+    src.emit(0, "")
+
+
+def _generate(ruleset, names):
+    """
+    (source, read_record, read_values, rule functions) for the features
+    `names` and the enabled rules of a RuleSet.
+    """
+    src = _Source()
+    slots = {name: i for i, name in enumerate(names)}
+
+    # Feature tuple straight from a PatientRecord (same rules as extract())
+    items = []
+    for name in names:
+        source, key, kind, zero_is_missing = ruleset.features[name]
+        if source == "trends":
+            item = f"trends.get({src.const(key)})"
+        else:
+            item = f"record.{ruleset.record_fields[name]}"
+        if kind == "flag":
+            item = f"bool({item})"
+        elif zero_is_missing:
+            item = f"({item} or None)"
+        items.append(item)
+
+    src.emit(0, "def read_record(record):")
+    src.emit(1, "trends = record.trends or _EMPTY")
+    src.emit(1, f"return ({''.join(item + ', ' for item in items)})")
+    src.emit(0, "")
+
+    # Same tuple from an extract() dict
+    src.emit(0, "def read_values(values):")
+    src.emit(1, f"return ({''.join(f'values[{src.const(name)}], ' for name in names)})")
+    src.emit(0, "")
+
+    for i, rule in enumerate(ruleset.enabled_rules):
+        _generate_rule(src, f"rule_{i}", rule, slots)
+
+    namespace = {"_C": src.constants, "_EMPTY": {}}
+    source = "\n".join(src.lines)
+    exec(compile(source, f"<rules {ruleset.name} {ruleset.version}>", "exec"), namespace)
+    functions = [namespace[f"rule_{i}"] for i in range(len(ruleset.enabled_rules))]
+    return source, namespace["read_record"], namespace["read_values"], functions
+
+
+class RuleSet:
+
+    def __init__(self, spec, version):
+        self.name = spec.get("name", "rules")
+        self.version = version
+        self.risk_priority = spec.get("risk_priority", {"High": 3, "Moderate": 2, "Low": 1})
+
+        self.features = {}
+        self.record_fields = {}
+        for name, feature in spec["features"].items():
+            if feature.get("from") not in SOURCES:
+                raise RuleSetError(f"feature {name!r}: 'from' must be one of {SOURCES}")
+            self.features[name] = (
+                feature["from"], feature["key"],
+                feature.get("type", "number"), feature.get("zero_is_missing", False)
+            )
+            # PatientRecord attribute the feature reads (trends stay a dict)
+            if feature["from"] != "trends":
+                field = feature["key"].lower()
+                if field not in FIELD_KINDS:
+                    raise RuleSetError(f"feature {name!r}: {feature['key']!r} is not a patient field")
+                self.record_fields[name] = field
+
+        self.rules = [CompiledRule(rule, self.features) for rule in spec["rules"]]
+        self.by_domain = {rule.domain: rule for rule in self.rules}
+
+        self.enabled_rules = [rule for rule in self.rules if rule.enabled]
+
+        # Only features an enabled rule reads are extracted per patient
+        used = set().union(*(rule.features for rule in self.enabled_rules))
+        self._extract = self._extractor(sorted(used))
+        self._extract_all = self._extractor(sorted(self.features))
+
+        # Kept for debugging: ruleset.generated_source shows what runs
+        self.generated_source, self._read_record, self._read_values, functions = _generate(self, sorted(used))
+        self._generated = list(zip(self.enabled_rules, functions))
+
+        # Per-rule latency under the stage names the hand-written rules had
+        # (rule_pcos, rule_thyroid, ...)
+        self._timed = [
+            (rule, function, STAGE_SECONDS.observer(stage=rule.stage))
+            for rule, function in self._generated
+        ]
+
+    def _extractor(self, names):
+        """
+        Precomputed getters for extract(): one attrgetter call reads every
+        record field, then flags, zero-is-missing values and trends are
+        patched in.
+        """
+        fields = [name for name in names if name in self.record_fields]
+        getter = operator.attrgetter(*(self.record_fields[name] for name in fields)) if fields else None
+        return {
+            "features": [(name,) + self.features[name] for name in names],
+            "fields": fields,
+            "getter": (lambda record: (getter(record),)) if len(fields) == 1 else getter,
+            "flags": [name for name in names if self.features[name][2] == "flag"],
+            "zero_is_missing": [name for name in names if self.features[name][3]],
+            "trends": [(name, self.features[name][1]) for name in names
+                       if self.features[name][0] == "trends"],
+        }
+
+    def extract(self, patient_data, all_features=False):
+        """
+        {feature: value} from a PatientRecord (or a patient_data dict).
+        """
+        plan = self._extract_all if all_features else self._extract
+
+        if isinstance(patient_data, PatientRecord):
+            values = dict(zip(plan["fields"], plan["getter"](patient_data))) if plan["fields"] else {}
+            trends = patient_data.trends or {}
+            for name, key in plan["trends"]:
+                values[name] = trends.get(key)
+        else:
+            sections = {source: patient_data.get(source) or {} for source in SOURCES}
+            values = {
+                name: sections[source].get(key) for name, source, key, _, _ in plan["features"]
+            }
+
+        for name in plan["flags"]:
+            values[name] = bool(values[name])
+        for name in plan["zero_is_missing"]:
+            if not values[name]:
+                values[name] = None
+        return values
+
+    def evaluate(self, patient_data, timed=True):
+        """
+        [(rule, result)] for every enabled rule that produced a result, in
+        rule-file order. With `timed`, each rule's latency is recorded in
+        cds_stage_seconds under its stage name.
+        """
+        if isinstance(patient_data, PatientRecord):
+            features = self._read_record(patient_data)
+        else:
+            features = self._read_values(self.extract(patient_data))
+
+        matches = []
+        if not timed:
+            for rule, function in self._generated:
+                result = function(features)
+                if result is not None:
+                    matches.append((rule, result))
+            return matches
+
+        perf_counter = time.perf_counter
+        for rule, function, observe in self._timed:
+            start = perf_counter()
+            try:
+                result = function(features)
+            except Exception:
+                STAGE_ERRORS.inc(stage=rule.stage)
+                raise
+            finally:
+                observe(perf_counter() - start)
+            if result is not None:
+                matches.append((rule, result))
+        return matches
+
+    def evaluate_domain(self, domain, patient_data):
+        return self.by_domain[domain].evaluate(self.extract(patient_data, all_features=True))
+
+
+def compile_rules(text):
+    """
+    Compile rule-file text into a RuleSet; the version is a hash of the
+    text.
+    """
+    try:
+        spec = json.loads(text)
+    except ValueError as e:
+        raise RuleSetError(f"invalid JSON: {e}")
+
+    version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+    try:
+        return RuleSet(spec, version)
+    except (KeyError, TypeError) as e:
+        raise RuleSetError(f"malformed rule file: {e!r}")
+
+
+# -----------------------------
+# Hot reload
+# -----------------------------
+
+class RuleEngine:
+
+    def __init__(self, path=RULES_PATH, check_interval=RULES_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._last_check = 0.0
+        self._stats = {"loads": 0, "load_errors": 0, "last_error": None}
+
+        self._ruleset = None
+        self.reload()
+        if self._ruleset is None:
+            raise RuleSetError(f"could not load rules from {path}: {self._stats['last_error']}")
+
+    def _current_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def reload(self):
+        """
+        Compile the rule file and swap it in. Returns True on success; on
+        failure the current rule set stays active.
+        """
+        with self._lock:
+            self._last_check = time.monotonic()
+            stamp = self._current_stamp()
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    ruleset = compile_rules(f.read())
+            except (OSError, RuleSetError) as e:
+                self._stamp = stamp
+                self._stats["load_errors"] += 1
+                self._stats["last_error"] = str(e)
+                logger.error("Rule file %s not loaded: %s", self.path, e)
+                return False
+
+            self._stamp = stamp
+            self._ruleset = ruleset
+            self._stats["loads"] += 1
+            self._stats["last_error"] = None
+            return True
+
+    @property
+    def ruleset(self):
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self._last_check = time.monotonic()
+            if self._current_stamp() != self._stamp:
+                self.reload()
+        return self._ruleset
+
+    def stats(self):
+        snapshot = dict(self._stats)
+        snapshot["version"] = self._ruleset.version
+        snapshot["path"] = self.path
+        return snapshot
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_rule_engine():
+    global _engine
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RuleEngine()
+
+    return _engine
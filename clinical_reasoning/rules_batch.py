@@ -0,0 +1,259 @@
+# rules_batch.py
+#
+# NumPy evaluation of the compiled rule set (rules.json) for population
+# screening. Patients are held column-wise (one array per rule feature, NaN
+# for missing numbers) and every rule is evaluated over the whole batch with
+# masks. Results are kept as small code arrays and only turned back into
+# the scalar dict format on demand, so they compare 1:1 with
+# CompiledRule.evaluate().
+#
+# Nothing here is specific to a rule: bands, guards and outcomes are read
+# from the CompiledRule, so trend criteria and hot-reloaded thresholds apply
+# to batches too.
+
+import numpy as np
+
+from clinical_reasoning.rule_engine import ThresholdTable, get_rule_engine
+
+
+# -----------------------------
+# Columnar input
+# -----------------------------
+
+def _column(kind, values):
+    if kind == "flag":
+        return np.array(values, dtype=bool)
+    if kind == "value":
+        return np.array(values, dtype=object)
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+def columns_from_patients(patients, ruleset=None):
+    """
+    Convert PatientRecords or patient_data dicts into one column per rule
+    feature (one pass over the patients).
+    """
+    ruleset = ruleset or get_rule_engine().ruleset
+    rows = [ruleset.extract(patient, all_features=True) for patient in patients]
+
+    return {
+        name: _column(kind, [row[name] for row in rows])
+        for name, (_, _, kind, _) in ruleset.features.items()
+    }
+
+
+def columns_from_arrays(n, ruleset=None, **arrays):
+    """
+    Build columns directly from arrays (e.g. a lab extract), keyed by rule
+    feature name. Missing numeric columns are all-NaN, missing flags
+    all-False and missing values all-None.
+    """
+    ruleset = ruleset or get_rule_engine().ruleset
+
+    columns = {}
+    for name, (_, _, kind, _) in ruleset.features.items():
+        if name in arrays:
+            dtype = {"flag": bool, "value": object}.get(kind, float)
+            columns[name] = np.asarray(arrays[name], dtype=dtype)
+        else:
+            columns[name] = _column(kind, [None] * n)
+    return columns
+
+
+class _MissingMasks(dict):
+    """
+    feature -> missing-value mask, computed on first use and shared by the
+    rules of one batch.
+    """
+
+    def __init__(self, columns):
+        super().__init__()
+        self.columns = columns
+
+    def __missing__(self, feature):
+        column = self.columns[feature]
+        if column.dtype == bool:
+            mask = np.zeros(len(column), dtype=bool)
+        elif column.dtype == object:
+            mask = np.array([v is None for v in column], dtype=bool)
+        else:
+            mask = np.isnan(column)
+        self[feature] = mask
+        return mask
+
+
+def _truthy(column):
+    if column.dtype == bool:
+        return column
+    if column.dtype == object:
+        return np.array([bool(v) for v in column], dtype=bool)
+    return ~np.isnan(column) & (column != 0)
+
+
+_COMPARE = {"gt": np.greater, "gte": np.greater_equal, "lt": np.less, "lte": np.less_equal}
+
+
+def _band_masks(table, column, missing):
+    """
+    ThresholdTable.lookup() over a column: one mask per band, True where
+    that band is the first to match. Missing values match no band.
+    """
+    # A rule band has one or two bounds, so comparing against them
+    # directly is cheaper than mapping values onto the table's pieces
+    remaining = ~missing
+    masks = []
+    for band in table.bands:
+        mask = remaining.copy()
+        for op, compare in _COMPARE.items():
+            if op in band:
+                mask &= compare(column, band[op])
+        remaining &= ~mask
+        masks.append(mask)
+    return masks
+
+
+# -----------------------------
+# Results
+# -----------------------------
+
+class BatchRuleResult:
+    """
+    Per-patient outcome of one rule as code arrays.
+
+    `outcome` indexes `outcomes` (the rule's possible result dicts) and is
+    -1 where the scalar rule returns None. Bit k of `findings` set means
+    `finding_labels[k]` was reported (bits are in the order the scalar rule
+    appends them).
+    """
+
+    def __init__(self, outcome, findings, outcomes, finding_labels):
+        self.outcome = outcome
+        self.present = outcome >= 0
+        self.findings = findings
+        self.outcomes = outcomes
+        self.finding_labels = finding_labels
+
+    def __len__(self):
+        return len(self.outcome)
+
+    def result(self, i):
+        if not self.present[i]:
+            return None
+
+        template = self.outcomes[self.outcome[i]]
+        mask = int(self.findings[i])
+        return {
+            "condition": template["condition"],
+            "risk_level": template["risk_level"],
+            "confidence": template["confidence"],
+            "clinical_findings": [
+                label for bit, label in enumerate(self.finding_labels) if mask >> bit & 1
+            ]
+        }
+
+    def to_dicts(self):
+        return [self.result(i) for i in range(len(self))]
+
+
+# -----------------------------
+# Rules
+# -----------------------------
+
+MAX_FINDINGS = 64       # bits in the findings mask
+
+
+class _Findings:
+
+    def __init__(self, n):
+        self.mask = np.zeros(n, dtype=np.uint64)
+        self.labels = []
+
+    def add(self, label, hit):
+        if len(self.labels) == MAX_FINDINGS:
+            raise ValueError(f"a batch rule reports at most {MAX_FINDINGS} distinct findings")
+        self.mask |= hit.astype(np.uint64) << np.uint64(len(self.labels))
+        self.labels.append(label)
+
+
+def evaluate_rule(rule, columns, missing=None):
+    """
+    BatchRuleResult for one CompiledRule over a column batch; the same
+    steps as CompiledRule.evaluate(), with masks.
+    """
+    n = len(next(iter(columns.values())))
+    if missing is None:
+        missing = _MissingMasks(columns)
+
+    live = np.ones(n, dtype=bool)
+    for feature in rule.requires_all:
+        live &= ~missing[feature]
+    if rule.requires_any:
+        live &= np.logical_or.reduce([~missing[f] for f in rule.requires_any])
+
+    for guard in rule.guard_specs:
+        feature = guard["feature"]
+        if "eq" in guard:
+            live &= np.asarray(columns[feature] == guard["eq"], dtype=bool)
+        else:
+            live &= _band_masks(ThresholdTable([guard]), columns[feature], missing[feature])[0]
+
+    outcome = np.full(n, -1)
+    outcomes = []
+    findings = _Findings(n)
+
+    for when, result in rule.overrides:
+        hit = live & (outcome < 0)
+        for feature, table in when:
+            hit &= _band_masks(table, columns[feature], missing[feature])[0]
+        outcome[hit] = len(outcomes)
+        outcomes.append(result)
+        for label in result["clinical_findings"]:
+            findings.add(label, hit)
+
+    scored = live & (outcome < 0)
+    score = np.zeros(n)
+    tags = {}
+
+    for criterion in rule.criteria:
+        column = columns[criterion.feature]
+        if criterion.table is None:
+            hits = [scored & _truthy(column)]
+        else:
+            hits = [scored & mask for mask in _band_masks(criterion.table, column, missing[criterion.feature])]
+
+        for hit, (points, finding, tag) in zip(hits, criterion.bands):
+            if points:
+                score += points * hit
+            if finding:
+                findings.add(finding, hit)
+            if tag:
+                tags[tag] = tags.get(tag, np.zeros(n, dtype=bool)) | hit
+
+    no_tag = np.zeros(n, dtype=bool)
+    for min_score, required_tags, result in rule.outcomes:
+        hit = scored & (outcome < 0)
+        if min_score is not None:
+            hit &= score >= min_score
+        for tag in required_tags:
+            hit &= tags.get(tag, no_tag)
+        outcome[hit] = len(outcomes)
+        outcomes.append(result)
+
+    if rule.otherwise is not None:
+        outcome[scored & (outcome < 0)] = len(outcomes)
+        outcomes.append(rule.otherwise)
+
+    return BatchRuleResult(outcome, findings.mask, outcomes, findings.labels)
+
+
+def evaluate_batch(columns, domains=None, ruleset=None):
+    """
+    Run every (or the selected) rule over a column batch, disabled rules
+    included. Returns {domain: BatchRuleResult}.
+    """
+    ruleset = ruleset or get_rule_engine().ruleset
+    rules = [ruleset.by_domain[domain] for domain in domains or [rule.domain for rule in ruleset.rules]]
+
+    missing = _MissingMasks(columns)
+    with np.errstate(invalid="ignore"):
+        return {rule.domain: evaluate_rule(rule, columns, missing) for rule in rules}
@@ -0,0 +1,225 @@
+# service.py
+#
+# Request-path orchestration for the web/API layer. Rules run inline; the
+# slow stages (guideline retrieval, LLM explanation) run on thread pools
+# with per-stage timeouts. A stage that times out or fails degrades to the
+# rule-only result instead of holding the request.
+#
+# Each stage has its own pool: a timed-out LLM call keeps running until the
+# backend's own timeouts end it, and must not hold threads retrieval needs.
+
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from clinical_reasoning.assessment_cache import get_assessment_cache
+from clinical_reasoning.clinical_reasoning import (
+    LLM_FALLBACK_EXPLANATION,
+    complete_assessment,
+    evaluate_rules,
+    fetch_guideline_excerpt,
+)
+from clinical_reasoning.evidence_table import get_evidence_table
+from clinical_reasoning.explanation_jobs import get_explanation_jobs
+from clinical_reasoning.llm_layer import cached_explanation, llm_explanation
+from clinical_reasoning.metrics import FALLBACKS, timed
+from clinical_reasoning.patient_record import as_record
+
+
+RETRIEVAL_TIMEOUT = float(os.environ.get("CDS_RETRIEVAL_TIMEOUT", 2.0))   # seconds
+LLM_TIMEOUT = float(os.environ.get("CDS_LLM_TIMEOUT", 20.0))              # seconds
+STAGE_WORKERS = int(os.environ.get("CDS_STAGE_WORKERS", 16))           # retrieval
+LLM_WORKERS = int(os.environ.get("CDS_LLM_WORKERS", 8))
+
+_executors = {
+    "retrieval": ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="cds-retrieval"),
+    "llm": ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="cds-llm"),
+}
+
+
+def _explain(key):
+    # Errors propagate so the stage is reported as degraded
+    findings, excerpt = key
+    with timed("llm_explanation"):
+        return llm_explanation(findings=list(findings), guideline_context=excerpt)
+
+
+def _fetch_excerpt(key):
+    excerpt = fetch_guideline_excerpt(*key)
+    # Retrievers return [] when the store fails, so an empty live result
+    # is reported as a failed stage (and not cached), not as "no evidence"
+    if not excerpt and get_evidence_table().get(*key) is None:
+        raise LookupError(f"no guideline evidence retrieved for {key}")
+    return excerpt
+
+
+def _excerpt_key(pending):
+    return (pending["domain"], pending["condition"])
+
+
+def _run_stage(stage, fn, keys, timeout, default):
+    """
+    Run fn(key) for every unique key concurrently and wait at most
+    `timeout` seconds in total. Returns ({key: value}, failed_keys);
+    keys that timed out or raised map to `default`.
+    """
+    executor = _executors[stage]
+    futures = {key: executor.submit(fn, key) for key in dict.fromkeys(keys)}
+    if not futures:
+        return {}, set()
+
+    done, _ = wait(futures.values(), timeout=timeout)
+
+    values, failed = {}, set()
+    for key, future in futures.items():
+        if future in done and future.exception() is None:
+            values[key] = future.result()
+        else:
+            # Timed-out work keeps running in its stage's pool (cancel only
+            # drops it if still queued) but is not waited for
+            reason = "error" if future in done else "timeout"
+            future.cancel()
+            values[key] = default
+            failed.add(key)
+            FALLBACKS.inc(stage=stage, reason=reason)
+
+    return values, failed
+
+
+def _cache_lookup(patient_data):
+    """
+    (key, cached result or None). key is None when caching is off.
+    """
+    cache = get_assessment_cache()
+    if cache.max_entries <= 0:
+        return None, None
+
+    key = cache.key(patient_data)
+    return key, cache.get(key)
+
+
+def _cache_store(key, result):
+    # Degraded results and pending explanations are not final
+    if key is not None and "degraded" not in result and "explanation_job" not in result:
+        get_assessment_cache().put(key, result)
+
+
+def assess_many(patients, retrieval_timeout=RETRIEVAL_TIMEOUT, llm_timeout=LLM_TIMEOUT):
+    """
+    Assess a list of PatientRecords (or patient_data dicts). Previously
+    assessed patients are served from the assessment cache. For the rest,
+    retrieval runs concurrently for every unique (domain, condition), then
+    the LLM concurrently for every unique (findings, excerpt). Returns
+    assessments in input order; any assessment whose stages degraded
+    carries a "degraded" list.
+    """
+    patients = [as_record(patient) for patient in patients]
+    lookups = [_cache_lookup(patient_data) for patient_data in patients]
+    misses = [i for i, (_, cached) in enumerate(lookups) if cached is None]
+
+    computed = _assess_uncached([patients[i] for i in misses], retrieval_timeout, llm_timeout)
+
+    results = [cached for _, cached in lookups]
+    for i, result in zip(misses, computed):
+        _cache_store(lookups[i][0], result)
+        results[i] = result
+
+    return results
+
+
+def _assess_uncached(patients, retrieval_timeout, llm_timeout):
+    evaluated = [evaluate_rules(patient_data) for patient_data in patients]
+    pendings = [pending for _, pending in evaluated if pending is not None]
+
+    excerpts, retrieval_failed = _run_stage(
+        "retrieval",
+        _fetch_excerpt,
+        [_excerpt_key(p) for p in pendings],
+        retrieval_timeout,
+        default=""
+    )
+
+    explanations, llm_failed = _run_stage(
+        "llm",
+        _explain,
+        [
+            (tuple(p["findings"]), excerpts[_excerpt_key(p)])
+            for p in pendings if p["needs_llm"]
+        ],
+        llm_timeout,
+        default=LLM_FALLBACK_EXPLANATION
+    )
+
+    results = []
+    for assessment, pending in evaluated:
+        if pending is None:
+            results.append(assessment)
+            continue
+
+        degraded = []
+        excerpt = excerpts[_excerpt_key(pending)]
+        if _excerpt_key(pending) in retrieval_failed:
+            degraded.append("retrieval")
+
+        explanation = None
+        if pending["needs_llm"]:
+            llm_key = (tuple(pending["findings"]), excerpt)
+            explanation = explanations[llm_key]
+            if llm_key in llm_failed:
+                degraded.append("llm")
+
+        result = complete_assessment(assessment, excerpt, explanation)
+        if degraded:
+            result["degraded"] = degraded
+        results.append(result)
+
+    return results
+
+
+def assess(patient_data, retrieval_timeout=RETRIEVAL_TIMEOUT, llm_timeout=LLM_TIMEOUT):
+    return assess_many([patient_data], retrieval_timeout, llm_timeout)[0]
+
+
+def assess_deferred(patient_data, retrieval_timeout=RETRIEVAL_TIMEOUT):
+    """
+    Phase one of the two-phase flow: rules and guideline evidence only.
+
+    When an LLM explanation is needed and not already cached, generation
+    is started in the background and the assessment carries its
+    "explanation_job" id with clinical_reasoning left as None.
+    """
+    patient_data = as_record(patient_data)
+    cache_key, cached = _cache_lookup(patient_data)
+    if cached is not None:
+        return cached
+
+    assessment, pending = evaluate_rules(patient_data)
+    if pending is None:
+        _cache_store(cache_key, assessment)
+        return assessment
+
+    key = _excerpt_key(pending)
+    excerpts, retrieval_failed = _run_stage(
+        "retrieval", _fetch_excerpt, [key], retrieval_timeout, default=""
+    )
+    excerpt = excerpts[key]
+
+    explanation = None
+    job_id = None
+    if pending["needs_llm"]:
+        try:
+            explanation = cached_explanation(pending["findings"], excerpt)
+        except Exception:
+            explanation = None
+
+        if explanation is None:
+            job_id = get_explanation_jobs().submit(
+                pending["findings"], excerpt, fallback=LLM_FALLBACK_EXPLANATION
+            )
+
+    result = complete_assessment(assessment, excerpt, explanation)
+    if job_id:
+        result["explanation_job"] = job_id
+    if retrieval_failed:
+        result["degraded"] = ["retrieval"]
+    _cache_store(cache_key, result)
+    return result
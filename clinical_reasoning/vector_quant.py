@@ -0,0 +1,213 @@
+# vector_quant.py
+#
+# Quantized storage for guideline embeddings: float16, or int8 with one
+# float32 scale per vector. Search runs over the quantized matrix; the top
+# candidates can be re-scored exactly against the float32 vectors, which
+# stay on disk (memory-mapped) so only the rows actually re-scored are read.
+#
+#   python -m clinical_reasoning.vector_quant faiss_index      # recall report
+#
+# Per domain (next to the FAISS files, see faiss_index.py):
+#   <domain>.q.npy        float16 or int8 matrix (n, dim)
+#   <domain>.scale.npy    float32 per-vector scales (int8 only)
+#   <domain>.f32.npy      float32 matrix used for re-scoring (optional)
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+
+QUANTIZATIONS = ("float16", "int8")
+
+# Candidates fetched per requested result before exact re-scoring
+RESCORE_FACTOR = 4
+
+# Rows dequantized at a time during a scan (bounds temporary memory)
+SCAN_BLOCK = 16384
+
+
+def quantize(vectors, kind):
+    """
+    Return (matrix, scales); scales is None for float16.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+
+    if kind == "float16":
+        return vectors.astype(np.float16), None
+
+    if kind == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        matrix = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return matrix, scales.astype(np.float32)
+
+    raise ValueError(f"quantization must be one of {QUANTIZATIONS}")
+
+
+def dequantize(matrix, scales=None):
+    out = matrix.astype(np.float32)
+    if scales is not None:
+        out *= scales[:, None]
+    return out
+
+
+def write_quantized(prefix, vectors, kind, rescore=False):
+    matrix, scales = quantize(vectors, kind)
+    np.save(prefix + ".q.npy", matrix)
+    if scales is not None:
+        np.save(prefix + ".scale.npy", scales)
+    if rescore:
+        np.save(prefix + ".f32.npy", np.asarray(vectors, dtype=np.float32))
+
+
+class QuantizedMatrix:
+    """
+    Brute-force inner-product search over a quantized matrix, with optional
+    exact float32 re-scoring of the best candidates.
+    """
+
+    def __init__(self, matrix, scales=None, exact=None, rescore_factor=RESCORE_FACTOR):
+        self.matrix = matrix
+        self.scales = scales
+        self.exact = exact
+        self.rescore_factor = rescore_factor
+
+    @classmethod
+    def load(cls, prefix, rescore=True, rescore_factor=RESCORE_FACTOR):
+        matrix = np.load(prefix + ".q.npy", mmap_mode="r")
+        scales = None
+        if os.path.exists(prefix + ".scale.npy"):
+            scales = np.load(prefix + ".scale.npy")
+        exact = None
+        if rescore and os.path.exists(prefix + ".f32.npy"):
+            exact = np.load(prefix + ".f32.npy", mmap_mode="r")
+        return cls(matrix, scales, exact, rescore_factor)
+
+    @property
+    def ntotal(self):
+        return self.matrix.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def _scores(self, queries):
+        n = self.ntotal
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, SCAN_BLOCK):
+            block = np.asarray(self.matrix[start:start + SCAN_BLOCK], dtype=np.float32)
+            block_scores = queries @ block.T
+            if self.scales is not None:
+                block_scores *= self.scales[start:start + SCAN_BLOCK]
+            scores[:, start:start + SCAN_BLOCK] = block_scores
+        return scores
+
+    def search(self, queries, k):
+        """
+        FAISS-style (scores, ids), both shaped (len(queries), k); missing
+        results have id -1.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        n = self.ntotal
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if n == 0 or k <= 0:
+            return out_scores, out_ids
+
+        scores = self._scores(queries)
+        fetch = min(n, k * self.rescore_factor if self.exact is not None else k)
+
+        for qi in range(len(queries)):
+            row = scores[qi]
+            candidates = np.argpartition(-row, fetch - 1)[:fetch] if fetch < n else np.arange(n)
+
+            if self.exact is not None:
+                # Exact scores for the shortlist only; sorted rows read fewer pages
+                candidates = np.sort(candidates)
+                candidate_scores = np.asarray(self.exact[candidates], dtype=np.float32) @ queries[qi]
+            else:
+                candidate_scores = row[candidates]
+
+            order = np.argsort(-candidate_scores)[:k]
+            out_ids[qi, :len(order)] = candidates[order]
+            out_scores[qi, :len(order)] = candidate_scores[order]
+
+        return out_scores, out_ids
+
+
+# -----------------------------
+# Recall report
+# -----------------------------
+
+def recall_at_k(vectors, queries, k=10, rescore_factor=RESCORE_FACTOR):
+    """
+    Recall@k of each quantized variant against exact float32 search, plus
+    the bytes held per vector.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    k = min(k, len(vectors))
+
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+
+    def recall(ids):
+        hits = sum(len(set(t) & set(i)) for t, i in zip(truth, ids))
+        return hits / truth.size
+
+    report = {"vectors": len(vectors), "dim": vectors.shape[1], "k": k,
+              "float32": {"bytes_per_vector": vectors.shape[1] * 4, "recall": 1.0}}
+
+    for kind in QUANTIZATIONS:
+        matrix, scales = quantize(vectors, kind)
+        per_vector = matrix.itemsize * matrix.shape[1] + (4 if scales is not None else 0)
+
+        _, ids = QuantizedMatrix(matrix, scales).search(queries, k)
+        _, rescored = QuantizedMatrix(matrix, scales, vectors, rescore_factor).search(queries, k)
+
+        report[kind] = {
+            "bytes_per_vector": per_vector,
+            "recall": recall(ids),
+            "recall_rescored": recall(rescored),
+        }
+
+    return report
+
+
+def sample_queries(vectors, n=200, noise=0.05, seed=0):
+    """
+    Perturbed corpus vectors (unit length) standing in for real queries.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=min(n, len(vectors)), replace=False)
+    queries = vectors[rows] + rng.normal(scale=noise, size=(len(rows), vectors.shape[1]))
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall of quantized vs. float32 search")
+    parser.add_argument("index_dir", nargs="?", default="faiss_index")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(os.path.join(args.index_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    for domain in sorted(manifest["domains"]):
+        path = os.path.join(args.index_dir, domain + ".f32.npy")
+        if not os.path.exists(path):
+            print(f"{domain:<12} no float32 vectors stored (built without re-scoring)")
+            continue
+
+        vectors = np.load(path)
+        report = recall_at_k(vectors, sample_queries(vectors, args.queries), args.k)
+
+        print(f"{domain} ({report['vectors']} vectors, dim {report['dim']}, recall@{report['k']})")
+        for kind in ("float32",) + QUANTIZATIONS:
+            entry = report[kind]
+            line = f"  {kind:<8} {entry['bytes_per_vector']:>5} B/vector  recall {entry['recall']:.3f}"
+            if "recall_rescored" in entry:
+                line += f"  rescored {entry['recall_rescored']:.3f}"
+            print(line)
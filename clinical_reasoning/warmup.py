@@ -0,0 +1,220 @@
+# warmup.py
+#
+# Start-up priming for a serving worker. Heavy dependencies (chromadb,
+# faiss, sentence-transformers/torch) are imported lazily, so a worker
+# imports and binds quickly; start_warm_up() then loads them in the background
+# so the first patient does not pay the cold start:
+#
+#   rules       compile the rule file
+#   evidence    load the precomputed evidence table
+#   retrieval   open the vector store and run one query per domain
+#   embedding   load the query embedding model (in-process backends only)
+#   llm         ask the LLM server to load the model
+#
+# Once warm, explanations for the common rule presentations are generated
+# in the background (explanation_warmer.py); readiness does not wait for
+# them.
+#
+# readiness() reports progress for the /readyz endpoint. A failed step
+# marks the worker degraded, not unready: every stage has a fallback.
+#
+# Under a pre-fork server, preload() runs in the master first. It loads
+# only what is safe to share across fork() (no threads, sockets or SQLite
+# handles): the rule set, the evidence table and memory-mapped indexes or
+# corpus snapshot.
+# reload_assets() re-reads them on a graceful reload.
+
+import logging
+import os
+import threading
+import time
+
+
+WARMUP_ENABLED = os.environ.get("CDS_WARMUP", "1") != "0"
+WARMUP_LLM = os.environ.get("CDS_WARMUP_LLM", "1") != "0"
+
+logger = logging.getLogger("cds.warmup")
+
+
+def _warm_rules():
+    from clinical_reasoning.rule_engine import get_rule_engine
+    return f"rule set {get_rule_engine().ruleset.version}"
+
+
+def _warm_evidence():
+    from clinical_reasoning.evidence_table import get_evidence_table
+
+    table = get_evidence_table()
+    if table.version is None:
+        logger.warning("No evidence table at %s; using live guideline search", table.path)
+        return "no evidence table; live search only"
+    return f"{len(table)} conditions, version {table.version}"
+
+
+def _warm_retrieval():
+    from clinical_reasoning.retrieval import RETRIEVAL_BACKEND, get_retriever
+    from clinical_reasoning.rule_engine import get_rule_engine
+
+    retriever = get_retriever()
+    domains = [rule.domain for rule in get_rule_engine().ruleset.rules if rule.enabled]
+    hits = sum(bool(retriever.retrieve(domain, domain, n_results=1)) for domain in domains)
+    return f"{RETRIEVAL_BACKEND}: {hits}/{len(domains)} domains returned evidence"
+
+
+def _uses_query_encoder():
+    from clinical_reasoning.retrieval import HYBRID_DENSE_BACKEND, RETRIEVAL_BACKEND
+    return RETRIEVAL_BACKEND in ("faiss", "snapshot") or (
+        RETRIEVAL_BACKEND == "hybrid" and HYBRID_DENSE_BACKEND in ("faiss", "snapshot")
+    )
+
+
+def _warm_embedding():
+    if not _uses_query_encoder():
+        return "skipped (retrieval backend embeds its own queries)"
+
+    from clinical_reasoning.embedding import EMBEDDING_MODEL, encode_queries
+
+    encode_queries(["warm-up"])
+    return EMBEDDING_MODEL
+
+
+def _warm_llm():
+    if not WARMUP_LLM:
+        return "skipped (CDS_WARMUP_LLM=0)"
+
+    from clinical_reasoning.llm_layer import get_backend
+
+    backend = get_backend()
+    backend.warm()
+    return getattr(backend, "model", type(backend).__name__)
+
+
+STEPS = (
+    ("rules", _warm_rules),
+    ("evidence", _warm_evidence),
+    ("retrieval", _warm_retrieval),
+    ("embedding", _warm_embedding),
+    ("llm", _warm_llm),
+)
+
+
+class WarmUp:
+
+    def __init__(self, steps=STEPS):
+        self.steps = steps
+        self.state = "pending"          # pending | running | ready
+        self.results = {name: {"status": "pending"} for name, _ in steps}
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def run(self):
+        self.state = "running"
+        self.started = time.monotonic()
+
+        for name, step in self.steps:
+            self.results[name] = {"status": "running"}
+            start = time.perf_counter()
+            try:
+                detail = step()
+            except Exception as e:
+                status, detail = "error", f"{type(e).__name__}: {e}"
+                logger.warning("Warm-up step %s failed: %s", name, detail)
+            else:
+                status = "ok"
+                logger.info("Warm-up step %s: %s", name, detail)
+            self.results[name] = {
+                "status": status,
+                "detail": detail,
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+
+        self.finished = time.monotonic()
+        self.state = "ready"
+
+        if WARMUP_LLM and self.results.get("llm", {}).get("status") == "ok":
+            from clinical_reasoning.explanation_warmer import (
+                WARM_EXPLANATIONS, start_explanation_warmer,
+            )
+            if WARM_EXPLANATIONS:
+                start_explanation_warmer()
+
+    def start(self):
+        """
+        Run the warm-up once, on a background thread.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="cds-warmup", daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def readiness(self):
+        from clinical_reasoning.explanation_warmer import warmer_status
+
+        degraded = [name for name, result in self.results.items() if result["status"] == "error"]
+        return {
+            "ready": self.state == "ready",
+            "state": self.state,
+            "degraded": degraded,
+            "seconds": round(self.finished - self.started, 3) if self.finished else None,
+            "steps": dict(self.results),
+            "explanations": warmer_status(),
+        }
+
+
+def preload():
+    """
+    Load the fork-safe assets in this process. Returns {asset: detail}.
+    """
+    from clinical_reasoning.retrieval import get_retriever
+
+    loaded = {"rules": _warm_rules(), "evidence": _warm_evidence()}
+
+    # Chroma opens SQLite and threads, so it is left to each worker
+    retriever = get_retriever()
+    if hasattr(retriever, "open_all"):
+        loaded["retrieval"] = retriever.open_all()
+
+    return loaded
+
+
+def reload_assets():
+    """
+    Re-read the rule file, evidence table and indexes (graceful reload);
+    memoized assessments are dropped.
+    """
+    from clinical_reasoning.assessment_cache import get_assessment_cache
+    from clinical_reasoning.evidence_table import reload_evidence_table
+    from clinical_reasoning.retrieval import get_retriever
+    from clinical_reasoning.rule_engine import get_rule_engine
+
+    get_rule_engine().reload()
+    reload_evidence_table()
+    get_retriever().close()
+    get_assessment_cache().invalidate()
+    return preload()
+
+
+_warmup = None
+_warmup_lock = threading.Lock()
+
+
+def get_warmup():
+    global _warmup
+
+    if _warmup is None:
+        with _warmup_lock:
+            if _warmup is None:
+                _warmup = WarmUp()
+
+    return _warmup
+
+
+def start_warm_up():
+    return get_warmup().start()
+
+
+def readiness():
+    return get_warmup().readiness()
@@ -1,56 +1,296 @@
 import os
 import json
-import chromadb
-from sentence_transformers import SentenceTransformer
+import time
+import argparse
+
+from chunk_text import iter_chunk_file
 
 
 CHUNKS_ROOT = "chunks"
 DB_DIR = "vector_db"
+COLLECTION_NAME = "medical_guidelines"
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"   # use ONLY this model
+BATCH_SIZE = 256                        # chunks per encode + upsert
+
+
+def iter_chunk_records(chunks_root=CHUNKS_ROOT):
+    """
+    Yield every chunk record under chunks/<domain>/ (*_chunks.jsonl, or
+    legacy *_chunks.json).
+    """
+    for domain in sorted(os.listdir(chunks_root)):
+        domain_path = os.path.join(chunks_root, domain)
+
+        if not os.path.isdir(domain_path):
+            continue
+
+        for file in sorted(os.listdir(domain_path)):
+            if file.endswith(("_chunks.jsonl", "_chunks.json")):
+                yield from iter_chunk_file(os.path.join(domain_path, file))
+
+
+def iter_batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_batch(model, collection, batch, batch_size=BATCH_SIZE):
+    texts = [chunk["text"] for chunk in batch]
+
+    # One forward pass per batch; unit-length vectors so L2 and cosine agree
+    embeddings = model.encode(
+        texts,
+        batch_size=batch_size,
+        normalize_embeddings=True,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    )
+
+    collection.upsert(
+        ids=[chunk["chunk_id"] for chunk in batch],
+        embeddings=embeddings.tolist(),
+        documents=texts,
+        metadatas=[{
+            "domain": chunk["domain"],
+            "source_file": chunk["source_file"],
+            "chunk_index": chunk["chunk_index"]
+        } for chunk in batch]
+    )
+
+
+def embed_records(model, collection, records, batch_size=BATCH_SIZE):
+    """
+    Encode and upsert records in batches. Returns (count, seconds).
+    """
+    total = 0
+    start = time.perf_counter()
+
+    for batch in iter_batches(records, batch_size):
+        embed_batch(model, collection, batch, batch_size=batch_size)
+        total += len(batch)
+
+        elapsed = time.perf_counter() - start
+        print(f"✅ Embedded {total} chunks ({total / elapsed:.1f} chunks/s)")
+
+    return total, time.perf_counter() - start
+
+
+def open_collection(db_dir=DB_DIR):
+    import chromadb
+
+    client = chromadb.PersistentClient(
+        path=os.path.abspath(db_dir)
+    )
+
+    collection = client.get_or_create_collection(
+        name=COLLECTION_NAME
+    )
+
+    # Chroma rejects writes above its own per-call limit
+    max_batch_size = client.get_max_batch_size()
+
+    return collection, max_batch_size
+
+
+def previous_faiss_vectors(index_dir):
+    """
+    {chunk_id: vector} from an existing FAISS index set built with
+    EMBEDDING_MODEL, so a rebuild only encodes new chunks. Quantized sets
+    store lossy vectors and are not reused.
+    """
+    import faiss
+    from clinical_reasoning.vector_quant import QUANTIZATIONS
+
+    # One version throughout, should the index be republished meanwhile
+    index_dir = os.path.realpath(index_dir)
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("model") != EMBEDDING_MODEL or manifest.get("index_type") in QUANTIZATIONS:
+        return {}
+
+    vectors = {}
+    for domain in manifest["domains"]:
+        prefix = os.path.join(index_dir, domain)
+        index = faiss.read_index(prefix + ".index")
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        with open(prefix + ".meta.json", "r", encoding="utf-8") as f:
+            chunk_ids = json.load(f)["chunk_id"]
+        vectors.update(zip(chunk_ids, index.reconstruct_n(0, index.ntotal)))
+    return vectors
+
+
+def build_faiss(model, records, index_dir, index_type="flat", batch_size=BATCH_SIZE,
+                rescore=False, reuse=None):
+    """
+    Encode records and write per-domain FAISS indexes. Vectors found in
+    `reuse` ({chunk_id: vector}) are not encoded again, and the model is
+    only loaded if anything is left. Returns (encoded, seconds).
+    """
+    import numpy as np
+    from clinical_reasoning.faiss_index import build_indexes
+
+    start = time.perf_counter()
+    records = list(records)
+    reuse = reuse or {}
+
+    missing = [i for i, r in enumerate(records) if r["chunk_id"] not in reuse]
+    vectors = None
+    if reuse:
+        dim = len(next(iter(reuse.values())))
+        vectors = np.empty((len(records), dim), dtype=np.float32)
+        for i, record in enumerate(records):
+            if record["chunk_id"] in reuse:
+                vectors[i] = reuse[record["chunk_id"]]
+
+    if missing:
+        model = model or load_model()
+        done = 0
+        for batch in iter_batches(missing, batch_size):
+            encoded = model.encode(
+                [records[i]["text"] for i in batch],
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            if vectors is None:
+                vectors = np.empty((len(records), encoded.shape[1]), dtype=np.float32)
+            vectors[batch] = encoded
+            done += len(batch)
+            print(f"✅ Embedded {done} of {len(missing)} chunks")
+
+    if records:
+        build_indexes(
+            records, vectors, index_dir,
+            index_type=index_type, model_name=EMBEDDING_MODEL, rescore=rescore
+        )
+
+    return len(missing), time.perf_counter() - start
+
+
+def build_snapshot(records, path, model=None, batch_size=BATCH_SIZE):
+    """
+    Write every record to a corpus snapshot. Vectors of chunk ids already in
+    the previous snapshot are reused, so only new chunks are encoded (and
+    the model is only loaded if there are any). Returns (encoded, seconds).
+    """
+    import numpy as np
+    from clinical_reasoning.corpus_snapshot import CorpusSnapshot, write_snapshot
+
+    start = time.perf_counter()
+    records = list(records)
+
+    previous = None
+    if os.path.exists(path):
+        try:
+            previous = CorpusSnapshot(path)
+        except ValueError:
+            previous = None
+    if previous is not None and previous.header.get("model") != EMBEDDING_MODEL:
+        previous.close()
+        previous = None
 
-# Load embedding model (use ONLY this model)
-model = SentenceTransformer("all-MiniLM-L6-v2")
+    reuse = previous.row_ids() if previous is not None else {}
+    missing = [i for i, r in enumerate(records) if r["chunk_id"] not in reuse]
 
-client = chromadb.PersistentClient(
-    path=os.path.abspath(DB_DIR)
-)
+    vectors = None
+    if previous is not None and len(previous):
+        vectors = np.empty((len(records), previous.vectors.shape[1]), dtype=np.float32)
+        for i, record in enumerate(records):
+            row = reuse.get(record["chunk_id"])
+            if row is not None:
+                vectors[i] = previous.vectors[row]
 
+    if missing:
+        model = model or load_model()
+        done = 0
+        for batch in iter_batches(missing, batch_size):
+            encoded = model.encode(
+                [records[i]["text"] for i in batch],
+                batch_size=batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            if vectors is None:
+                vectors = np.empty((len(records), encoded.shape[1]), dtype=np.float32)
+            vectors[batch] = encoded
+            done += len(batch)
+            print(f"✅ Embedded {done} of {len(missing)} new chunks")
 
-collection = client.get_or_create_collection(
-    name="medical_guidelines"
-)
+    if previous is not None:
+        previous.close()
 
-print("DEBUG: Embedding started")
+    if vectors is None:
+        vectors = np.zeros((0, 0), dtype=np.float32)
+    write_snapshot(records, vectors, path, model_name=EMBEDDING_MODEL)
+    return len(missing), time.perf_counter() - start
 
-for domain in os.listdir(CHUNKS_ROOT):
-    domain_path = os.path.join(CHUNKS_ROOT, domain)
 
-    if not os.path.isdir(domain_path):
-        continue
+def load_model():
+    from sentence_transformers import SentenceTransformer
 
-    for file in os.listdir(domain_path):
-        if file.endswith("_chunks.json"):
-            file_path = os.path.join(domain_path, file)
+    return SentenceTransformer(EMBEDDING_MODEL)
 
-            with open(file_path, "r", encoding="utf-8") as f:
-                chunks = json.load(f)
 
-            for chunk in chunks:
-                text = chunk["text"]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed guideline chunks into the vector DB")
+    parser.add_argument("--chunks-root", default=CHUNKS_ROOT)
+    parser.add_argument("--db-dir", default=DB_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--backend", choices=["chroma", "faiss", "snapshot"], default="chroma")
+    parser.add_argument("--snapshot-path", default="corpus.snapshot", help="snapshot output file")
+    parser.add_argument("--index-dir", default="faiss_index", help="FAISS output directory")
+    parser.add_argument("--index-type", choices=["flat", "ivf", "hnsw", "float16", "int8"],
+                        default="flat", help="FAISS index, or quantized float16/int8 vectors")
+    parser.add_argument("--rescore", action="store_true",
+                        help="quantized types: also keep float32 vectors for exact re-scoring "
+                             "(better recall, but more disk than a plain flat index)")
+    args = parser.parse_args()
 
-                embedding = model.encode(text).tolist()
+    print("DEBUG: Embedding started")
 
-                collection.add(
-                    ids=[chunk["chunk_id"]],
-                    embeddings=[embedding],
-                    documents=[text],
-                    metadatas=[{
-                        "domain": chunk["domain"],
-                        "source_file": chunk["source_file"],
-                        "chunk_index": chunk["chunk_index"]
-                    }]
-                )
+    if args.backend == "snapshot":
+        total, elapsed = build_snapshot(
+            iter_chunk_records(args.chunks_root),
+            args.snapshot_path,
+            batch_size=args.batch_size
+        )
+    elif args.backend == "faiss":
+        model = load_model()
+        total, elapsed = build_faiss(
+            model,
+            iter_chunk_records(args.chunks_root),
+            args.index_dir,
+            index_type=args.index_type,
+            batch_size=args.batch_size,
+            rescore=args.rescore
+        )
+    else:
+        collection, max_batch_size = open_collection(args.db_dir)
+        total, elapsed = embed_records(
+            load_model(),
+            collection,
+            iter_chunk_records(args.chunks_root),
+            batch_size=min(args.batch_size, max_batch_size)
+        )
 
-            print(f"✅ Embedded: {domain}/{file}")
+    rate = total / elapsed if elapsed else 0.0
+    print(f"✅ Embedding completed & saved: {total} chunks in {elapsed:.1f}s ({rate:.1f} chunks/s)")
 
+    from clinical_reasoning.evidence_table import rebuild_evidence_table
 
-print("✅ Embedding completed & saved")
+    table = rebuild_evidence_table(backend=args.backend)
+    print(f"✅ Evidence table {table['version']}: {len(table['entries'])} conditions")
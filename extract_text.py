@@ -1,50 +1,263 @@
 import pdfplumber
 import os
+import time
+import json
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 PDF_ROOT = "medical_docs"
 OUTPUT_ROOT = "extracted_text"
 
-print("DEBUG: Script started")
-print("DEBUG: PDF_ROOT exists:", os.path.exists(PDF_ROOT))
+# Files with more pages than this are split into page ranges across workers
+PAGES_PER_TASK = 50
 
-os.makedirs(OUTPUT_ROOT, exist_ok=True)
 
-for root, dirs, files in os.walk(PDF_ROOT):
-    print("\nDEBUG: Entering folder:", root)
-    print("DEBUG: Files found:", files)
+def text_output_path(pdf_path, pdf_root=PDF_ROOT, output_root=OUTPUT_ROOT):
+    root, file = os.path.split(pdf_path)
 
-    for file in files:
-        if file.lower().endswith(".pdf"):
-            print("DEBUG: PDF detected:", file)
+    relative_path = os.path.relpath(root, pdf_root)
+    output_folder = os.path.join(output_root, relative_path)
 
-            pdf_path = os.path.join(root, file)
+    output_file = file.replace(".PDF", ".txt").replace(".pdf", ".txt")
+    return os.path.join(output_folder, output_file)
 
-            relative_path = os.path.relpath(root, PDF_ROOT)
-            output_folder = os.path.join(OUTPUT_ROOT, relative_path)
-            os.makedirs(output_folder, exist_ok=True)
 
-            output_file = file.replace(".PDF", ".txt").replace(".pdf", ".txt")
-            output_path = os.path.join(output_folder, output_file)
+def _write_pages(pdf, out, first=0, last=None):
+    """
+    Stream extracted page text into `out`. Returns (pages, empty_pages).
+    """
+    pages = pdf.pages[first:last]
+    empty = 0
 
-            full_text = ""
+    for page in pages:
+        text = page.extract_text()
+        if text:
+            out.write(text)
+            out.write("\n")
+        else:
+            empty += 1
+        # Release the parsed page objects as we go
+        page.close()
 
-            try:
-                with pdfplumber.open(pdf_path) as pdf:
-                    print("DEBUG: Opened PDF:", pdf_path)
-                    for i, page in enumerate(pdf.pages):
-                        text = page.extract_text()
-                        if text:
-                            full_text += text + "\n"
-                        else:
-                            print(f"DEBUG: Page {i} has no extractable text")
+    return len(pages), empty
 
-                with open(output_path, "w", encoding="utf-8") as f:
-                    f.write(full_text)
 
-                print("✅ Extracted:", pdf_path)
+def _write_file(pdf, output_path, first=0, last=None):
+    # Write through a temporary file so a failed extraction leaves nothing behind
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + ".tmp"
 
-            except Exception as e:
-                print("❌ ERROR reading:", pdf_path)
-                print("   ", e)
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            pages, empty = _write_pages(pdf, out, first, last)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
-print("\nDEBUG: Script finished")
+    os.replace(tmp_path, output_path)
+    return pages, empty
+
+
+def extract_pdf(pdf_path, output_path):
+    """
+    Extract one PDF page by page straight into output_path.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        return _write_file(pdf, output_path)
+
+
+def _part_path(output_path, index):
+    return f"{output_path}.part{index:04d}"
+
+
+def _extract_or_split(pdf_path, output_path, pages_per_task):
+    """
+    Extract a PDF whole if it has at most pages_per_task pages. Otherwise
+    extract only its first page range into part 0 and return the tasks for
+    the remaining ranges, so page counting happens in the worker.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        n_pages = len(pdf.pages)
+        if n_pages <= pages_per_task:
+            pages, empty = _write_file(pdf, output_path)
+            return pages, empty, []
+        pages, empty = _write_file(pdf, _part_path(output_path, 0), 0, pages_per_task)
+
+    rest = [
+        ("range", pdf_path, _part_path(output_path, first // pages_per_task), first, first + pages_per_task)
+        for first in range(pages_per_task, n_pages, pages_per_task)
+    ]
+    return pages, empty, rest
+
+
+def _extract_range(pdf_path, part_path, first, last):
+    with pdfplumber.open(pdf_path) as pdf:
+        return _write_file(pdf, part_path, first, last)
+
+
+def _run_task(task):
+    # Runs in a worker process; never raises so one bad file can't stop the pool
+    kind, pdf_path, output_path, first, last = task
+    start = time.perf_counter()
+    split = []
+
+    try:
+        if kind == "file":
+            pages, empty = extract_pdf(pdf_path, output_path)
+        elif kind == "split":
+            pages, empty, split = _extract_or_split(pdf_path, output_path, last)
+        else:
+            pages, empty = _extract_range(pdf_path, output_path, first, last)
+        error = None
+    except Exception as e:
+        pages, empty, error = 0, 0, f"{type(e).__name__}: {e}"
+
+    return {
+        "task": task,
+        "pages": pages,
+        "empty_pages": empty,
+        "seconds": time.perf_counter() - start,
+        "error": error,
+        "split": split,
+    }
+
+
+def plan_tasks(jobs, pages_per_task=PAGES_PER_TASK):
+    """
+    Turn (pdf_path, output_path) jobs into worker tasks. The parent never
+    opens a PDF: each worker counts its file's pages and, for large files,
+    hands back page-range tasks whose parts are concatenated afterwards.
+    """
+    if not pages_per_task:
+        return [("file", pdf_path, output_path, 0, None) for pdf_path, output_path in jobs]
+    return [("split", pdf_path, output_path, 0, pages_per_task) for pdf_path, output_path in jobs]
+
+
+def _pool_results(executor, tasks):
+    # Yield results as they finish, submitting the page ranges of split files
+    pending = {executor.submit(_run_task, task) for task in tasks}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            pending.update(executor.submit(_run_task, task) for task in result["split"])
+            yield result
+
+
+def _join_parts(output_path, part_paths):
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        for part_path in part_paths:
+            with open(part_path, "r", encoding="utf-8") as f:
+                for block in iter(lambda: f.read(1 << 20), ""):
+                    out.write(block)
+    os.replace(tmp_path, output_path)
+
+
+def _remove_parts(part_paths):
+    for part_path in part_paths:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def extract_many(jobs, workers=None, pages_per_task=PAGES_PER_TASK):
+    """
+    Extract (pdf_path, output_path) jobs, in parallel when workers > 1.
+
+    Returns a per-file report: {pdf_path: {"pages", "empty_pages",
+    "seconds", "error"}} where seconds is summed worker time.
+    """
+    jobs = list(jobs)
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        results = map(_run_task, plan_tasks(jobs, 0))
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = _pool_results(executor, plan_tasks(jobs, pages_per_task))
+
+    parts = {}      # pdf_path -> (output_path, part paths) of split files
+    report = {
+        pdf_path: {"pages": 0, "empty_pages": 0, "seconds": 0.0, "error": None}
+        for pdf_path, _ in jobs
+    }
+
+    try:
+        for result in results:
+            pdf_path = result["task"][1]
+            entry = report[pdf_path]
+            entry["pages"] += result["pages"]
+            entry["empty_pages"] += result["empty_pages"]
+            entry["seconds"] += result["seconds"]
+            if result["split"]:
+                output_path = result["task"][2]
+                parts[pdf_path] = (
+                    output_path,
+                    [_part_path(output_path, 0)] + [task[2] for task in result["split"]]
+                )
+            if result["error"] and not entry["error"]:
+                entry["error"] = result["error"]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for pdf_path, (output_path, part_paths) in parts.items():
+        if not report[pdf_path]["error"]:
+            _join_parts(output_path, part_paths)
+        _remove_parts(part_paths)
+
+    return report
+
+
+def find_pdfs(pdf_root=PDF_ROOT, output_root=OUTPUT_ROOT):
+    for root, dirs, files in os.walk(pdf_root):
+        for file in sorted(files):
+            if file.lower().endswith(".pdf"):
+                pdf_path = os.path.join(root, file)
+                yield pdf_path, text_output_path(pdf_path, pdf_root, output_root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract text from guideline PDFs")
+    parser.add_argument("--pdf-root", default=PDF_ROOT)
+    parser.add_argument("--output-root", default=OUTPUT_ROOT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (1 = serial, in-process)")
+    parser.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK)
+    parser.add_argument("--report", help="write the per-file timing report as JSON")
+    args = parser.parse_args()
+
+    print("DEBUG: PDF_ROOT exists:", os.path.exists(args.pdf_root))
+    os.makedirs(args.output_root, exist_ok=True)
+
+    start = time.perf_counter()
+    report = extract_many(
+        find_pdfs(args.pdf_root, args.output_root),
+        workers=args.workers,
+        pages_per_task=args.pages_per_task
+    )
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for pdf_path, entry in report.items():
+        if entry["error"]:
+            failed += 1
+            print("❌ ERROR reading:", pdf_path)
+            print("   ", entry["error"])
+        else:
+            print(f"✅ Extracted: {pdf_path} ({entry['pages']} pages, {entry['seconds']:.2f}s)")
+
+    print(
+        f"\nDEBUG: {len(report) - failed} extracted, {failed} failed "
+        f"in {elapsed:.1f}s with {args.workers} worker(s)"
+    )
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
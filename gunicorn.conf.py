@@ -0,0 +1,71 @@
+# gunicorn.conf.py
+#
+# Production serving: a pre-forking gunicorn master with threaded workers.
+#
+#   gunicorn -c gunicorn.conf.py
+#   kill -HUP <master pid>        # graceful reload: re-read rules and indexes
+#
+# The app is built in the master with preload_assets=True. The rule set,
+# evidence table and memory-mapped corpus snapshot or indexes are loaded
+# once and shared by every worker (copy-on-write, or through the page cache
+# for mappings). Anything that holds threads, sockets or
+# SQLite handles (Chroma, the embedding model, the LLM connection) is
+# warmed in each worker after the fork.
+
+import multiprocessing
+import os
+
+
+bind = os.environ.get("CDS_BIND", "0.0.0.0:5000")
+
+# One process per core; threads cover I/O waits on retrieval and the LLM
+workers = int(os.environ.get("CDS_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.environ.get("CDS_THREADS", "8"))
+
+# Explanation streams stay open up to EXPLANATION_STREAM_TIMEOUT (120 s)
+timeout = int(os.environ.get("CDS_WORKER_TIMEOUT", "180"))
+graceful_timeout = int(os.environ.get("CDS_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+preload_app = True
+wsgi_app = "app:create_app(preload_assets=True, warm_up=False)"
+
+# Workers share explanations (and answer each other's explanation jobs)
+# through the on-disk tier of the explanation cache
+os.environ.setdefault("EXPLANATION_CACHE_DIR", "explanation_cache")
+
+# Each worker writes its metrics here; /metrics on any worker merges them
+os.environ.setdefault("CDS_METRICS_DIR", "metrics")
+
+
+def on_starting(server):
+    # Counters restart with the server
+    from clinical_reasoning.metrics import clear_metrics_dir
+
+    clear_metrics_dir()
+
+
+def post_fork(server, worker):
+    from clinical_reasoning.metrics import start_metrics_flusher
+    from clinical_reasoning.warmup import start_warm_up
+
+    start_metrics_flusher()
+    start_warm_up()
+
+
+def worker_exit(server, worker):
+    # Don't start another LLM call in a worker that is shutting down
+    from clinical_reasoning.explanation_warmer import stop_explanation_warmer
+    from clinical_reasoning.metrics import stop_metrics_flusher
+
+    stop_explanation_warmer()
+    stop_metrics_flusher()
+
+
+def on_reload(server):
+    # With preload_app, new workers fork from the master, so refresh the
+    # master's copy before they are spawned
+    from clinical_reasoning.warmup import reload_assets
+
+    server.log.info("Reloading rules, evidence table and indexes: %s", reload_assets())
@@ -0,0 +1,298 @@
+"""
+Incremental corpus rebuild: medical_docs → extracted_text → chunks →
+corpus.snapshot, faiss_index or vector_db (+ lexical_index) →
+evidence_table.json.
+
+A manifest records each source PDF's size, mtime and SHA-256 together with
+the chunk ids it produced. On every run only new or changed PDFs are
+re-extracted and re-chunked; chunk ids are content hashes, so only chunks
+whose text actually changed are re-embedded, and ids that disappeared
+(edited or deleted PDFs) are removed from the collection. The snapshot and
+the FAISS indexes are rewritten whole, but reuse the previous vectors by
+chunk id.
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+
+from chunk_text import OUTPUT_ROOT as CHUNKS_ROOT, chunk_file, chunk_output_path, iter_chunk_file
+from embed_chunks import (
+    BATCH_SIZE, DB_DIR, build_faiss, build_snapshot, embed_records, iter_chunk_records, load_model,
+    open_collection, previous_faiss_vectors,
+)
+from extract_text import PDF_ROOT, extract_many, text_output_path
+from clinical_reasoning.evidence_table import EVIDENCE_TABLE_PATH, rebuild_evidence_table
+from clinical_reasoning.lexical_index import LEXICAL_INDEX_DIR, build_lexical_index
+from clinical_reasoning.retrieval import (
+    FAISS_INDEX_DIR, HYBRID_DENSE_BACKEND, RETRIEVAL_BACKEND, SNAPSHOT_PATH,
+)
+
+
+# Where dense vectors go: the shared snapshot or FAISS indexes if that is
+# what is served
+VECTOR_STORE = next(
+    (store for store in ("snapshot", "faiss") if store in (RETRIEVAL_BACKEND, HYBRID_DENSE_BACKEND)),
+    "chroma"
+)
+
+
+MANIFEST_PATH = "corpus_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "sources": {}}
+
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        # Unknown layout: treat everything as new
+        return {"version": MANIFEST_VERSION, "sources": {}}
+
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def scan_sources(pdf_root=PDF_ROOT):
+    for root, dirs, files in os.walk(pdf_root):
+        for file in sorted(files):
+            if file.lower().endswith(".pdf"):
+                pdf_path = os.path.join(root, file)
+                yield os.path.relpath(pdf_path, pdf_root), pdf_path
+
+
+def plan_changes(manifest, pdf_root=PDF_ROOT):
+    """
+    Compare the PDFs on disk with the manifest.
+
+    Returns (changed, unchanged, removed) where changed maps relative path
+    to its new manifest entry (without chunk ids yet).
+    """
+    previous = manifest["sources"]
+    changed = {}
+    unchanged = {}
+
+    for rel_path, pdf_path in scan_sources(pdf_root):
+        st = os.stat(pdf_path)
+        entry = previous.get(rel_path)
+
+        # Cheap check first; only hash when size or mtime moved
+        if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            unchanged[rel_path] = entry
+            continue
+
+        digest = file_sha256(pdf_path)
+        if entry and entry["sha256"] == digest:
+            unchanged[rel_path] = dict(entry, size=st.st_size, mtime=st.st_mtime)
+            continue
+
+        changed[rel_path] = {
+            "sha256": digest,
+            "size": st.st_size,
+            "mtime": st.st_mtime,
+        }
+
+    removed = sorted(set(previous) - set(changed) - set(unchanged))
+    return changed, unchanged, removed
+
+
+def faiss_settings(index_dir):
+    """
+    (index_type, rescore) of the current FAISS indexes, so a rebuild keeps
+    them; ("flat", False) when there are none.
+    """
+    try:
+        with open(os.path.join(index_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return "flat", False
+    rescore = any(d.get("rescore") for d in manifest.get("domains", {}).values())
+    return manifest.get("index_type", "flat"), rescore
+
+
+def _remove_file(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def rebuild(pdf_root=PDF_ROOT, manifest_path=MANIFEST_PATH, db_dir=DB_DIR,
+            batch_size=BATCH_SIZE, workers=None, dry_run=False, vector_store=VECTOR_STORE,
+            snapshot_path=SNAPSHOT_PATH, faiss_index_dir=FAISS_INDEX_DIR):
+    start = time.perf_counter()
+
+    manifest = load_manifest(manifest_path)
+    previous = manifest["sources"]
+    changed, unchanged, removed = plan_changes(manifest, pdf_root)
+
+    print(
+        f"Sources: {len(changed)} changed/new, {len(unchanged)} unchanged, "
+        f"{len(removed)} removed"
+    )
+
+    if dry_run:
+        for rel_path in changed:
+            print("  ~", rel_path)
+        for rel_path in removed:
+            print("  -", rel_path)
+        return
+
+    sources = dict(unchanged)
+    new_sources = []    # (chunks_path, ids already embedded)
+    new_chunks = 0
+    stale_ids = set()
+
+    text_paths = {
+        rel_path: text_output_path(os.path.join(pdf_root, rel_path), pdf_root)
+        for rel_path in changed
+    }
+    extraction = extract_many(
+        [(os.path.join(pdf_root, rel_path), text_paths[rel_path]) for rel_path in changed],
+        workers=workers
+    )
+
+    for rel_path, entry in changed.items():
+        pdf_path = os.path.join(pdf_root, rel_path)
+        text_path = text_paths[rel_path]
+        domain = os.path.basename(os.path.dirname(text_path))
+        chunks_path = chunk_output_path(text_path, domain)
+
+        error = extraction[pdf_path]["error"]
+        if error:
+            print("❌ ERROR reading:", pdf_path)
+            print("   ", error)
+            # Keep serving the previous version of this source
+            if rel_path in previous:
+                sources[rel_path] = previous[rel_path]
+            continue
+
+        new_ids = chunk_file(text_path, domain, chunks_path)
+        old_ids = set(previous.get(rel_path, {}).get("chunk_ids", []))
+
+        if set(new_ids) - old_ids:
+            new_sources.append((chunks_path, old_ids))
+            new_chunks += len(set(new_ids) - old_ids)
+        stale_ids.update(old_ids - set(new_ids))
+
+        # Drop a previous chunk file that was not just rewritten (renamed
+        # legacy .json, or the source no longer has any text)
+        old_chunks_path = previous.get(rel_path, {}).get("chunks_path")
+        if old_chunks_path and (old_chunks_path != chunks_path or not new_ids):
+            _remove_file(old_chunks_path)
+
+        sources[rel_path] = dict(
+            entry,
+            domain=domain,
+            text_path=text_path,
+            chunks_path=chunks_path if new_ids else None,
+            chunk_ids=new_ids,
+        )
+        print(f"✅ Rebuilt: {rel_path} ({len(new_ids)} chunks)")
+
+    for rel_path in removed:
+        entry = previous[rel_path]
+        stale_ids.update(entry.get("chunk_ids", []))
+        _remove_file(entry.get("text_path"))
+        _remove_file(entry.get("chunks_path"))
+        print(f"🗑️ Removed: {rel_path}")
+
+    if vector_store == "snapshot":
+        if new_chunks or stale_ids or not os.path.exists(snapshot_path):
+            build_snapshot(iter_chunk_records(CHUNKS_ROOT), snapshot_path, batch_size=batch_size)
+            print(f"✅ Corpus snapshot rebuilt → {snapshot_path}")
+
+    elif vector_store == "faiss":
+        if new_chunks or stale_ids or not os.path.exists(faiss_index_dir):
+            index_type, rescore = faiss_settings(faiss_index_dir)
+            build_faiss(
+                None, iter_chunk_records(CHUNKS_ROOT), faiss_index_dir,
+                index_type=index_type, batch_size=batch_size, rescore=rescore,
+                reuse=previous_faiss_vectors(faiss_index_dir)
+            )
+            print(f"✅ FAISS indexes rebuilt ({index_type}) → {faiss_index_dir}")
+
+    elif new_chunks or stale_ids:
+        collection, max_batch_size = open_collection(db_dir)
+
+        if stale_ids:
+            stale = sorted(stale_ids)
+            for i in range(0, len(stale), max_batch_size):
+                collection.delete(ids=stale[i:i + max_batch_size])
+
+        if new_chunks:
+            # Stream records back from the chunk files; only unseen ids are embedded
+            new_records = (
+                record
+                for chunks_path, old_ids in new_sources
+                for record in iter_chunk_file(chunks_path)
+                if record["chunk_id"] not in old_ids
+            )
+            embed_records(
+                load_model(),
+                collection,
+                new_records,
+                batch_size=min(batch_size, max_batch_size)
+            )
+
+    manifest["sources"] = sources
+    save_manifest(manifest, manifest_path)
+
+    if new_chunks or stale_ids or not os.path.exists(LEXICAL_INDEX_DIR):
+        # BM25 needs no model; rebuilding it from all chunk files is cheap
+        build_lexical_index(iter_chunk_records(CHUNKS_ROOT), LEXICAL_INDEX_DIR)
+        print(f"✅ Lexical index rebuilt → {LEXICAL_INDEX_DIR}")
+
+    if new_chunks or stale_ids or not os.path.exists(EVIDENCE_TABLE_PATH):
+        # Excerpts for every known condition, so requests skip vector search
+        table = rebuild_evidence_table()
+        print(f"✅ Evidence table {table['version']}: {len(table['entries'])} conditions")
+
+    print(
+        f"✅ Corpus up to date: {new_chunks} chunks embedded, "
+        f"{len(stale_ids)} deleted in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally rebuild the guideline corpus")
+    parser.add_argument("--pdf-root", default=PDF_ROOT)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--db-dir", default=DB_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="PDF extraction processes (default: all cores)")
+    parser.add_argument("--vector-store", choices=["chroma", "snapshot", "faiss"], default=VECTOR_STORE)
+    parser.add_argument("--snapshot-path", default=SNAPSHOT_PATH)
+    parser.add_argument("--faiss-index-dir", default=FAISS_INDEX_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+
+    rebuild(
+        pdf_root=args.pdf_root,
+        manifest_path=args.manifest,
+        db_dir=args.db_dir,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        vector_store=args.vector_store,
+        snapshot_path=args.snapshot_path,
+        faiss_index_dir=args.faiss_index_dir
+    )
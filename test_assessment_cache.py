@@ -0,0 +1,73 @@
+from clinical_reasoning import service
+from clinical_reasoning.assessment_cache import AssessmentCache, set_assessment_cache
+
+
+PATIENT = {
+    "demographics": {"age": 34, "sex": "female"},
+    "labs": {"fbs": 131.0, "hba1c": None, "tsh": 2.1},
+    "symptoms": {"fatigue": True},
+}
+
+
+def test_key_ignores_order_and_missing_values():
+    cache = AssessmentCache(versions=lambda: {"rules": "a"})
+    reordered = {
+        "symptoms": {"fatigue": True},
+        "labs": {"tsh": 2.1, "fbs": 131.0},
+        "demographics": {"sex": "female", "age": 34},
+    }
+    assert cache.key(PATIENT) == cache.key(reordered)
+    assert cache.key(PATIENT) != cache.key(dict(PATIENT, labs={"fbs": 131.5, "tsh": 2.1}))
+
+
+def test_version_change_drops_entries():
+    versions = {"rules": "a", "index": ["1:1"]}
+    cache = AssessmentCache(check_interval=0, versions=lambda: dict(versions))
+
+    key = cache.key(PATIENT)
+    cache.put(key, {"primary": {"condition": "prediabetes"}})
+    assert cache.get(key) == {"primary": {"condition": "prediabetes"}}
+
+    versions["index"] = ["2:2"]
+    assert cache.key(PATIENT) != key
+    assert len(cache) == 0
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_repeat_submission_skips_pipeline(monkeypatch):
+    calls = []
+
+    def fake_uncached(patients, retrieval_timeout, llm_timeout):
+        calls.append(len(patients))
+        return [{"primary": {"condition": "prediabetes"}} for _ in patients]
+
+    monkeypatch.setattr(service, "_assess_uncached", fake_uncached)
+    set_assessment_cache(AssessmentCache(versions=lambda: {"rules": "a"}))
+    try:
+        first = service.assess(PATIENT)
+        first["primary"]["condition"] = "edited by caller"
+
+        assert service.assess_many([PATIENT, dict(PATIENT, labs={})]) == [
+            {"primary": {"condition": "prediabetes"}},
+            {"primary": {"condition": "prediabetes"}},
+        ]
+        assert calls == [1, 1]
+    finally:
+        set_assessment_cache(None)
+
+
+def test_empty_live_retrieval_is_not_cached(monkeypatch):
+    lookups = []
+
+    def no_evidence(domain, condition):
+        lookups.append(domain)
+        return ""        # what a failing retriever's [] becomes
+
+    monkeypatch.setattr(service, "fetch_guideline_excerpt", no_evidence)
+    set_assessment_cache(AssessmentCache(versions=lambda: {"rules": "a"}))
+    try:
+        assert service.assess(PATIENT)["degraded"] == ["retrieval"]
+        assert service.assess(PATIENT)["degraded"] == ["retrieval"]
+        assert len(lookups) == 2
+    finally:
+        set_assessment_cache(None)
@@ -0,0 +1,27 @@
+import json
+
+from clinical_reasoning.batch import BatchRunner, InvalidRecord, read_records
+from clinical_reasoning.patient_record import PatientRecord
+
+
+def test_malformed_lines_do_not_end_the_run(tmp_path):
+    path = tmp_path / "patients.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"patient_id": "a", "tsh": 2.0}),
+        "{ not json",
+        json.dumps({"patient_id": "c", "labs": "not an object"}),
+        json.dumps([1, 2]),
+        json.dumps({"patient_id": "e", "labs": {"tsh": 2.0}}),
+    ]), encoding="utf-8")
+
+    records = list(read_records(str(path)))
+    assert [record_id for record_id, _ in records] == ["a", 2, "c", 4, "e"]
+    assert [type(record) for _, record in records] == [
+        PatientRecord, InvalidRecord, InvalidRecord, InvalidRecord, PatientRecord,
+    ]
+
+    runner = BatchRunner(workers=1)
+    results = dict(runner.run(records[1:4]))
+    assert results[2]["error"].startswith("JSONDecodeError")
+    assert "labs" in results["c"]["error"]
+    assert runner.stats["errors"] == 3 and runner.stats["records"] == 3
@@ -0,0 +1,64 @@
+from chunk_text import chunk_file, iter_chunks, iter_sentences
+
+
+def _sentences(prefix, count, words=5):
+    return [f"{prefix}{i} " + " ".join(["word"] * (words - 1)) + "." for i in range(count)]
+
+
+def test_chunks_keep_whole_sentences_and_overlap():
+    sentences = _sentences("S", 12)
+    chunks = list(iter_chunks([" ".join(sentences)], chunk_size=20, overlap=5))
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk.split()) <= 20
+        # Every chunk is a run of whole sentences
+        parts = [s for s, _ in iter_sentences([chunk])]
+        assert all(part in sentences for part in parts)
+
+    # The last sentence of a chunk opens the next one, and nothing is lost
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last = [s for s, _ in iter_sentences([previous])][-1]
+        assert chunk.startswith(last)
+    assert {s for chunk in chunks for s, _ in iter_sentences([chunk])} == set(sentences)
+
+
+def test_paragraph_breaks_are_preferred():
+    # The first paragraph fills 75% of a chunk, so the second starts anew
+    lines = [" ".join(_sentences("A", 6)), "", " ".join(_sentences("B", 4))]
+    chunks = list(iter_chunks(lines, chunk_size=40, overlap=0))
+    assert chunks == [" ".join(_sentences("A", 6)), " ".join(_sentences("B", 4))]
+
+
+def test_long_sentence_is_split_with_overlap():
+    words = [f"w{i}" for i in range(50)]
+    lines = ["Short intro here. " + " ".join(words) + ". Closing line."]
+    chunks = list(iter_chunks(lines, chunk_size=10, overlap=4))
+
+    for chunk in chunks:
+        assert len(chunk.split()) <= 10
+    # Consecutive pieces share `overlap` words, including the first one
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.split()[:4] == previous.split()[-4:]
+
+    seen = [w.rstrip(".") for chunk in chunks for w in chunk.split() if w.startswith("w")]
+    assert sorted(set(seen), key=lambda w: int(w[1:])) == words
+    assert chunks[-1].endswith("Closing line.")
+
+
+def test_chunk_ids_are_stable(tmp_path):
+    source = tmp_path / "guideline.txt"
+    source.write_text("\n\n".join(" ".join(_sentences(p, 6)) for p in "ABC"), encoding="utf-8")
+    output = str(tmp_path / "chunks" / "guideline_chunks.jsonl")
+
+    ids = chunk_file(str(source), "thyroid", output, chunk_size=30, overlap=5)
+    assert len(ids) == len(set(ids)) > 1
+    assert chunk_file(str(source), "thyroid", output, chunk_size=30, overlap=5) == ids
+
+    # Editing the tail leaves the ids of earlier chunks untouched
+    source.write_text(source.read_text(encoding="utf-8") + " Appended sentence.", encoding="utf-8")
+    edited = chunk_file(str(source), "thyroid", output, chunk_size=30, overlap=5)
+    assert edited[:-1] == ids[:-1] and edited[-1] != ids[-1]
+
+    # ... while the domain is part of the id
+    assert chunk_file(str(source), "diabetes", output, chunk_size=30, overlap=5)[0] != edited[0]
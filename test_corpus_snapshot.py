@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from clinical_reasoning import embedding
+from clinical_reasoning.corpus_snapshot import CorpusSnapshot, SnapshotRetriever, write_snapshot
+
+
+def _corpus(n=300, dim=24):
+    rng = np.random.default_rng(1)
+    domains = ["thyroid", "diabetes", "pcos"]
+    records = [{
+        "domain": domains[i % 3],
+        "text": f"chunk {i} – HbA1c ≥ 6.5%",
+        "chunk_id": f"{i:032x}",
+        "source_file": f"guideline_{i % 5}.txt",
+        "chunk_index": i,
+    } for i in range(n)]
+
+    vectors = rng.normal(size=(n, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return records, vectors
+
+
+def test_snapshot_search_matches_brute_force(tmp_path):
+    records, vectors = _corpus()
+    path = str(tmp_path / "corpus.snapshot")
+    write_snapshot(records, vectors, path, model_name="test")
+
+    snapshot = CorpusSnapshot(path)
+    assert len(snapshot) == len(records)
+    assert snapshot.vectors.flags["C_CONTIGUOUS"]
+
+    query = vectors[4]
+    diabetes = [i for i, r in enumerate(records) if r["domain"] == "diabetes"]
+    expected = sorted(diabetes, key=lambda i: -float(vectors[i] @ query))[:5]
+
+    hits = snapshot.search(query, "diabetes", 5)
+    assert [snapshot.metadata(row)["chunk_index"] for _, row in hits] == expected
+    assert snapshot.text(hits[0][1]) == "chunk 4 – HbA1c ≥ 6.5%"
+    assert snapshot.metadata(hits[0][1]) == {
+        "domain": "diabetes",
+        "source_file": "guideline_4.txt",
+        "chunk_index": 4,
+        "chunk_id": f"{4:032x}",
+    }
+    assert snapshot.search(query, "adrenal", 5) == []
+    snapshot.close()
+
+
+def test_snapshot_retriever_picks_up_rebuild(tmp_path, monkeypatch):
+    records, vectors = _corpus()
+    path = str(tmp_path / "corpus.snapshot")
+    write_snapshot(records, vectors, path)
+
+    monkeypatch.setattr(embedding, "encode_queries", lambda texts: vectors[[9]])
+    retriever = SnapshotRetriever(path, check_interval=0)
+    score, text, meta = retriever.search("query", "thyroid", n_results=3)[0]
+    assert meta["chunk_index"] == 9
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+    write_snapshot(records[1:3], vectors[1:3], path)
+    assert retriever.retrieve("query", "thyroid", n_results=3) == []
+    assert retriever.stats()["opens"] == 2
@@ -0,0 +1,53 @@
+import os
+
+from clinical_reasoning.explanation_cache import ExplanationCache, set_explanation_cache
+from clinical_reasoning.explanation_jobs import CachedJob, ExplanationJobs
+
+
+JOB_ID = "ab" * 32
+
+
+def test_unknown_ids_are_not_jobs(tmp_path):
+    jobs = ExplanationJobs(workers=1)
+    try:
+        set_explanation_cache(ExplanationCache())
+        assert jobs.lookup(JOB_ID, "fallback") is None       # no shared disk tier
+
+        set_explanation_cache(ExplanationCache(disk_dir=str(tmp_path)))
+        assert jobs.lookup(JOB_ID, "fallback") is None       # never started
+    finally:
+        set_explanation_cache(None)
+
+
+def test_other_workers_see_a_failed_job(tmp_path):
+    cache = ExplanationCache(disk_dir=str(tmp_path))
+    job = CachedJob(JOB_ID, "fallback", cache)
+
+    cache.put_job_status(JOB_ID, "running")
+    assert job.status == "pending"
+
+    cache.put_job_status(JOB_ID, "error", "ConnectionRefusedError")
+    assert job.status == "error" and job.text == "fallback"
+    assert list(job.events(timeout=5)) == [("error", "fallback")]
+
+    cache.put(JOB_ID, "Explanation.")
+    assert list(job.events(timeout=5)) == [("done", "Explanation.")]
+
+
+def test_job_states_are_kept_out_of_the_disk_tier(tmp_path):
+    cache = ExplanationCache(disk_dir=str(tmp_path), max_disk_entries=2, job_ttl=60)
+    for i in range(3):
+        cache.put_job_status(f"{i:064x}", "done")
+    cache.put("cd" * 32, "Explanation.")
+
+    # Job files neither count toward max_disk_entries nor get trimmed
+    assert cache.stats()["disk_evictions"] == 0
+    assert all(cache.job_status(f"{i:064x}")["status"] == "done" for i in range(3))
+
+    # ... and expire on their own TTL
+    jobs_dir = tmp_path / "jobs"
+    for path in jobs_dir.iterdir():
+        os.utime(path, (0, 0))
+    cache._jobs_swept = 0.0
+    cache.put_job_status(JOB_ID, "running")
+    assert [path.name for path in jobs_dir.iterdir()] == [JOB_ID + ".json"]
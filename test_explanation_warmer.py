@@ -0,0 +1,69 @@
+import json
+import os
+
+from clinical_reasoning.clinical_reasoning import evaluate_rules, fetch_guideline_excerpt
+from clinical_reasoning.explanation_cache import ExplanationCache
+from clinical_reasoning.explanation_warmer import enumerate_presentations, warm_explanations
+from clinical_reasoning.llm_layer import OllamaHTTPBackend, cached_explanation
+from clinical_reasoning.llm_stub import StubLLMServer
+from clinical_reasoning.rule_engine import get_rule_engine
+
+
+PATIENT = {
+    "demographics": {"age": 40, "sex": "female"},
+    "labs": {"tsh": 8.0, "ft4": 0.6},
+    "symptoms": {"fatigue": True},
+}
+
+
+def test_enumeration_covers_live_presentations():
+    presentations = enumerate_presentations(get_rule_engine().ruleset)
+    _, pending = evaluate_rules(PATIENT)
+
+    assert (pending["domain"], pending["condition"], tuple(pending["findings"])) in presentations
+    assert all(domain != "diabetes" for domain, _, _ in presentations)
+    sizes = [len(findings) for _, _, findings in presentations]
+    assert sizes == sorted(sizes)
+
+
+def test_warmed_explanations_serve_live_requests(tmp_path):
+    cache = ExplanationCache(disk_dir=str(tmp_path))
+
+    with StubLLMServer(reply="Findings may be consistent with thyroid dysfunction.") as server:
+        backend = OllamaHTTPBackend(host=server.address, model="stub")
+
+        stats = warm_explanations(limit=None, backend=backend, cache=cache)
+        # Presentations with the same findings and excerpt share one prompt
+        assert stats["generated"] + stats["cached"] == stats["presentations"]
+        assert stats["generated"] == len(server.requests)
+        assert stats["errors"] == 0
+
+        _, pending = evaluate_rules(PATIENT)
+        excerpt = fetch_guideline_excerpt(pending["domain"], pending["condition"])
+        text = cached_explanation(pending["findings"], excerpt, backend=backend, cache=cache)
+        assert text == "Findings may be consistent with thyroid dysfunction."
+
+        again = warm_explanations(limit=None, backend=backend, cache=cache)
+        assert again["generated"] == 0
+        assert again["cached"] == stats["presentations"]
+        assert len(server.requests) == stats["generated"]
+
+    records = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(tmp_path) for name in names if name.endswith(".json")
+    ]
+    with open(records[0], encoding="utf-8") as f:
+        record = json.load(f)
+    assert record["source"] == "warmer"
+    assert record["model"] == "stub"
+
+
+def test_warming_needs_a_disk_tier():
+    class Unused:
+        model = "stub"
+
+        def generate(self, prompt):
+            raise AssertionError("no explanation should be generated")
+
+    stats = warm_explanations(limit=None, backend=Unused(), cache=ExplanationCache())
+    assert stats["generated"] == 0 and "EXPLANATION_CACHE_DIR" in stats["skipped"]
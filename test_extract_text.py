@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+pytest.importorskip("pdfplumber")
+
+import extract_text
+
+
+class FakePage:
+
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+    def close(self):
+        pass
+
+
+class FakePDF:
+    """
+    A "PDF" is a text file with one page per line; every open is logged
+    with the pid that made it.
+    """
+
+    def __init__(self, path, log_path):
+        with open(log_path, "a", encoding="utf-8") as log:
+            log.write(f"{os.getpid()}\n")
+        with open(path, "r", encoding="utf-8") as f:
+            self.pages = [FakePage(line.rstrip("\n")) for line in f]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def pdfs(tmp_path, monkeypatch):
+    log_path = str(tmp_path / "opens.log")
+    monkeypatch.setattr(extract_text.pdfplumber, "open", lambda path: FakePDF(path, log_path))
+
+    jobs = []
+    for name, n_pages in [("small.pdf", 3), ("large.pdf", 11)]:
+        pdf_path = tmp_path / "medical_docs" / "thyroid" / name
+        pdf_path.parent.mkdir(parents=True, exist_ok=True)
+        pdf_path.write_text("".join(f"{name} page {i}\n" for i in range(n_pages)), encoding="utf-8")
+        jobs.append((str(pdf_path), str(tmp_path / "extracted_text" / "thyroid" / name.replace(".pdf", ".txt"))))
+    return jobs, log_path
+
+
+def test_workers_count_pages_and_split_large_files(pdfs):
+    jobs, log_path = pdfs
+    report = extract_text.extract_many(jobs, workers=2, pages_per_task=4)
+
+    # The parent opened nothing; the large file ran as 3 page ranges
+    with open(log_path, "r", encoding="utf-8") as f:
+        opens = f.read().split()
+    assert str(os.getpid()) not in opens
+    assert len(opens) == 1 + 3
+
+    for (pdf_path, output_path), n_pages in zip(jobs, [3, 11]):
+        assert report[pdf_path]["pages"] == n_pages and report[pdf_path]["error"] is None
+        with open(output_path, "r", encoding="utf-8") as f:
+            name = os.path.basename(pdf_path)
+            assert f.read() == "".join(f"{name} page {i}\n" for i in range(n_pages))
+
+    # No part or temporary files are left behind
+    output_dir = os.path.dirname(jobs[0][1])
+    assert sorted(os.listdir(output_dir)) == ["large.txt", "small.txt"]
+
+
+def test_a_failing_range_fails_its_file(pdfs, monkeypatch):
+    jobs, _ = pdfs
+
+    def broken_range(pdf_path, part_path, first, last):
+        raise ValueError("damaged xref")
+
+    monkeypatch.setattr(extract_text, "_extract_range", broken_range)
+    report = extract_text.extract_many(jobs, workers=2, pages_per_task=4)
+
+    large = jobs[1][0]
+    assert report[large]["error"] == "ValueError: damaged xref"
+    assert report[jobs[0][0]]["error"] is None
+    assert sorted(os.listdir(os.path.dirname(jobs[0][1]))) == ["small.txt"]
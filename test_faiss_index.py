@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip("faiss")
+
+from clinical_reasoning import embedding
+from clinical_reasoning.faiss_index import FaissRetriever, build_indexes
+from clinical_reasoning.vector_quant import recall_at_k, sample_queries
+
+
+def _corpus(n=400, dim=32):
+    rng = np.random.default_rng(0)
+    records = [{
+        "domain": "thyroid" if i % 2 else "diabetes",
+        "text": f"chunk {i} – TSH ≥ 4.5",
+        "chunk_id": f"c{i}",
+        "source_file": "guideline.txt",
+        "chunk_index": i,
+    } for i in range(n)]
+
+    vectors = rng.normal(size=(n, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return records, vectors
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "float16", "int8"])
+def test_faiss_retriever_finds_exact_vector(tmp_path, monkeypatch, index_type):
+    records, vectors = _corpus()
+    index_dir = str(tmp_path / "faiss_index")
+    build_indexes(records, vectors, index_dir, index_type=index_type, rescore=True)
+
+    monkeypatch.setattr(embedding, "encode_queries", lambda texts: vectors[[7]])
+    retriever = FaissRetriever(index_dir, nprobe=32)
+
+    score, text, meta = retriever.search("query", "thyroid", n_results=3)[0]
+    assert text == "chunk 7 – TSH ≥ 4.5"
+    assert meta["chunk_id"] == "c7"
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+    assert retriever.retrieve("query", "adrenal") == []
+    retriever.close()
+
+
+def test_float32_rescoring_vectors_are_opt_in(tmp_path):
+    records, vectors = _corpus()
+    build_indexes(records, vectors, str(tmp_path / "small"), index_type="int8")
+    build_indexes(records, vectors, str(tmp_path / "rescored"), index_type="int8", rescore=True)
+
+    assert not any(name.endswith(".f32.npy") for name in os.listdir(tmp_path / "small"))
+    assert any(name.endswith(".f32.npy") for name in os.listdir(tmp_path / "rescored"))
+
+
+def test_quantized_recall_against_float32():
+    _, vectors = _corpus(n=2000, dim=64)
+    report = recall_at_k(vectors, sample_queries(vectors, 100, noise=0.3), k=10)
+
+    assert report["float16"]["recall"] > 0.99
+    assert report["int8"]["recall_rescored"] > 0.98
+    assert report["int8"]["bytes_per_vector"] < report["float32"]["bytes_per_vector"] / 3
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/maps"), reason="needs /proc")
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_faiss_index_is_memory_mapped(tmp_path, index_type):
+    records, vectors = _corpus()
+    index_dir = str(tmp_path / "faiss_index")
+    build_indexes(records, vectors, index_dir, index_type=index_type)
+
+    retriever = FaissRetriever(index_dir)
+    retriever.open_all()
+    with open("/proc/self/maps", encoding="utf-8") as f:
+        maps = f.read()
+    assert os.path.join(os.path.realpath(index_dir), "thyroid.index") in maps
+    retriever.close()
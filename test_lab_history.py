@@ -0,0 +1,67 @@
+import pytest
+
+from clinical_reasoning.lab_history import LabHistory, trend_features
+from clinical_reasoning.rule_engine import RULES_PATH, compile_rules
+
+
+VISITS = [
+    ("2024-01-10", {"hba1c": 5.6, "tsh": 2.0}),
+    ("2024-07-10", {"hba1c": 6.0}),
+    ("2025-01-10", {"hba1c": 6.6, "tsh": 2.4}),
+]
+
+
+def test_appended_and_backfilled_visits_agree(tmp_path):
+    in_order = LabHistory(str(tmp_path / "a.sqlite3"))
+    for visit_date, measures in VISITS:
+        appended = in_order.record_visit("p1", visit_date, measures)
+
+    backfilled = LabHistory(str(tmp_path / "b.sqlite3"))
+    for visit_date, measures in reversed(VISITS):
+        recomputed = backfilled.record_visit("p1", visit_date, measures)
+
+    assert in_order.stats()["recomputes"] == 0
+    assert backfilled.stats()["recomputes"] == 2
+    assert trend_features(appended) == trend_features(recomputed)
+
+    features = trend_features(appended)
+    assert features["hba1c_visits"] == 3
+    assert features["hba1c_change"] == pytest.approx(0.6)
+    assert features["hba1c_per_year"] == pytest.approx(1.0, abs=0.01)
+    assert [d for d, _ in in_order.history("p1")] == ["2024-01-10", "2024-07-10", "2025-01-10"]
+    assert in_order.history("p2") == []
+
+
+def test_rising_hba1c_reaches_the_rules(tmp_path):
+    history = LabHistory(str(tmp_path / "h.sqlite3"))
+    for visit_date, measures in VISITS:
+        trends = history.record_visit("p1", visit_date, measures)
+
+    with open(RULES_PATH, encoding="utf-8") as f:
+        ruleset = compile_rules(f.read())
+
+    patient = {"labs": {"hba1c": 6.6}, "trends": trend_features(trends)}
+    result = ruleset.evaluate_domain("diabetes", patient)
+    assert "HbA1c rising across visits (≥0.5% per year)" in result["clinical_findings"]
+
+
+def test_resubmitted_latest_visit_matches_recompute(tmp_path):
+    history = LabHistory(str(tmp_path / "r.sqlite3"))
+    for visit_date, measures in VISITS:
+        history.record_visit("p1", visit_date, measures)
+
+    # Same values: no write; changed and dropped values: swapped in place
+    history.record_visit("p1", "2025-01-10", {"hba1c": 6.6, "tsh": 2.4})
+    history.record_visit("p1", "2025-01-10", {"hba1c": 7.0, "tsh": 2.4})
+    replaced = history.record_visit("p1", "2025-01-10", {"hba1c": 7.1, "fbs": 120.0})
+
+    stats = history.stats()
+    assert stats["unchanged"] == 1 and stats["replaces"] == 2 and stats["recomputes"] == 0
+
+    fresh = LabHistory(str(tmp_path / "f.sqlite3"))
+    for visit_date, measures in VISITS[:2] + [("2025-01-10", {"hba1c": 7.1, "fbs": 120.0})]:
+        expected = fresh.record_visit("p1", visit_date, measures)
+
+    assert sorted(replaced) == sorted(expected)
+    for measure, trend in expected.items():
+        assert replaced[measure].row() == pytest.approx(trend.row())
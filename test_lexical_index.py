@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+
+from clinical_reasoning.lexical_index import HybridRetriever, LexicalRetriever, build_lexical_index
+
+
+def test_bm25_prefers_exact_terms_and_hybrid_fuses(tmp_path):
+    texts = [
+        "HbA1c of 6.5% or higher is diagnostic of diabetes.",
+        "Fasting plasma glucose between 100 and 125 mg/dL indicates prediabetes.",
+        "Lifestyle modification reduces progression risk.",
+    ]
+    records = [{
+        "domain": "diabetes", "text": text, "chunk_id": f"d{i}",
+        "source_file": "ada.txt", "chunk_index": i,
+    } for i, text in enumerate(texts)]
+    index_dir = str(tmp_path / "lexical_index")
+    build_lexical_index(records, index_dir)
+
+    lexical = LexicalRetriever(index_dir)
+    assert lexical.retrieve("HbA1c above diagnostic threshold (≥6.5%)", "diabetes", 1) == [texts[0]]
+    assert lexical.retrieve("glucose 100 mg/dL", "diabetes", 1) == [texts[1]]
+    assert lexical.retrieve("unrelated words", "diabetes") == []
+
+    class SlowDense:
+        def retrieve(self, query, domain, n_results=3):
+            time.sleep(0.5)
+            return [texts[2]]
+
+        def stats(self):
+            return {}
+
+        def close(self):
+            pass
+
+    class Dense(SlowDense):
+        def retrieve(self, query, domain, n_results=3):
+            return [texts[2], texts[1]]
+
+    fused = HybridRetriever(Dense(), lexical).retrieve("glucose 100 mg/dL", "diabetes", 2)
+    assert fused[0] == texts[1]
+
+    hybrid = HybridRetriever(SlowDense(), lexical, budget=0.05)
+    assert hybrid.retrieve("glucose 100 mg/dL", "diabetes", 2) == [texts[1]]
+    assert hybrid.stats()["dense_timeouts"] == 1
+
+    # A saturated dense pool is skipped instead of queued
+    saturated = HybridRetriever(SlowDense(), lexical, budget=0.05, dense_workers=1)
+    for _ in range(3):
+        assert saturated.retrieve("glucose 100 mg/dL", "diabetes", 2) == [texts[1]]
+    stats = saturated.stats()
+    assert stats["dense_timeouts"] == 1 and stats["dense_skipped"] == 2
+
+
+def test_rebuild_swaps_index_atomically(tmp_path):
+    def records(word):
+        return [{
+            "domain": "thyroid", "text": f"{word} TSH guidance", "chunk_id": "t0",
+            "source_file": "ata.txt", "chunk_index": 0,
+        }]
+
+    # A plain directory from an older build is moved aside once
+    index_dir = tmp_path / "lexical_index"
+    index_dir.mkdir()
+    (index_dir / "manifest.json").write_text("{}", encoding="utf-8")
+
+    missing = []
+    stop = threading.Event()
+
+    def watch():
+        while not stop.is_set():
+            if not os.path.exists(index_dir / "manifest.json"):
+                missing.append(time.monotonic())
+
+    build_lexical_index(records("first"), str(index_dir))
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        for i in range(20):
+            build_lexical_index(records(f"build{i}"), str(index_dir))
+    finally:
+        stop.set()
+        watcher.join()
+
+    assert missing == []
+    assert os.path.islink(index_dir)
+    assert len([p for p in tmp_path.iterdir() if p.name.startswith("lexical_index.v")]) == 2
+
+    lexical = LexicalRetriever(str(index_dir), check_interval=0)
+    assert lexical.retrieve("TSH", "thyroid") == ["build19 TSH guidance"]
+    build_lexical_index(records("latest"), str(index_dir))
+    assert lexical.retrieve("TSH", "thyroid") == ["latest TSH guidance"]
@@ -0,0 +1,61 @@
+from clinical_reasoning.llm_layer import OllamaHTTPBackend, llm_explanation
+from clinical_reasoning.llm_stub import StubLLMServer
+
+
+def test_http_backend_streams_from_stub():
+    with StubLLMServer(reply="Findings may be consistent with hypothyroidism.") as server:
+        backend = OllamaHTTPBackend(host=server.address, model="stub")
+
+        tokens = list(backend.stream("prompt"))
+        assert len(tokens) > 1
+        assert "".join(tokens) == "Findings may be consistent with hypothyroidism."
+
+
+def test_http_backend_reuses_connection():
+    with StubLLMServer() as server:
+        backend = OllamaHTTPBackend(host=server.address, model="stub")
+
+        backend.generate("first")
+        conn = backend._local.conn
+        backend.generate("second")
+
+        assert backend._local.conn is conn
+        assert len(server.requests) == 2
+
+
+def test_llm_explanation_sends_findings_and_context():
+    with StubLLMServer() as server:
+        backend = OllamaHTTPBackend(host=server.address, model="stub")
+
+        text = llm_explanation(
+            findings=["Elevated TSH level"],
+            guideline_context="TSH above the reference range...",
+            backend=backend
+        )
+
+        assert text
+        prompt = server.requests[0]["prompt"]
+        assert "- Elevated TSH level" in prompt
+        assert "TSH above the reference range" in prompt
+
+
+def test_llm_explanation_is_cached(tmp_path):
+    from clinical_reasoning.explanation_cache import ExplanationCache
+
+    cache = ExplanationCache(max_entries=8, disk_dir=str(tmp_path))
+
+    with StubLLMServer() as server:
+        backend = OllamaHTTPBackend(host=server.address, model="stub")
+
+        first = llm_explanation(["Fatigue reported"], "", backend=backend, cache=cache)
+        second = llm_explanation(["Fatigue reported"], "", backend=backend, cache=cache)
+
+        assert first == second
+        assert len(server.requests) == 1
+        assert cache.stats()["hits"] == 1
+
+        # A fresh memory tier is refilled from disk without calling the model
+        cold = ExplanationCache(max_entries=8, disk_dir=str(tmp_path))
+        assert llm_explanation(["Fatigue reported"], "", backend=backend, cache=cold) == first
+        assert len(server.requests) == 1
+        assert cold.stats()["disk_hits"] == 1
@@ -0,0 +1,51 @@
+import json
+
+from clinical_reasoning.metrics import (
+    Counter, Histogram, Registry, merge_snapshots, render_multiprocess, write_snapshot,
+)
+
+
+def _worker(pid, requests, seconds, entries, live=True):
+    registry = Registry()
+    counter = registry.register(Counter("test_requests_total", "Requests.", ("status",)))
+    histogram = registry.register(Histogram("test_stage_seconds", "Stages.", ("stage",)))
+    registry.register_collector(lambda: [
+        ("test_cache_entries", "gauge", "Entries.", [({}, entries)]),
+        ("test_cache_hits_total", "counter", "Hits.", [({"result": "hit"}, entries)]),
+    ])
+
+    counter.inc(requests, status="200")
+    for value in seconds:
+        histogram.observe(value, stage="rules")
+
+    snapshot = registry.snapshot()
+    snapshot.update(pid=pid, live=live)
+    return json.loads(json.dumps(snapshot))
+
+
+def test_worker_snapshots_are_merged():
+    text = merge_snapshots([
+        _worker(101, 2, [0.001], entries=5),
+        _worker(102, 3, [0.001, 20.0], entries=7),
+        _worker(103, 1, [], entries=9, live=False),
+    ])
+    lines = text.splitlines()
+
+    assert 'test_requests_total{status="200"} 6' in lines
+    assert 'test_stage_seconds_count{stage="rules"} 3' in lines
+    assert 'test_stage_seconds_bucket{stage="rules",le="0.001"} 2' in lines
+    assert 'test_cache_hits_total{result="hit"} 21' in lines
+    # Gauges stay per live worker
+    assert 'test_cache_entries{pid="101"} 5' in lines
+    assert 'test_cache_entries{pid="102"} 7' in lines
+    assert not any('pid="103"' in line for line in lines)
+
+
+def test_scrape_includes_other_workers(tmp_path):
+    (tmp_path / "1.json").write_text(json.dumps(_worker(1, 4, [], entries=0)), encoding="utf-8")
+
+    write_snapshot(str(tmp_path))
+    text = render_multiprocess(str(tmp_path))
+
+    assert 'test_requests_total{status="200"} 4' in text.splitlines()
+    assert len(list(tmp_path.glob("*.json"))) == 2
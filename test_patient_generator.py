@@ -0,0 +1,36 @@
+from benchmarks.patient_generator import generate_patients, rule_outcomes
+
+
+# Every outcome of each rules.py function (None: not enough data), plus the
+# top-level paths of run_clinical_reasoning
+OUTCOMES = {
+    ("thyroid", None),
+    ("thyroid", "Discordant thyroid function tests"),
+    ("thyroid", "Likely thyroid dysfunction"),
+    ("thyroid", "Possible thyroid dysfunction"),
+    ("thyroid", "No significant thyroid abnormality"),
+    ("diabetes", None),
+    ("diabetes", "Diabetes mellitus pattern (confirmation required)"),
+    ("diabetes", "Prediabetes pattern"),
+    ("diabetes", "Normal glycemic status"),
+    ("pcos", None),
+    ("pcos", "Possible Polycystic Ovary Syndrome (PCOS)"),
+    ("pcos", "PCOS (clinical suspicion)"),
+    ("adrenal", None),
+    ("adrenal", "Possible adrenal insufficiency pattern"),
+    ("adrenal", "Possible hypercortisol pattern"),
+    ("adrenal", "No significant adrenal abnormality"),
+    ("metabolic_syndrome", "Possible metabolic syndrome pattern"),
+    ("metabolic_syndrome", "No metabolic syndrome pattern detected"),
+    ("path", "critical_override"),
+    ("path", "insufficient_data"),
+}
+
+
+def test_generated_patients_reach_every_rule_outcome():
+    # The benchmark's default population
+    assert rule_outcomes(generate_patients(2000, seed=42)) == OUTCOMES
+
+
+def test_generator_is_deterministic():
+    assert generate_patients(50, seed=7) == generate_patients(50, seed=7)
@@ -0,0 +1,66 @@
+import pytest
+
+from clinical_reasoning.clinical_reasoning import critical_override
+from clinical_reasoning.patient_record import PatientRecord
+
+
+FORM = {
+    "patient_id": "P-17", "visit_date": "2025-03-02", "age": "52", "sex": "male",
+    "bp_systolic": "186", "bp_diastolic": "95", "weight": "80", "height": "175",
+    "fbs": "", "hba1c": "6.1", "fatigue": "on", "hirsutism": "on",
+}
+
+
+def test_form_fields_are_typed_once():
+    record = PatientRecord.parse(FORM)
+
+    assert record.age == 52 and record.bp_systolic == 186
+    assert record.hba1c == 6.1 and record.fbs is None
+    assert record.bmi == 26.1
+    assert record.fatigue is True
+    assert record.hirsutism is False        # female-only symptom
+
+
+def test_nested_and_legacy_keys_reach_the_same_fields():
+    nested = PatientRecord.from_patient_data({
+        "demographics": {"age": 52, "sex": "male"},
+        "vitals": {"blood_pressure": {"systolic": 186, "diastolic": 95}},
+        "labs": {"HbA1c": 6.1, "FBS": None},
+    })
+    assert nested.bp_systolic == 186 and nested.hba1c == 6.1
+
+    # The nested blood pressure the form builds now triggers the critical check
+    assert "Hypertensive crisis (SBP ≥ 180 mmHg)" in (
+        critical_override(nested)["primary"]["clinical_findings"]
+    )
+
+
+def test_strict_parse_names_bad_fields():
+    with pytest.raises(ValueError, match="hba1c.*tsh|tsh.*hba1c"):
+        PatientRecord.parse({"hba1c": "high", "tsh": "n/a", "age": "40"}, strict=True)
+
+    assert PatientRecord.parse({"hba1c": "high"}).hba1c is None
+
+
+@pytest.mark.parametrize("payload", [
+    {"labs": {"age": "inf"}},
+    {"demographics": {"age": 1e400}},
+    {"labs": {"tsh": "NaN"}},
+    {"labs": {"hba1c": "inf"}},
+    {"labs": [1, 2]},
+    {"labs": {"tsh": 2.0}, "trends": [1]},
+    {"vitals": {"blood_pressure": "120/80"}},
+])
+def test_malformed_json_is_rejected(payload):
+    with pytest.raises(ValueError, match="invalid patient record"):
+        PatientRecord.from_patient_data(payload, strict=True)
+
+
+def test_malformed_json_is_a_400():
+    from app import create_app
+
+    client = create_app(warm_up=False).test_client()
+    for payload in ({"age": "inf"}, {"age": 1e400}, {"labs": [1, 2]}, {"trends": [1]},
+                    {"vitals": {"blood_pressure": "120/80"}}):
+        response = client.post("/api/assess", json=payload)
+        assert response.status_code == 400, payload
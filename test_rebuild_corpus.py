@@ -0,0 +1,102 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pdfplumber")
+pytest.importorskip("faiss")
+
+import embed_chunks
+import rebuild_corpus
+
+
+class CountingModel:
+    """
+    Deterministic unit vectors per text; counts what it is asked to encode.
+    """
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded.extend(texts)
+        vectors = np.array([
+            np.random.default_rng(abs(hash(text)) % 2**32).normal(size=16) for text in texts
+        ], dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "medical_docs" / "thyroid").mkdir(parents=True)
+
+    # "PDFs" hold their text; extraction copies it
+    def extract_many(jobs, workers=None):
+        report = {}
+        for pdf_path, text_path in jobs:
+            os.makedirs(os.path.dirname(text_path), exist_ok=True)
+            with open(pdf_path, "r", encoding="utf-8") as src, open(text_path, "w", encoding="utf-8") as out:
+                out.write(src.read())
+            report[pdf_path] = {"pages": 1, "empty_pages": 0, "seconds": 0.0, "error": None}
+        return report
+
+    tables = []
+
+    def rebuild_evidence_table():
+        table = {"version": str(len(tables)), "entries": {}}
+        with open(rebuild_corpus.EVIDENCE_TABLE_PATH, "w", encoding="utf-8") as f:
+            json.dump(table, f)
+        tables.append(table)
+        return table
+
+    model = CountingModel()
+    monkeypatch.setattr(rebuild_corpus, "extract_many", extract_many)
+    monkeypatch.setattr(rebuild_corpus, "rebuild_evidence_table", rebuild_evidence_table)
+    monkeypatch.setattr(embed_chunks, "load_model", lambda: model)
+    return tmp_path, model, tables
+
+
+def _write_pdf(root, name, text):
+    path = root / "medical_docs" / "thyroid" / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def _rebuild():
+    rebuild_corpus.rebuild(vector_store="faiss", faiss_index_dir="faiss_index", workers=1)
+
+
+def test_incremental_rebuild_refreshes_faiss(corpus):
+    root, model, tables = corpus
+    _write_pdf(root, "ata.pdf", "Elevated TSH suggests hypothyroidism. " * 3)
+    _write_pdf(root, "nice.pdf", "Low free T4 with high TSH confirms it. " * 3)
+
+    _rebuild()
+    manifest = json.loads((root / "corpus_manifest.json").read_text(encoding="utf-8"))
+    assert sorted(manifest["sources"]) == [os.path.join("thyroid", "ata.pdf"), os.path.join("thyroid", "nice.pdf")]
+    assert len(model.encoded) == 2 and len(tables) == 1
+
+    # Nothing changed: no extraction, no encoding, no new table
+    _rebuild()
+    assert len(model.encoded) == 2 and len(tables) == 1
+
+    # One edited source: only its chunk is encoded, the other is reused
+    _write_pdf(root, "nice.pdf", "Low free T4 with suppressed TSH. " * 3)
+    _rebuild()
+    assert len(model.encoded) == 3 and len(tables) == 2
+
+    with open(root / "faiss_index" / "manifest.json", "r", encoding="utf-8") as f:
+        assert json.load(f)["domains"]["thyroid"]["count"] == 2
+    with open(root / "faiss_index" / "thyroid.meta.json", "r", encoding="utf-8") as f:
+        chunk_ids = json.load(f)["chunk_id"]
+    entries = json.loads((root / "corpus_manifest.json").read_text(encoding="utf-8"))["sources"]
+    assert sorted(chunk_ids) == sorted(i for entry in entries.values() for i in entry["chunk_ids"])
+
+    # A removed source drops its chunks from the index
+    (root / "medical_docs" / "thyroid" / "ata.pdf").unlink()
+    _rebuild()
+    with open(root / "faiss_index" / "manifest.json", "r", encoding="utf-8") as f:
+        assert json.load(f)["domains"]["thyroid"]["count"] == 1
+    assert len(model.encoded) == 3
@@ -0,0 +1,138 @@
+import json
+import os
+import random
+
+import pytest
+
+from clinical_reasoning.evidence_table import known_conditions
+from clinical_reasoning.metrics import STAGE_SECONDS
+from clinical_reasoning.patient_record import PatientRecord
+from clinical_reasoning.rule_engine import RULES_PATH, RuleEngine, RuleSetError, compile_rules
+from clinical_reasoning.rules import (
+    thyroid_logic,
+    diabetes_logic,
+    pcos_logic,
+    adrenal_logic,
+    metabolic_syndrome_logic,
+)
+from test_rules_batch import random_patient
+
+
+def _load_spec():
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_compiled_rules_match_reference_functions():
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        ruleset = compile_rules(f.read())
+
+    rng = random.Random(7)
+    for _ in range(5000):
+        p = random_patient(rng)
+        labs, symptoms = p["labs"], p["symptoms"]
+        expected = {
+            "thyroid": thyroid_logic(labs, symptoms),
+            "diabetes": diabetes_logic(labs),
+            "pcos": pcos_logic(labs, symptoms, p["demographics"]),
+            "adrenal": adrenal_logic(labs),
+            "metabolic_syndrome": metabolic_syndrome_logic(p["vitals"], labs),
+        }
+        for domain, result in expected.items():
+            assert ruleset.evaluate_domain(domain, p) == result, (domain, p)
+
+        # evaluate() runs the enabled rules in file order (PCOS first)
+        domains = [rule.domain for rule, _ in ruleset.evaluate(p)]
+        assert domains == [d for d in ("pcos", "thyroid", "diabetes", "adrenal") if expected[d]]
+
+
+def test_generated_rules_match_interpreted_rules():
+    spec = _load_spec()
+    # Enable everything so the disabled rule's generated code runs too
+    for rule in spec["rules"]:
+        rule["enabled"] = True
+    ruleset = compile_rules(json.dumps(spec))
+
+    rng = random.Random(11)
+    for _ in range(3000):
+        p = random_patient(rng)
+        if rng.random() < 0.5:
+            p["trends"] = {
+                "tsh_per_year": rng.choice([-1.0, 0.99, 1.0, 2.0]),
+                "hba1c_per_year": rng.choice([0.2, 0.49, 0.5, 1.0]),
+            }
+        expected = [
+            (rule.domain, rule.evaluate(ruleset.extract(p, all_features=True)))
+            for rule in ruleset.rules
+        ]
+        expected = [(domain, result) for domain, result in expected if result is not None]
+
+        for patient in (p, PatientRecord.from_patient_data(p)):
+            actual = [(rule.domain, result) for rule, result in ruleset.evaluate(patient)]
+            assert actual == expected, p
+
+
+def test_each_rule_is_timed_under_its_stage():
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        ruleset = compile_rules(f.read())
+    # metabolic_syndrome is disabled, so it is not timed
+    stages = ["rule_pcos", "rule_thyroid", "rule_diabetes", "rule_adrenal", "rule_metabolic_syndrome"]
+    before = [STAGE_SECONDS.count(stage=stage) for stage in stages]
+
+    ruleset.evaluate({"labs": {"tsh": 8.0}})
+    expected = [n + 1 for n in before[:4]] + before[4:]
+    assert [STAGE_SECONDS.count(stage=stage) for stage in stages] == expected
+
+    ruleset.evaluate({"labs": {"tsh": 8.0}}, timed=False)
+    assert [STAGE_SECONDS.count(stage=stage) for stage in stages] == expected
+
+
+def test_evidence_conditions_follow_the_rule_file():
+    spec = _load_spec()
+    adrenal = next(rule for rule in spec["rules"] if rule["domain"] == "adrenal")
+    adrenal["outcomes"][0]["condition"] = "Adrenal insufficiency pattern"
+    conditions = known_conditions(compile_rules(json.dumps(spec)))
+
+    assert ("adrenal", "Adrenal insufficiency pattern") in conditions
+    assert ("thyroid", "Discordant thyroid function tests") in conditions
+    assert all(domain != "metabolic_syndrome" for domain, _ in conditions)
+    assert len(conditions) == len(set(conditions))
+
+
+def test_non_numeric_threshold_is_rejected():
+    spec = _load_spec()
+    spec["rules"][0]["guards"][-1]["gte"] = "12"
+    with pytest.raises(RuleSetError):
+        compile_rules(json.dumps(spec))
+
+
+def test_rule_file_hot_reload(tmp_path):
+    spec = _load_spec()
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(spec), encoding="utf-8")
+
+    engine = RuleEngine(str(path), check_interval=0)
+    patient = {"labs": {"Cortisol_AM": 4.0}}
+    first = engine.ruleset
+    assert first.evaluate_domain("adrenal", patient)["condition"] == "Possible adrenal insufficiency pattern"
+
+    adrenal = next(rule for rule in spec["rules"] if rule["domain"] == "adrenal")
+    adrenal["criteria"][0]["bands"][0]["lt"] = 3
+    path.write_text(json.dumps(spec), encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+
+    assert engine.ruleset is not first
+    assert engine.ruleset.evaluate_domain("adrenal", patient)["condition"] == "No significant adrenal abnormality"
+
+    # A broken file keeps the last good rule set
+    good = engine.ruleset
+    path.write_text("{ not json", encoding="utf-8")
+    assert engine.ruleset is good
+    assert engine.stats()["load_errors"] == 1
+
+
+def test_unknown_feature_is_rejected():
+    spec = _load_spec()
+    spec["rules"][0]["criteria"].append({"feature": "prolactin", "score": 1})
+    with pytest.raises(RuleSetError):
+        compile_rules(json.dumps(spec))
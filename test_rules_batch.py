@@ -0,0 +1,80 @@
+import json
+import random
+
+from clinical_reasoning.patient_record import PatientRecord
+from clinical_reasoning.rule_engine import RULES_PATH, compile_rules
+from clinical_reasoning.rules_batch import columns_from_arrays, columns_from_patients, evaluate_batch
+
+
+def _maybe(rng, values):
+    return None if rng.random() < 0.2 else rng.choice(values)
+
+
+def random_patient(rng):
+    # Values straddle every threshold in rules.py, plus missing values
+    return {
+        "demographics": {
+            "age": _maybe(rng, [8, 11, 12, 13, 30, 65]),
+            "sex": rng.choice(["female", "male", "other", None]),
+        },
+        "labs": {
+            "tsh": _maybe(rng, [0.1, 0.39, 0.4, 2.0, 4.5, 4.51, 9.0]),
+            "ft4": _maybe(rng, [0.5, 0.79, 0.8, 1.2, 1.8, 1.81, 3.0]),
+            "fbs": _maybe(rng, [80, 99.9, 100, 110, 125.9, 126, 200]),
+            "hba1c": _maybe(rng, [5.0, 5.69, 5.7, 6.0, 6.49, 6.5, 9.0]),
+            "Cortisol_AM": _maybe(rng, [2, 4.99, 5, 12, 20, 20.1, 30]),
+            "Triglycerides": _maybe(rng, [0, 100, 149, 150, 300]),
+            "HDL": _maybe(rng, [0, 30, 39.9, 40, 60]),
+        },
+        "vitals": {
+            "Waist_Circumference": _maybe(rng, [0, 80, 90, 90.5, 110]),
+            "BP_Systolic": _maybe(rng, [0, 110, 129, 130, 160]),
+        },
+        "symptoms": {
+            "fatigue": rng.random() < 0.5,
+            "weight_gain": rng.random() < 0.5,
+            "menstrual_irregularity": rng.random() < 0.5,
+            "hirsutism": rng.random() < 0.5,
+        },
+    }
+
+
+def _assert_batch_matches_scalar(ruleset, patients):
+    results = evaluate_batch(columns_from_patients(patients, ruleset), ruleset=ruleset)
+
+    assert sorted(results) == sorted(rule.domain for rule in ruleset.rules)
+    for domain, result in results.items():
+        expected = [ruleset.evaluate_domain(domain, p) for p in patients]
+        assert result.to_dicts() == expected, domain
+
+
+def test_batch_rules_match_scalar_rules():
+    with open(RULES_PATH, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    rng = random.Random(1234)
+    patients = [random_patient(rng) for _ in range(5000)]
+    for p in patients[::2]:
+        p["trends"] = {
+            "tsh_per_year": rng.choice([-1.0, 0.99, 1.0, 2.0]),
+            "hba1c_per_year": rng.choice([0.2, 0.49, 0.5, 1.0]),
+        }
+    patients[::3] = [PatientRecord.from_patient_data(p) for p in patients[::3]]
+
+    _assert_batch_matches_scalar(compile_rules(text), patients)
+
+    # Edited thresholds apply to batches as well
+    spec = json.loads(text)
+    adrenal = next(rule for rule in spec["rules"] if rule["domain"] == "adrenal")
+    adrenal["criteria"][0]["bands"][0]["lt"] = 3
+    _assert_batch_matches_scalar(compile_rules(json.dumps(spec)), patients[:1000])
+
+
+def test_columns_from_arrays():
+    tsh, ft4 = [9.0, 2.0, 0.1], [0.5, 1.2, 2.5]
+    results = evaluate_batch(columns_from_arrays(3, tsh=tsh, ft4=ft4, fatigue=[True, False, False]))
+
+    assert [r["condition"] for r in results["thyroid"].to_dicts()] == [
+        "Likely thyroid dysfunction", "No significant thyroid abnormality", "Discordant thyroid function tests",
+    ]
+    assert not results["diabetes"].present.any()